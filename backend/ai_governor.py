@@ -0,0 +1,329 @@
+"""
+Central governor for every model call.
+
+Calls run as coroutines on one background event loop (the "ai-governor"
+thread), so the async provider client, the limits and the breaker state are
+shared by request handlers, threadpool code and the image worker alike.
+Sync callers block on a future; async callers await it without holding a
+threadpool thread. Per model:
+  * a semaphore caps the calls in flight,
+  * a token bucket caps the requests started per minute,
+  * a circuit breaker opens after AI_BREAKER_FAILURES consecutive transient
+    failures, fails fast for AI_BREAKER_COOLDOWN_SECONDS, then lets a single
+    probe through to decide whether to close again.
+Limits come from AI_MAX_CONCURRENCY / AI_REQUESTS_PER_MINUTE and can be set
+per model with AI_MODEL_LIMITS="dall-e-3=4/50,gpt-4o=4/300".
+
+Each call has one deadline covering the wait for a slot, every attempt and
+the backoff between attempts. Transient errors (timeouts, connection errors,
+HTTP 408/409/429/5xx) are retried with full-jitter exponential backoff,
+honouring Retry-After, while the deadline allows. A call that still has no
+answer returns the last good answer stored under its cache_key, then the
+caller's local fallback, and only then raises AIUnavailable.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import httpx
+import caching
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+AI_REQUESTS_PER_MINUTE = float(os.getenv("AI_REQUESTS_PER_MINUTE", "500")) # 0 disables the rate limit
+# "model=concurrency/requests_per_minute,..." overrides for single models
+AI_MODEL_LIMITS = os.getenv("AI_MODEL_LIMITS", "")
+AI_DEADLINE_SECONDS = float(os.getenv("AI_DEADLINE_SECONDS", "30"))
+AI_MAX_ATTEMPTS = int(os.getenv("AI_MAX_ATTEMPTS", "3"))
+AI_RETRY_BASE_SECONDS = float(os.getenv("AI_RETRY_BASE_SECONDS", "0.5"))
+AI_RETRY_MAX_SECONDS = float(os.getenv("AI_RETRY_MAX_SECONDS", "8"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_BREAKER_COOLDOWN_SECONDS", "30"))
+# How long a good answer can stand in for a failed call with the same cache_key
+AI_STALE_TTL_SECONDS = float(os.getenv("AI_STALE_TTL_SECONDS", "86400"))
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+class AIUnavailable(Exception):
+    """A model call failed (or was refused by an open breaker) and had no fallback."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_limits(spec: str) -> dict:
+    """{model: (concurrency, requests_per_minute)} from an AI_MODEL_LIMITS string."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        model, _, value = part.partition("=")
+        concurrency, _, rpm = value.partition("/")
+        try:
+            limits[model.strip()] = (
+                int(concurrency) if concurrency else AI_MAX_CONCURRENCY,
+                float(rpm) if rpm else AI_REQUESTS_PER_MINUTE
+            )
+        except ValueError:
+            raise ValueError(f"Invalid AI_MODEL_LIMITS entry '{part}'")
+    return limits
+
+def is_transient(exc: BaseException) -> bool:
+    """True for failures worth retrying: timeouts, dropped connections, throttling and server errors."""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    # openai's connection/timeout errors carry no status code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def _retry_after(exc: BaseException) -> float:
+    response = getattr(exc, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value else 0.0
+    except ValueError:
+        return 0.0
+
+class TokenBucket:
+    """Requests-per-minute limiter. Only touched from the governor loop, so it needs no lock."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    async def acquire(self, deadline: float):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise asyncio.TimeoutError("rate limit wait exceeds the deadline")
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """closed -> open after `failures` transient failures in a row -> half_open after `cooldown` -> closed on success."""
+
+    def __init__(self, failures: int = AI_BREAKER_FAILURES, cooldown: float = AI_BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        """Seconds a rejected caller should wait; always positive unless the breaker is closed."""
+        if self.state == "half_open":
+            # The probe's outcome decides; by the next cooldown it is known
+            return self.cooldown
+        if self.state == "open":
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+        return 0.0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() >= self.opened_at + self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return self.state != "open"
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failures:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """Ends a half-open probe that was neither a success nor a transient failure."""
+        self._probing = False
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    succeeded: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    failures: int = 0
+    rejected: int = 0
+    stale_answers: int = 0
+    local_answers: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+class _Model:
+    def __init__(self, concurrency: int, per_minute: float, breaker: CircuitBreaker):
+        self.concurrency = concurrency
+        self.per_minute = per_minute
+        self.slots = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(per_minute) if per_minute > 0 else None
+        self.breaker = breaker
+        self.stats = ModelStats()
+
+class Governor:
+    """Limits, retries and breakers for every model, keyed by model name; see the module docstring."""
+
+    def __init__(self, limits: Optional[dict] = None, deadline: float = AI_DEADLINE_SECONDS,
+                 max_attempts: int = AI_MAX_ATTEMPTS, retry_base: float = AI_RETRY_BASE_SECONDS,
+                 retry_max: float = AI_RETRY_MAX_SECONDS, breaker_failures: int = AI_BREAKER_FAILURES,
+                 breaker_cooldown: float = AI_BREAKER_COOLDOWN_SECONDS, stale_ttl: float = AI_STALE_TTL_SECONDS):
+        self.limits = parse_limits(AI_MODEL_LIMITS) if limits is None else limits
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.last_good = caching.TTLCache(stale_ttl, maxsize=4096)
+        self._models = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The governor's event loop, started on first use."""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="ai-governor", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _model(self, name: str) -> _Model:
+        # Only called on the loop, so creation needs no lock
+        model = self._models.get(name)
+        if model is None:
+            concurrency, per_minute = self.limits.get(name, (AI_MAX_CONCURRENCY, AI_REQUESTS_PER_MINUTE))
+            model = self._models[name] = _Model(
+                concurrency, per_minute, CircuitBreaker(self.breaker_failures, self.breaker_cooldown)
+            )
+        return model
+
+    async def _attempts(self, model: _Model, make_call, deadline: float):
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("deadline exceeded")
+            if not model.breaker.allow():
+                model.stats.rejected += 1
+                raise AIUnavailable("circuit open", model.breaker.retry_after())
+            # Waiting for a slot or a token says nothing about the upstream, so it never trips the breaker
+            try:
+                await asyncio.wait_for(model.slots.acquire(), remaining)
+            except BaseException:
+                model.breaker.release()
+                raise
+            try:
+                if model.bucket is not None:
+                    await model.bucket.acquire(deadline)
+            except BaseException:
+                model.slots.release()
+                model.breaker.release()
+                raise
+
+            model.stats.in_flight += 1
+            model.stats.max_in_flight = max(model.stats.max_in_flight, model.stats.in_flight)
+            try:
+                result = await asyncio.wait_for(make_call(), deadline - time.monotonic())
+            except Exception as e:
+                error = e
+            else:
+                model.breaker.record_success()
+                return result
+            finally:
+                model.stats.in_flight -= 1
+                model.slots.release()
+
+            if not is_transient(error):
+                model.breaker.release()
+                raise error
+            if isinstance(error, asyncio.TimeoutError):
+                model.stats.timeouts += 1
+            model.breaker.record_failure()
+            backoff = max(random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempt - 1))), _retry_after(error))
+            if attempt >= self.max_attempts or time.monotonic() + backoff >= deadline:
+                raise error
+            model.stats.retries += 1
+            await asyncio.sleep(backoff)
+
+    async def _call(self, model_name: str, make_call, deadline: float, cache_key, fallback):
+        model = self._model(model_name)
+        model.stats.calls += 1
+        try:
+            result = await self._attempts(model, make_call, deadline)
+        except Exception as e:
+            if not isinstance(e, AIUnavailable):
+                model.stats.failures += 1
+            if cache_key is not None:
+                stale = self.last_good.get((model_name, cache_key))
+                if stale is not None:
+                    model.stats.stale_answers += 1
+                    return stale
+            if fallback is not None:
+                model.stats.local_answers += 1
+                return fallback()
+            if isinstance(e, AIUnavailable):
+                raise
+            raise AIUnavailable(f"{model_name} call failed: {e!r}", model.breaker.retry_after()) from e
+        model.stats.succeeded += 1
+        if cache_key is not None and result is not None:
+            self.last_good.set((model_name, cache_key), result)
+        return result
+
+    def submit(self, model: str, make_call, deadline: Optional[float] = None, cache_key=None, fallback=None):
+        """
+        Schedules make_call() (a zero-argument function returning an awaitable)
+        on the governor loop. Returns a concurrent.futures.Future.
+        """
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        return asyncio.run_coroutine_threadsafe(self._call(model, make_call, expires_at, cache_key, fallback), self.loop)
+
+    def run(self, model: str, make_call, deadline: Optional[float] = None, cache_key=None, fallback=None):
+        """Blocking form of submit() for sync code."""
+        return self.submit(model, make_call, deadline, cache_key, fallback).result()
+
+    async def run_async(self, model: str, make_call, deadline: Optional[float] = None, cache_key=None, fallback=None):
+        """submit() awaited from another event loop (e.g. an async endpoint)."""
+        return await asyncio.wrap_future(self.submit(model, make_call, deadline, cache_key, fallback))
+
+    def map(self, model: str, calls: list, deadline: Optional[float] = None) -> list:
+        """
+        Runs independent calls concurrently under the model's limits and
+        waits for all of them. Returns one result or exception per call, in order.
+        """
+        futures = [self.submit(model, make_call, deadline) for make_call in calls]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                **vars(model.stats), "concurrency": model.concurrency, "requests_per_minute": model.per_minute,
+                "breaker": model.breaker.state
+            } for name, model in sorted(list(self._models.items()))
+        }
+
+governor = Governor()
@@ -0,0 +1,152 @@
+"""
+Pluggable AI provider interface.
+
+ai_service delegates every model call to a provider. OpenAIProvider (in
+ai_service.py) talks to the real API; FakeAIProvider answers deterministically
+and locally with configurable latency, for tests, benchmarks and offline
+development. Select with AI_PROVIDER=openai|fake.
+
+Operations are coroutines: ai_governor runs them on its event loop under the
+model's limits, so a provider only makes the call and raises on failure.
+"""
+import abc
+import asyncio
+import hashlib
+import random
+import threading
+from collections import Counter
+from typing import Optional
+from schemas import RecipeSchema, IngredientSchema, NutritionSchema
+
+class AIProvider(abc.ABC):
+    """Operations the backend needs from a model vendor."""
+    name = "base"
+
+    @abc.abstractmethod
+    async def extract_recipe(self, input_text: str) -> RecipeSchema:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def generate_image(self, prompt: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def analyze_image(self, image_bytes: bytes, mode: str) -> dict:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def recommend(self, remaining_cal: int, existing_ingredients: list, slot: str) -> str:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def choose_recommendation(self, remaining_cal: int, slot: str, candidates: list) -> str:
+        """
+        Picks one of the pre-ranked candidates ({"name", "calories", "protein_g",
+        "matching_ingredients"} dicts); answers 'Dish Name: reason'.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def unit_factor(self, ingredient_name: str, from_unit: str, to_unit: str) -> Optional[float]:
+        raise NotImplementedError
+
+_FAKE_INGREDIENTS = [
+    ("onion", "Produce", "g"), ("garlic", "Produce", "g"), ("tomato", "Produce", "pcs"),
+    ("olive oil", "Pantry", "ml"), ("salt", "Pantry", "g"), ("black pepper", "Pantry", "g"),
+    ("chicken breast", "Meat", "g"), ("basmati rice", "Grains", "g"), ("butter", "Dairy", "g"),
+    ("milk", "Dairy", "ml"), ("eggs", "Dairy", "pcs"), ("spinach", "Produce", "g"),
+    ("cumin", "Spices", "g"), ("ginger", "Produce", "g"), ("lemon", "Produce", "pcs"),
+    ("paneer", "Dairy", "g"), ("pasta", "Grains", "g"), ("parmesan", "Dairy", "g"),
+    ("bell pepper", "Produce", "pcs"), ("coconut milk", "Pantry", "ml"),
+]
+_FAKE_CUISINES = ["Indian", "Italian", "Mexican", "Thai", "French", "Japanese"]
+_FAKE_SLOTS = ["Breakfast", "Lunch", "Dinner"]
+# Grams per piece / per ml used by the fake unit oracle
+_FAKE_FACTORS = {("pcs", "g"): 120.0, ("pc", "g"): 120.0, ("ml", "g"): 1.0, ("cup", "g"): 200.0}
+
+class FakeAIProvider(AIProvider):
+    """
+    Deterministic local stand-in: identical inputs always produce identical
+    outputs. Each call sleeps latency_ms (+/- jitter_ms) to mimic the network,
+    and calls are counted per operation.
+    """
+    name = "fake"
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, image_latency_ms: Optional[float] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.image_latency_ms = latency_ms if image_latency_ms is None else image_latency_ms
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _rng(self, *parts) -> random.Random:
+        seed = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+        return random.Random(int(seed[:16], 16))
+
+    async def _call(self, operation: str, latency_ms: float):
+        with self._lock:
+            self.calls[operation] += 1
+        delay = latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    async def extract_recipe(self, input_text: str) -> RecipeSchema:
+        await self._call("extract_recipe", self.latency_ms)
+        key = " ".join(input_text.lower().split())
+        rng = self._rng("recipe", key)
+        picks = rng.sample(_FAKE_INGREDIENTS, 6)
+        calories = rng.randint(250, 850)
+        return RecipeSchema(
+            name=key.title(),
+            description=f"A deterministic test recipe for {key}.",
+            cuisine=rng.choice(_FAKE_CUISINES),
+            suitable_for=sorted(rng.sample(_FAKE_SLOTS, rng.randint(1, 2))),
+            ingredients=[
+                IngredientSchema(
+                    name=name, category=category, unit=unit,
+                    quantity=rng.randint(1, 4) if unit == "pcs" else rng.randint(5, 400)
+                ) for name, category, unit in picks
+            ],
+            prep_steps=[f"Step {i + 1}: prepare the {picks[i][0]}." for i in range(3)],
+            nutrition=NutritionSchema(
+                calories=calories,
+                protein=f"{rng.randint(5, 50)}g",
+                carbs=f"{rng.randint(10, 100)}g",
+                fats=f"{rng.randint(3, 40)}g"
+            ),
+            suggested_pairings=[f"{rng.choice(_FAKE_CUISINES)} Side Salad"]
+        )
+
+    async def generate_image(self, prompt: str) -> Optional[str]:
+        await self._call("generate_image", self.image_latency_ms)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+        return f"https://placehold.co/1024x1024?text={digest}"
+
+    async def analyze_image(self, image_bytes: bytes, mode: str) -> dict:
+        await self._call("analyze_image", self.latency_ms)
+        rng = self._rng("vision", hashlib.sha256(image_bytes).hexdigest(), mode)
+        if mode == "dish":
+            return {"name": f"{rng.choice(_FAKE_CUISINES)} {rng.choice(['Curry', 'Stew', 'Pasta', 'Salad'])}",
+                    "cuisine": rng.choice(_FAKE_CUISINES)}
+        return {"items": [
+            {"name": name, "quantity": rng.randint(1, 5), "unit": unit}
+            for name, _, unit in rng.sample(_FAKE_INGREDIENTS, 4)
+        ]}
+
+    async def recommend(self, remaining_cal: int, existing_ingredients: list, slot: str) -> str:
+        await self._call("recommend", self.latency_ms)
+        rng = self._rng("recommend", remaining_cal // 100, slot, ",".join(sorted(existing_ingredients)))
+        return f"{rng.choice(_FAKE_CUISINES)} {slot} Bowl: Fits your remaining {remaining_cal} calories."
+
+    async def choose_recommendation(self, remaining_cal: int, slot: str, candidates: list) -> str:
+        await self._call("choose_recommendation", self.latency_ms)
+        return f"{candidates[0]['name']}: A {slot.lower()} that fits your remaining {remaining_cal} calories."
+
+    async def unit_factor(self, ingredient_name: str, from_unit: str, to_unit: str) -> Optional[float]:
+        await self._call("unit_factor", self.latency_ms)
+        pair = (from_unit.lower(), to_unit.lower())
+        if pair in _FAKE_FACTORS:
+            return _FAKE_FACTORS[pair]
+        if pair[::-1] in _FAKE_FACTORS:
+            return 1.0 / _FAKE_FACTORS[pair[::-1]]
+        return None
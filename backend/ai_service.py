@@ -1,126 +1,258 @@
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from schemas import RecipeSchema
 import base64
+import json
+import threading
+from functools import partial
+from typing import Optional
+import hashlib
+from ai_governor import governor
+from ai_providers import AIProvider, FakeAIProvider
+import metrics
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def generate_professional_image(prompt: str):
+# openai (default) or fake; see ai_providers.py
+AI_PROVIDER = os.getenv("AI_PROVIDER", "openai")
+FAKE_AI_LATENCY_MS = float(os.getenv("FAKE_AI_LATENCY_MS", "0"))
+FAKE_AI_JITTER_MS = float(os.getenv("FAKE_AI_JITTER_MS", "0"))
+
+# Model and prompt used for recipe extraction; both feed the persistent cache key
+RECIPE_MODEL = "gpt-4o-mini"
+CHAT_MODEL = "gpt-4o-mini"
+VISION_MODEL = "gpt-4o"
+IMAGE_MODEL = "dall-e-3"
+# Image generation takes far longer than a chat completion
+AI_IMAGE_DEADLINE_SECONDS = float(os.getenv("AI_IMAGE_DEADLINE_SECONDS", "120"))
+RECIPE_SYSTEM_INSTRUCTION = (
+    "You are an expert Michelin-star Chef and Culinary Instructor. "
+    "Your goal is to provide high-quality, professional recipe data in a structured format."
+    "\n\nSTRICT CONTENT REQUIREMENTS:"
+    "\n1. PREPARATION STEPS: Do not provide short, one-sentence steps. "
+    "Each step must be descriptive, including sensory details (smell, color, texture) and professional techniques. "
+    "Example: Instead of 'Cook onions', use 'Sauté the finely diced onions over medium heat for 12-15 minutes, stirring occasionally until they achieve a deep mahogany caramelization and sweet aroma.'"
+    "\n2. INGREDIENTS: Use precise measurements (grams, ml, or standard kitchen units like 'tablespoon')."
+    "\n3. MEAL TYPE: Always specify if it is suitable for Breakfast, Lunch, or Dinner. Do not leave this empty."
+    "\n4. NUTRITION: Provide realistic culinary estimates for calories and macros based on the ingredients."
+)
+
+class OpenAIProvider(AIProvider):
     """
-    Generates imagery following OpenAI Official DALL-E 3 Documentation.
+    OpenAI-backed provider. The async client is created on first use (on the
+    governor's loop), so importing never needs a key. Retries and timeouts are
+    left to the governor. base_url (or OPENAI_BASE_URL) points it at another
+    server, e.g. fake_openai.py.
     """
-    try:
-        response = client.images.generate(
-            model="dall-e-3",
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        self._api_key = api_key
+        self._base_url = base_url
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = AsyncOpenAI(
+                        api_key=self._api_key or os.getenv("OPENAI_API_KEY"), base_url=self._base_url, max_retries=0
+                    )
+        return self._client
+
+    async def generate_image(self, prompt: str) -> Optional[str]:
+        """
+        Generates imagery following OpenAI Official DALL-E 3 Documentation.
+        """
+        response = await self.client.images.generate(
+            model=IMAGE_MODEL,
             prompt=f"Professional high-end food photography of {prompt}, cinematic lighting, 4k, appetizing, neutral background.",
             size="1024x1024",
             quality="standard",
             n=1,
         )
         return response.data[0].url
-    except Exception as e:
-        print(f"OpenAI Image Error: {e}")
-        return None
-    
-def analyze_image_vision(image_bytes: bytes, mode: str = "pantry") -> dict:
-    """
-    V7 Vision Logic: Analyzes images of ingredients or prepared dishes.
-    """
-    base64_image = base64.b64encode(image_bytes).decode('utf-8')
-    
-    prompts = {
-        "pantry": "Identify all raw food ingredients in this image. For each, suggest a likely quantity and unit. Return a JSON list of objects with 'name', 'quantity', and 'unit'.",
-        "dish": "Identify the prepared cooked dish in this image. Return a single JSON object with 'name' and 'cuisine'."
-    }
-
-    response = client.chat.completions.create(
-        model="gpt-4o", # Using full gpt-4o for high-fidelity vision
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompts.get(mode, prompts["pantry"])},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                ],
-            }
-        ],
-        response_format={"type": "json_object"} # Forcing structured vision output
-    )
-    
-    import json
-    return json.loads(response.choices[0].message.content)
 
-def extract_recipe_logic(input_text: str) -> RecipeSchema:
-    """
-    Expert-level prompt to ensure descriptive, high-quality recipe content.
-    """
-    system_instruction = (
-        "You are an expert Michelin-star Chef and Culinary Instructor. "
-        "Your goal is to provide high-quality, professional recipe data in a structured format."
-        "\n\nSTRICT CONTENT REQUIREMENTS:"
-        "\n1. PREPARATION STEPS: Do not provide short, one-sentence steps. "
-        "Each step must be descriptive, including sensory details (smell, color, texture) and professional techniques. "
-        "Example: Instead of 'Cook onions', use 'Sauté the finely diced onions over medium heat for 12-15 minutes, stirring occasionally until they achieve a deep mahogany caramelization and sweet aroma.'"
-        "\n2. INGREDIENTS: Use precise measurements (grams, ml, or standard kitchen units like 'tablespoon')."
-        "\n3. MEAL TYPE: Always specify if it is suitable for Breakfast, Lunch, or Dinner. Do not leave this empty."
-        "\n4. NUTRITION: Provide realistic culinary estimates for calories and macros based on the ingredients."
-    )
-
-    response = client.beta.chat.completions.parse(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": f"Create a professional, descriptive recipe for: {input_text}"},
-        ],
-        response_format=RecipeSchema,
-    )
-
-    return response.choices[0].message.parsed
+    async def analyze_image(self, image_bytes: bytes, mode: str) -> dict:
+        """
+        V7 Vision Logic: Analyzes images of ingredients or prepared dishes.
+        """
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
 
-# NEW: The Smart Recommendation Logic
-def get_smart_recommendation(remaining_cal: int, existing_ingredients: list, slot: str):
-    """
-    AI-driven gap-filling logic based on nutritional needs, inventory, and specific meal slot.
-    """
-    prompt = (
-        f"The user has {remaining_cal} calories remaining today and wants a {slot} recommendation. "
-        f"Their current shopping list includes: {', '.join(existing_ingredients)}. "
-        f"Recommend a single dish name suitable for {slot} that fits within the calorie limit. "
-        "Format the response exactly as 'Dish Name: 1-sentence culinary reason why'."
-    )
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        prompts = {
+            "pantry": "Identify all raw food ingredients in this image. For each, suggest a likely quantity and unit. Return a JSON list of objects with 'name', 'quantity', and 'unit'.",
+            "dish": "Identify the prepared cooked dish in this image. Return a single JSON object with 'name' and 'cuisine'."
+        }
+
+        response = await self.client.chat.completions.create(
+            model=VISION_MODEL, # Using full gpt-4o for high-fidelity vision
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompts.get(mode, prompts["pantry"])},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    ],
+                }
+            ],
+            response_format={"type": "json_object"} # Forcing structured vision output
+        )
+
+        return json.loads(response.choices[0].message.content)
+
+    async def extract_recipe(self, input_text: str) -> RecipeSchema:
+        """
+        Expert-level prompt to ensure descriptive, high-quality recipe content.
+        """
+        response = await self.client.beta.chat.completions.parse(
+            model=RECIPE_MODEL,
+            messages=[
+                {"role": "system", "content": RECIPE_SYSTEM_INSTRUCTION},
+                {"role": "user", "content": f"Create a professional, descriptive recipe for: {input_text}"},
+            ],
+            response_format=RecipeSchema,
+        )
+
+        return response.choices[0].message.parsed
+
+    async def recommend(self, remaining_cal: int, existing_ingredients: list, slot: str) -> str:
+        """
+        AI-driven gap-filling logic based on nutritional needs, inventory, and specific meal slot.
+        """
+        prompt = (
+            f"The user has {remaining_cal} calories remaining today and wants a {slot} recommendation. "
+            f"Their current shopping list includes: {', '.join(existing_ingredients)}. "
+            f"Recommend a single dish name suitable for {slot} that fits within the calorie limit. "
+            "Format the response exactly as 'Dish Name: 1-sentence culinary reason why'."
+        )
+
+        response = await self.client.chat.completions.create(
+            model=CHAT_MODEL,
             messages=[
                 {"role": "system", "content": "You are a health-focused culinary advisor."},
                 {"role": "user", "content": prompt}
             ]
         )
         return response.choices[0].message.content
-    except Exception as e:
-        print(f"AI Recommendation Error: {e}")
-        return f"Light {slot} Salad: To keep you refreshed and within your calorie goals."
-    
-def get_unit_conversion(ingredient_name: str, quantity: float, from_unit: str, to_unit: str) -> float:
-    """
-    Uses AI to dynamically convert non-standard units (pcs, bunches) to standard ones (grams/ml).
-    Example: "3 pieces of tomatoes" -> "300 grams"
-    """
-    prompt = (
-        f"In the context of cooking, convert {quantity} {from_unit} of {ingredient_name} to {to_unit}. "
-        f"Return ONLY the numerical value as a float. If you cannot convert, return the original quantity."
-    )
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+
+    async def choose_recommendation(self, remaining_cal: int, slot: str, candidates: list) -> str:
+        """
+        Lets the model pick and explain one of the locally pre-ranked dishes,
+        so it never invents a dish the kitchen has no recipe for.
+        """
+        options = "\n".join(
+            f"- {c['name']} ({c['calories']:.0f} kcal, {c['protein_g'] or 0:.0f}g protein, "
+            f"uses {c['matching_ingredients']} ingredients they already have or plan to buy)"
+            for c in candidates
+        )
+        prompt = (
+            f"The user has {remaining_cal} calories remaining today and wants a {slot} recommendation. "
+            f"Choose exactly one dish from this list of their saved recipes:\n{options}\n"
+            "Format the response exactly as 'Dish Name: 1-sentence culinary reason why', using the dish name as listed."
+        )
+        response = await self.client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a health-focused culinary advisor."},
+                {"role": "user", "content": prompt}
+            ]
+        )
+        return response.choices[0].message.content
+
+    async def unit_factor(self, ingredient_name: str, from_unit: str, to_unit: str) -> Optional[float]:
+        """
+        Asks the model how many `to_unit` make up one `from_unit` of an ingredient.
+        Returns None when the model's answer is not a number, so callers never memoize a guess.
+        Example: ("tomato", "piece", "grams") -> 120.0
+        """
+        prompt = (
+            f"In the context of cooking, how many {to_unit} are in 1 {from_unit} of {ingredient_name}? "
+            f"Return ONLY the numerical value as a float. If you cannot convert, return UNKNOWN."
+        )
+
+        response = await self.client.chat.completions.create(
+            model=CHAT_MODEL,
             messages=[{"role": "user", "content": prompt}]
         )
         # Extract only the number from the response
         result = response.choices[0].message.content.strip()
-        return float(''.join(c for c in result if c.isdigit() or c == '.'))
-    except Exception:
-        return quantity # Fallback to original if AI fails
\ No newline at end of file
+        try:
+            factor = float(''.join(c for c in result if c.isdigit() or c == '.'))
+        except ValueError:
+            return None
+        return factor if factor > 0 else None
+
+def make_provider(name: str = AI_PROVIDER) -> AIProvider:
+    if name == "fake":
+        return FakeAIProvider(latency_ms=FAKE_AI_LATENCY_MS, jitter_ms=FAKE_AI_JITTER_MS)
+    if name == "openai":
+        return OpenAIProvider()
+    raise ValueError(f"Unknown AI_PROVIDER: {name}")
+
+# Active provider; swap with set_provider() in tests and benchmarks
+provider: AIProvider = make_provider()
+
+def set_provider(new_provider: AIProvider) -> AIProvider:
+    """Installs a provider and returns the previous one."""
+    global provider
+    previous, provider = provider, new_provider
+    return previous
+
+# Every call below goes through ai_governor: limits, deadline, retries and
+# breaker per model. A call with no answer and no fallback raises AIUnavailable.
+
+def generate_professional_image(prompt: str):
+    with metrics.track_ai_call():
+        return governor.run(IMAGE_MODEL, lambda: provider.generate_image(prompt), deadline=AI_IMAGE_DEADLINE_SECONDS)
+
+def generate_professional_images(prompts: list) -> list:
+    """Generates all prompts concurrently under the image model's limits; one URL or exception per prompt."""
+    with metrics.track_ai_call():
+        return governor.map(
+            IMAGE_MODEL, [partial(provider.generate_image, prompt) for prompt in prompts], deadline=AI_IMAGE_DEADLINE_SECONDS
+        )
+
+def analyze_image_vision(image_bytes: bytes, mode: str = "pantry") -> dict:
+    with metrics.track_ai_call():
+        return governor.run(VISION_MODEL, lambda: provider.analyze_image(image_bytes, mode))
+
+async def analyze_image_vision_async(image_bytes: bytes, mode: str = "pantry") -> dict:
+    """analyze_image_vision for async endpoints; waits without holding a threadpool thread."""
+    with metrics.track_ai_call():
+        return await governor.run_async(VISION_MODEL, lambda: provider.analyze_image(image_bytes, mode))
+
+def normalize_dish_name(text: str) -> str:
+    """Case- and whitespace-insensitive form of a dish request ("  Chicken  Tikka" -> "chicken tikka")."""
+    return " ".join(text.lower().split())
+
+def recipe_cache_key(input_text: str) -> str:
+    """
+    Content address of an extraction request: identical model, instructions
+    and (normalized) dish name always map to the same completion.
+    """
+    payload = "\x1f".join([RECIPE_MODEL, RECIPE_SYSTEM_INSTRUCTION, normalize_dish_name(input_text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def extract_recipe_logic(input_text: str) -> RecipeSchema:
+    with metrics.track_ai_call():
+        return governor.run(RECIPE_MODEL, lambda: provider.extract_recipe(input_text))
+
+# NEW: The Smart Recommendation Logic
+def get_smart_recommendation(remaining_cal: int, existing_ingredients: list, slot: str):
+    with metrics.track_ai_call():
+        return governor.run(
+            CHAT_MODEL, lambda: provider.recommend(remaining_cal, existing_ingredients, slot),
+            cache_key=("recommend", remaining_cal, slot, tuple(sorted(existing_ingredients)))
+        )
+
+def choose_recommendation(remaining_cal: int, slot: str, candidates: list) -> str:
+    with metrics.track_ai_call():
+        return governor.run(CHAT_MODEL, lambda: provider.choose_recommendation(remaining_cal, slot, candidates))
+
+def get_unit_factor(ingredient_name: str, from_unit: str, to_unit: str) -> Optional[float]:
+    """None when the model has no factor for the pair; AIUnavailable when it could not be asked."""
+    with metrics.track_ai_call():
+        return governor.run(CHAT_MODEL, lambda: provider.unit_factor(ingredient_name, from_unit, to_unit))
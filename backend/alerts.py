@@ -0,0 +1,233 @@
+"""
+Expiry and low-stock alerts, computed off the request path.
+
+AlertScheduler calls evaluate() on a daemon thread every
+ALERT_INTERVAL_SECONDS, and immediately when woken after a pantry write. A
+run only looks at pantry rows whose state can have changed since the
+previous run:
+  * rows with last_updated on or after the previous run's date (the
+    column is a date, so rows written earlier that day are looked at again),
+  * rows whose expiry_date entered the warning window since then,
+  * rows whose expiry_date has passed since then.
+The first run after start-up looks at every row that meets a condition or
+still has an open alert.
+
+Each (kind, pantry row) pair has at most one open alert. An alert is
+resolved when its condition clears (the item is used up, restocked or
+re-dated), so expired items are not reported forever. Acknowledging an
+alert only hides it from the feed. The feed is the pantry_alerts table read
+with an id cursor: poll with since=<last id seen> for new alerts, or use
+since=0 for the full open set.
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+import models
+
+# An item is "expiring" this many days before its expiry_date
+ALERT_EXPIRY_WINDOW_DAYS = int(os.getenv("ALERT_EXPIRY_WINDOW_DAYS", "3"))
+ALERT_INTERVAL_SECONDS = float(os.getenv("ALERT_INTERVAL_SECONDS", "300"))
+MAX_FEED_LIMIT = 500
+# Pantry ids per IN query, below SQLite's bound-parameter limit
+ID_BATCH_SIZE = 5000
+
+EXPIRY_KINDS = ("expiring", "expired")
+
+log = logging.getLogger("smartkitchen.alerts")
+
+def _conditions(item: models.PantryItem, name: str, today: date, window: int) -> dict:
+    """{kind: message} for every alert condition the pantry row meets today."""
+    found = {}
+    quantity = item.current_quantity or 0
+    if item.expiry_date is not None and quantity > 0:
+        if item.expiry_date < today:
+            found["expired"] = f"{name} expired on {item.expiry_date.isoformat()}"
+        elif item.expiry_date <= today + timedelta(days=window):
+            found["expiring"] = f"{name} expires on {item.expiry_date.isoformat()}"
+    if item.min_threshold is not None and quantity < item.min_threshold:
+        found["low_stock"] = f"{name} is low: {quantity:g} {item.unit} left (minimum {item.min_threshold:g})"
+    return found
+
+def _candidates(db: Session, today: date, since: Optional[date], window: int, household_id: Optional[int]) -> list:
+    horizon = today + timedelta(days=window)
+    query = db.query(models.PantryItem, models.Ingredient.name).join(
+        models.Ingredient, models.Ingredient.id == models.PantryItem.ingredient_id
+    )
+    if household_id is not None:
+        query = query.filter(models.PantryItem.household_id == household_id)
+    if since is None:
+        with_open_alerts = db.query(models.PantryAlert.pantry_item_id).filter(models.PantryAlert.open_key.isnot(None))
+        return query.filter(or_(
+            models.PantryItem.expiry_date <= horizon,
+            models.PantryItem.current_quantity < models.PantryItem.min_threshold,
+            models.PantryItem.id.in_(with_open_alerts),
+        )).all()
+    return query.filter(or_(
+        models.PantryItem.last_updated >= since,
+        and_(models.PantryItem.expiry_date > since + timedelta(days=window), models.PantryItem.expiry_date <= horizon),
+        and_(models.PantryItem.expiry_date >= since, models.PantryItem.expiry_date < today),
+    )).all()
+
+def evaluate(db: Session, today: Optional[date] = None, since: Optional[date] = None,
+             window: int = ALERT_EXPIRY_WINDOW_DAYS, household_id: Optional[int] = None) -> dict:
+    """
+    Raises and resolves alerts for the pantry rows that may have changed since
+    the run on `since` (every relevant row when None), in one household or
+    all of them. Not committed here.
+    """
+    today = today or date.today()
+    rows = _candidates(db, today, since, window, household_id)
+    report = {"evaluated": len(rows), "raised": 0, "resolved": 0}
+    if not rows:
+        return report
+
+    open_alerts = defaultdict(dict)
+    item_ids = [item.id for item, _ in rows]
+    for start in range(0, len(item_ids), ID_BATCH_SIZE):
+        for alert in db.query(models.PantryAlert).filter(
+            models.PantryAlert.pantry_item_id.in_(item_ids[start:start + ID_BATCH_SIZE]),
+            models.PantryAlert.open_key.isnot(None)
+        ):
+            open_alerts[alert.pantry_item_id][alert.kind] = alert
+
+    now = datetime.utcnow()
+    wanted = {}
+    for item, name in rows:
+        found = _conditions(item, name, today, window)
+        wanted[item.id] = (item, found)
+        for kind, alert in list(open_alerts[item.id].items()):
+            # A re-dated item is new stock: its old expiry alert no longer applies
+            redated = kind in EXPIRY_KINDS and alert.expiry_date != item.expiry_date
+            if kind not in found or redated:
+                alert.open_key = None
+                alert.resolved_at = now
+                del open_alerts[item.id][kind]
+                report["resolved"] += 1
+    # Free the open_keys before new alerts claim them
+    db.flush()
+
+    for item_id, (item, found) in wanted.items():
+        for kind, message in found.items():
+            alert = open_alerts[item_id].get(kind)
+            if alert is not None:
+                alert.message = message
+                continue
+            db.add(models.PantryAlert(
+                household_id=item.household_id, pantry_item_id=item_id, ingredient_id=item.ingredient_id,
+                kind=kind, message=message,
+                expiry_date=item.expiry_date if kind in EXPIRY_KINDS else None,
+                open_key=f"{kind}:{item_id}", created_at=now
+            ))
+            report["raised"] += 1
+    db.flush()
+    return report
+
+def feed(db: Session, household_id: int, since: int = 0, limit: int = 100, include_acknowledged: bool = False,
+         include_resolved: bool = False, kinds: Optional[list] = None) -> list:
+    """The household's alerts with id > since, oldest first; open and unacknowledged ones unless asked otherwise."""
+    query = (
+        db.query(models.PantryAlert, models.Ingredient.name)
+        .join(models.Ingredient, models.Ingredient.id == models.PantryAlert.ingredient_id)
+        .filter(models.PantryAlert.household_id == household_id, models.PantryAlert.id > since)
+    )
+    if not include_resolved:
+        query = query.filter(models.PantryAlert.open_key.isnot(None))
+    if not include_acknowledged:
+        query = query.filter(models.PantryAlert.acknowledged_at.is_(None))
+    if kinds:
+        query = query.filter(models.PantryAlert.kind.in_(kinds))
+    return [{
+        "id": alert.id, "kind": alert.kind, "item": name, "message": alert.message,
+        "expiry": alert.expiry_date, "created_at": alert.created_at,
+        "acknowledged_at": alert.acknowledged_at, "resolved_at": alert.resolved_at
+    } for alert, name in query.order_by(models.PantryAlert.id).limit(min(limit, MAX_FEED_LIMIT))]
+
+def acknowledge(db: Session, household_id: int, alert_ids: Optional[list] = None, up_to: Optional[int] = None) -> int:
+    """Marks the household's given alerts, or all with id <= up_to, as seen. Returns the count."""
+    query = db.query(models.PantryAlert).filter(
+        models.PantryAlert.household_id == household_id, models.PantryAlert.acknowledged_at.is_(None)
+    )
+    if alert_ids is not None:
+        query = query.filter(models.PantryAlert.id.in_(alert_ids))
+    if up_to is not None:
+        query = query.filter(models.PantryAlert.id <= up_to)
+    count = query.update({"acknowledged_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return count
+
+class AlertScheduler:
+    """
+    Runs evaluate() periodically on a daemon thread. The incremental
+    watermark is the date of the last successful run, not a timestamp:
+    pantry_inventory.last_updated only has day granularity, and the
+    inclusive `last_updated >= since` match is what keeps a write made later
+    on the same day from being missed. Every run on a given day therefore
+    re-reads that day's writes. The watermark lives in memory, so a restart
+    begins with one full pass. Runs are serialized; if two processes
+    race, the unique open_key rejects the duplicate and the loser retries later.
+    """
+
+    def __init__(self, session_factory, interval: float = ALERT_INTERVAL_SECONDS,
+                 window: int = ALERT_EXPIRY_WINDOW_DAYS):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.window = window
+        self._since = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="alert-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def wake(self):
+        """Requests a run now, e.g. after a pantry write was committed."""
+        self._wake.set()
+
+    def run_once(self, today: Optional[date] = None) -> dict:
+        today = today or date.today()
+        with self._lock:
+            report = self._evaluate(today, self._since)
+            # A date, matching last_updated; see the class docstring
+            self._since = today
+            return report
+
+    def run_for_household(self, household_id: int, today: Optional[date] = None) -> dict:
+        """A full pass over one household's pantry, serialized with the scheduled runs; the watermark is left alone."""
+        with self._lock:
+            return self._evaluate(today or date.today(), None, household_id)
+
+    def _evaluate(self, today: date, since: Optional[date], household_id: Optional[int] = None) -> dict:
+        db = self.session_factory()
+        try:
+            report = evaluate(db, today, since, self.window, household_id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return report
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Alert scheduler run failed")
+            self._wake.wait(self.interval)
@@ -0,0 +1,249 @@
+"""
+Content-addressed image assets.
+
+Generated images are downloaded once, hashed (SHA-256 of the original
+bytes) and re-encoded as WebP and JPEG variants at every VARIANTS size. The
+variants are encoded in parallel on a small pool. thumbnail_url then points
+at GET /assets/{hash}/{size}, which serves bytes that can never change under
+that URL, so responses are marked immutable for a year and support Range
+requests. The same picture generated twice is stored once.
+
+The store is pluggable: FilesystemAssetStore (ASSET_DIR) is the default,
+and any backend that implements AssetStore can be swapped in. ASSET_STORE=none
+keeps the generator's URLs as they are.
+
+    python assets.py            # backfill: move remote thumbnail_urls into the store
+    python assets.py --dry-run  # only count the rows that would be processed
+
+Rows whose remote link has already expired get a fresh image job instead.
+"""
+import abc
+import argparse
+import base64
+import hashlib
+import io
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import httpx
+from PIL import Image, ImageOps
+from sqlalchemy.orm import Session
+import catalog
+import database
+import image_worker
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+ASSET_DIR = os.getenv("ASSET_DIR", os.path.join(basedir, "media"))
+# Prefix for the URLs written to thumbnail_url. Empty stores host-independent
+# "/assets/..." paths; set it to a CDN or public origin to store absolute URLs.
+ASSET_BASE_URL = os.getenv("ASSET_BASE_URL", "").rstrip("/")
+ASSET_WORKERS = int(os.getenv("ASSET_WORKERS", "4"))
+ASSET_DOWNLOAD_TIMEOUT = float(os.getenv("ASSET_DOWNLOAD_TIMEOUT", "30"))
+# Refuse to download anything bigger than this
+MAX_ASSET_BYTES = 20 * 1024 * 1024
+# Longest side in pixels per variant; "card" is what thumbnail_url points at
+VARIANTS = {"thumb": 160, "card": 480, "full": 1024}
+DEFAULT_VARIANT = "card"
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+ENCODE_QUALITY = 82
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+# Asset URLs written under an earlier ASSET_BASE_URL (e.g. the old http://localhost:8000 default)
+_FOREIGN_ASSET_URL = re.compile(r"^https?://[^/]+/assets/([0-9a-f]{64})/(\w+)$")
+
+class AssetStore(abc.ABC):
+    """Storage backend for encoded variants, addressed by key ("ab/<hash>/card.webp")."""
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def write(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def read(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """A filesystem path the API can stream from, if the backend has one."""
+        return None
+
+class FilesystemAssetStore(AssetStore):
+    def __init__(self, root: str = ASSET_DIR):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        return path if os.path.exists(path) else None
+
+_encoder = ThreadPoolExecutor(max_workers=ASSET_WORKERS, thread_name_prefix="asset-encoder")
+
+def variant_key(digest: str, size: str, extension: str) -> str:
+    return f"{digest[:2]}/{digest}/{size}.{extension}"
+
+def asset_url(digest: str, size: str = DEFAULT_VARIANT) -> str:
+    return f"{ASSET_BASE_URL}/assets/{digest}/{size}"
+
+def is_asset_url(url: Optional[str]) -> bool:
+    return bool(url) and url.startswith(f"{ASSET_BASE_URL}/assets/")
+
+def valid_hash(digest: str) -> bool:
+    return bool(_HASH.match(digest))
+
+def fetch(url: str) -> bytes:
+    """
+    Downloads an image; data: URLs are decoded locally. The body is streamed
+    and the download aborted once it exceeds MAX_ASSET_BYTES.
+    """
+    if url.startswith("data:"):
+        return base64.b64decode(url.split(",", 1)[1])
+    too_large = ValueError(f"image is larger than {MAX_ASSET_BYTES} bytes")
+    with httpx.Client(timeout=ASSET_DOWNLOAD_TIMEOUT, follow_redirects=True) as client:
+        with client.stream("GET", url) as response:
+            response.raise_for_status()
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > MAX_ASSET_BYTES:
+                raise too_large
+            # The header may be missing or wrong, so the body is capped as it arrives
+            data = bytearray()
+            for chunk in response.iter_bytes():
+                data.extend(chunk)
+                if len(data) > MAX_ASSET_BYTES:
+                    raise too_large
+            return bytes(data)
+
+def _encode(image: Image.Image, side: int, image_format: str) -> bytes:
+    variant = image.copy()
+    variant.thumbnail((side, side), Image.LANCZOS)
+    out = io.BytesIO()
+    variant.save(out, format=image_format, quality=ENCODE_QUALITY)
+    return out.getvalue()
+
+def ingest(store: AssetStore, data: bytes) -> str:
+    """Stores every variant of an image (once per distinct content) and returns its hash."""
+    digest = hashlib.sha256(data).hexdigest()
+    wanted = [
+        (size, extension) for size in VARIANTS for extension in FORMATS
+        if not store.exists(variant_key(digest, size, extension))
+    ]
+    if not wanted:
+        return digest
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+    futures = {
+        (size, extension): _encoder.submit(_encode, image, VARIANTS[size], FORMATS[extension][0])
+        for size, extension in wanted
+    }
+    for (size, extension), future in futures.items():
+        store.write(variant_key(digest, size, extension), future.result())
+    return digest
+
+def publish(store: AssetStore, url: str) -> str:
+    """Downloads a freshly generated image into the store and returns its asset URL."""
+    return asset_url(ingest(store, fetch(url)))
+
+def make_store() -> Optional[AssetStore]:
+    """ASSET_STORE=filesystem (default) or none, which keeps the generator's URLs as they are."""
+    backend = os.getenv("ASSET_STORE", "filesystem")
+    if backend == "filesystem":
+        return FilesystemAssetStore()
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown ASSET_STORE '{backend}'")
+
+def backfill(db: Session, store: AssetStore, dry_run: bool = False) -> dict:
+    """
+    Moves every remote thumbnail_url into the store, ASSET_WORKERS downloads
+    at a time. Links that no longer resolve are re-queued as image jobs.
+    Links to stored assets under another ASSET_BASE_URL are rewritten to the
+    current one without downloading anything.
+    """
+    rows, relinks = [], []
+    for target_type, model in image_worker.TARGET_MODELS.items():
+        for row in db.query(model).filter(model.thumbnail_url.isnot(None)):
+            if is_asset_url(row.thumbnail_url):
+                continue
+            foreign = _FOREIGN_ASSET_URL.match(row.thumbnail_url)
+            if foreign and foreign.group(2) in VARIANTS and store.exists(variant_key(foreign.group(1), foreign.group(2), "webp")):
+                relinks.append((target_type, row, asset_url(foreign.group(1), foreign.group(2))))
+            else:
+                rows.append((target_type, row))
+    report = {"remote": len(rows), "relinked": len(relinks), "stored": 0, "requeued": 0}
+    if dry_run or not (rows or relinks):
+        return report
+
+    def move(url):
+        try:
+            return publish(store, url), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=ASSET_WORKERS) as pool:
+        results = list(pool.map(move, [row.thumbnail_url for _, row in rows]))
+
+    for (target_type, row), (url, error) in zip(rows, results):
+        if url:
+            row.thumbnail_url = url
+            report["stored"] += 1
+        else:
+            print(f"❌ {target_type} {row.id}: {error}")
+            row.thumbnail_url = None
+            prompt = f"{row.cuisine} {row.name}" if target_type == "dish" else f"fresh raw {row.name}"
+            image_worker.enqueue_image(db, target_type, row.id, prompt)
+            report["requeued"] += 1
+    for target_type, row, url in relinks:
+        row.thumbnail_url = url
+
+    for target_type, row in rows + [(target_type, row) for target_type, row, _ in relinks]:
+        if target_type == "dish":
+            catalog.bump_dish_versions(db, [row.id])
+        else:
+            catalog.bump_dish_versions(db, ingredient_id=row.id)
+    # Listings embed thumbnails too, so their ETags must change with them
+    catalog.bump_catalog_version(db)
+    db.commit()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy remote thumbnail_url images into the local asset store.")
+    parser.add_argument("--dry-run", action="store_true", help="only count rows with remote images")
+    args = parser.parse_args()
+    db = database.SessionLocal()
+    try:
+        report = backfill(db, make_store(), dry_run=args.dry_run)
+    finally:
+        db.close()
+    if args.dry_run:
+        print(f"{report['remote']} rows still point at remote images; {report['relinked']} need their asset URL rewritten.")
+    else:
+        print(
+            f"✅ Stored {report['stored']} images; re-queued {report['requeued']} expired links for regeneration; "
+            f"rewrote {report['relinked']} asset URLs."
+        )
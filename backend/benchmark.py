@@ -0,0 +1,401 @@
+"""
+Throughput benchmark for the hot endpoints.
+
+    python benchmark.py --dishes 1000 --concurrency 32 --duration 10
+    python benchmark.py --compare-async   # DB_ASYNC=false vs DB_ASYNC=true
+    python benchmark.py --json out.json --baseline previous.json --tolerance 0.2
+    python benchmark.py --serialization   # CPU per 1k-dish /recipes payload, old vs new encoder
+    python benchmark.py --households 10000 --only pantry shopping health
+    python benchmark.py --tenant-scaling 100 1000 10000 --only pantry shopping health
+
+Requests are driven in-process through httpx's ASGI transport, so the numbers
+reflect app + database cost without network noise. DATABASE_URL selects the
+target (defaults to a local SQLite file, seeded on first run). AI calls go to
+the deterministic fake provider unless AI_PROVIDER is set; --ai-latency-ms
+simulates model round-trips.
+
+Each scenario reports throughput, p50/p99 latency and SQL statements issued
+per request. With --households N the plan, pantry and shopping rows are
+copied into N kitchens and every request acts for one of
+--active-households of them, so --tenant-scaling can show that per-household
+latency does not grow with the total data size. With --baseline the run exits non-zero when any scenario's p99
+or queries/request grew, or throughput fell, by more than --tolerance.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+DEFAULT_BENCH_DB = "sqlite:///./benchmark.db"
+HOT_ENDPOINTS = [
+    "/recipes?limit=50",
+    "/recipes/1/pairings?limit=10",
+    "/shopping-list",
+    "/pantry",
+    "/health-stats/{today}",
+    "/health-stats?from={today}&to={week_end}",
+]
+# Write scenarios; each request gets a fresh plan id / dish name from a generator
+WRITE_SCENARIOS = ["complete", "extract"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=1000)
+    parser.add_argument("--ingredients", type=int, default=300)
+    parser.add_argument("--plans", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint")
+    parser.add_argument("--compare-async", action="store_true", help="run once per DB_ASYNC mode")
+    parser.add_argument("--complete-pool", type=int, default=3000, help="fresh plans created for the complete scenario")
+    parser.add_argument("--ai-latency-ms", type=float, default=None, help="simulated latency of the fake AI provider")
+    parser.add_argument("--only", nargs="*", help="substrings selecting which scenarios to run")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression vs --baseline")
+    parser.add_argument("--serialization", action="store_true", help="measure CPU per encoded recipe payload instead")
+    parser.add_argument("--payload-dishes", type=int, default=1000, help="dishes per payload for --serialization")
+    parser.add_argument("--rounds", type=int, default=20, help="payloads encoded per path for --serialization")
+    parser.add_argument("--households", type=int, default=1, help="kitchens sharing the database")
+    parser.add_argument("--active-households", type=int, default=500, help="kitchens the requests are spread over")
+    parser.add_argument("--tenant-scaling", type=int, nargs="+", metavar="N",
+                        help="run once per household count, each on its own database, and compare latencies")
+    return parser.parse_args()
+
+def seed(db, dishes: int, ingredients: int, plans: int, households: int = 1):
+    """Fills an empty database with synthetic catalog rows and `households` identical kitchens."""
+    import models
+    import pairings
+    import shopping_list
+    import tenancy
+    existing = db.query(models.Dish).count()
+    if existing:
+        print(f"Using existing data ({existing} dishes); point DATABASE_URL at an empty database to reseed.")
+        return
+    tenancy.ensure_household(tenancy.DEFAULT_HOUSEHOLD_ID)
+
+    rng = random.Random(42)
+    ings = [models.Ingredient(name=f"ingredient {i}", category=rng.choice(["Produce", "Dairy", "Pantry"]))
+            for i in range(ingredients)]
+    db.add_all(ings)
+    db.flush()
+    cuisines = ["Indian", "Italian", "Mexican", "Thai", "French"]
+    meal_types = ["Breakfast", "Lunch", "Dinner", "Lunch, Dinner"]
+    for i in range(dishes):
+        dish = models.Dish(
+            name=f"Dish {i}", description="Benchmark dish", cuisine=rng.choice(cuisines),
+            meal_type=rng.choice(meal_types), prep_steps=["Prepare", "Cook", "Serve"],
+            nutrition={"calories": rng.randint(200, 900), "protein": f"{rng.randint(5, 60)}g",
+                       "carbs": f"{rng.randint(10, 120)}g", "fats": f"{rng.randint(3, 50)}g"}
+        )
+        db.add(dish)
+        db.flush()
+        for ing in rng.sample(ings, 8):
+            db.add(models.DishIngredient(dish_id=dish.id, ingredient_id=ing.id,
+                                         quantity=rng.randint(1, 500), unit=rng.choice(["g", "kg"])))
+    # Dated yesterday, so the alert scheduler's incremental runs skip the seed rows
+    yesterday = date.today() - timedelta(days=1)
+    for ing in ings[: ingredients // 2]:
+        db.add(models.PantryItem(household_id=tenancy.DEFAULT_HOUSEHOLD_ID, ingredient_id=ing.id,
+                                 current_quantity=rng.randint(0, 1000), unit="g", min_threshold=100,
+                                 expiry_date=date.today() + timedelta(days=rng.randint(-5, 30)), last_updated=yesterday))
+    db.flush()
+    dish_ids = [d for (d,) in db.query(models.Dish.id)]
+    for i in range(plans):
+        db.add(models.MealPlan(household_id=tenancy.DEFAULT_HOUSEHOLD_ID, dish_id=rng.choice(dish_ids),
+                               planned_date=date.today() + timedelta(days=i % 28),
+                               meal_slot=rng.choice(["Breakfast", "Lunch", "Dinner"])))
+    db.flush()
+    shopping_list.rebuild(db, fix=True)
+    pairings.rebuild(db)
+    if households > 1:
+        copy_households(db, households)
+    db.commit()
+
+def copy_households(db, households: int):
+    """Clones the default kitchen's tenant rows into households 2..N with INSERT ... SELECT."""
+    from sqlalchemy import insert, select, true
+    import models
+    import tenancy
+    db.execute(insert(models.Household), [
+        {"id": i, "name": f"Kitchen {i}", "token": tenancy.new_token()} for i in range(2, households + 1)
+    ])
+    others = models.Household.__table__
+    for model in (models.PantryItem, models.MealPlan, models.ShoppingListItem):
+        table = model.__table__
+        columns = [c for c in table.c if c.name not in ("id", "household_id")]
+        # Every default-kitchen row times every other household
+        db.execute(table.insert().from_select(
+            ["household_id", *(c.name for c in columns)],
+            select(others.c.id, *columns).join_from(table, others, true()).where(
+                table.c.household_id == tenancy.DEFAULT_HOUSEHOLD_ID, others.c.id != tenancy.DEFAULT_HOUSEHOLD_ID
+            )
+        ))
+
+class QueryCounter:
+    """Counts SQL statements on the sync and async engines."""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, *_):
+        self.count += 1
+
+    def install(self):
+        from sqlalchemy import event
+        import database
+        engines = [database.engine]
+        if database.async_engine is not None:
+            engines.append(database.async_engine.sync_engine)
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+async def drive(client, label: str, next_request, concurrency: int, duration: float, queries: QueryCounter) -> dict:
+    """Hammers one scenario; next_request() returns (method, path, headers) for each call."""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, headers = next_request()
+            start = time.perf_counter()
+            response = await client.request(method, path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    queries_before = queries.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "path": label,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0.0,
+        "queries_per_request": (queries.count - queries_before) / len(latencies) if latencies else 0.0,
+        "errors": errors,
+    }
+
+def build_scenarios(db, complete_pool: int, active_households: int) -> list:
+    """(label, next_request) pairs for every read and write scenario."""
+    import models
+    import shopping_list
+    import tenancy
+    today = date.today()
+    rng = random.Random()
+    # The default kitchen has no token and is selected by sending none
+    tokens = [token for (token,) in db.query(models.Household.token)]
+    active = rng.sample(tokens, min(len(tokens), active_households))
+
+    def tenant() -> dict:
+        token = rng.choice(active)
+        return {"X-Household-Token": token} if token else {}
+
+    scenarios = []
+    for template in HOT_ENDPOINTS:
+        path = template.format(today=today.isoformat(), week_end=(today + timedelta(days=6)).isoformat())
+        scenarios.append((path, lambda path=path: ("GET", path, tenant())))
+
+    # Completing a plan deletes it, so the scenario consumes a pool of fresh plans in the default kitchen
+    dish_ids = [d for (d,) in db.query(models.Dish.id).limit(200)]
+    pool = [models.MealPlan(household_id=tenancy.DEFAULT_HOUSEHOLD_ID, dish_id=rng.choice(dish_ids),
+                            planned_date=today, meal_slot="Dinner")
+            for _ in range(complete_pool)] if dish_ids else []
+    db.add_all(pool)
+    db.flush()
+    deltas = {}
+    for plan in pool:
+        deltas[plan.dish_id] = deltas.get(plan.dish_id, 0) + 1
+    shopping_list.apply_plan_deltas(db, tenancy.DEFAULT_HOUSEHOLD_ID, deltas)
+    pool_ids = [plan.id for plan in pool]
+    db.commit()
+    plan_ids = itertools.chain(pool_ids, itertools.repeat(0))
+    scenarios.append(("POST /meal-planner/{id}/complete",
+                      lambda: ("POST", f"/meal-planner/{next(plan_ids)}/complete", None)))
+
+    # Random hex names share almost no trigrams, so none fuzzily match a cached dish
+    dish_numbers = itertools.count()
+    run_tag = time.time()
+    scenarios.append(("POST /extract-recipe (new dish)",
+                      lambda: ("POST", "/extract-recipe?text_input=" +
+                               hashlib.sha1(f"{run_tag}:{next(dish_numbers)}".encode()).hexdigest()[:12], None)))
+    return scenarios
+
+async def run_suite(args) -> list:
+    import httpx
+    import database
+    import main
+    import migrate
+    migrate.upgrade(log=lambda message: None)
+    db = database.SessionLocal()
+    try:
+        seed(db, args.dishes, args.ingredients, args.plans, args.households)
+    finally:
+        db.close()
+    # One full alert pass up front, so the scheduler is incremental while requests are timed
+    main.alert_scheduler.run_once()
+
+    db = database.SessionLocal()
+    try:
+        scenarios = build_scenarios(db, args.complete_pool, args.active_households)
+    finally:
+        db.close()
+    if args.only:
+        scenarios = [(label, fn) for label, fn in scenarios if any(s in label for s in args.only)]
+
+    queries = QueryCounter()
+    queries.install()
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for label, next_request in scenarios:
+                method, path, headers = next_request()
+                await client.request(method, path, headers=headers) # warm caches and pools
+                results.append(await drive(client, label, next_request, args.concurrency, args.duration, queries))
+    return results
+
+def serialization_benchmark(args) -> list:
+    """
+    CPU time per encoded payload of --payload-dishes recipes. The legacy path
+    loads ORM entities, flattens dish.__dict__, validates against
+    RecipeResponse and JSON-encodes, as the endpoints used to. The fast path
+    is serializers.serialize_dishes plus orjson.
+    """
+    from pydantic import TypeAdapter
+    from sqlalchemy.orm import joinedload, selectinload
+    import database
+    import migrate
+    import models
+    import schemas
+    import serializers
+    migrate.upgrade(log=lambda message: None)
+    db = database.SessionLocal()
+    try:
+        seed(db, max(args.dishes, args.payload_dishes), args.ingredients, args.plans)
+    finally:
+        db.close()
+    adapter = TypeAdapter(list[schemas.RecipeResponse])
+
+    def legacy(db):
+        dishes = db.query(models.Dish).options(
+            selectinload(models.Dish.ingredients).joinedload(models.DishIngredient.ingredient)
+        ).order_by(models.Dish.id).limit(args.payload_dishes).all()
+        payload = [{
+            **dish.__dict__,
+            "ingredients": [{
+                "name": ing.ingredient.name, "quantity": ing.quantity, "unit": ing.unit,
+                "category": ing.ingredient.category, "thumbnail_url": ing.ingredient.thumbnail_url
+            } for ing in dish.ingredients]
+        } for dish in dishes]
+        return json.dumps(adapter.dump_python(adapter.validate_python(payload), mode="json")).encode()
+
+    def fast(db):
+        rows = db.query(*serializers.DISH_COLUMNS).order_by(models.Dish.id).limit(args.payload_dishes).all()
+        return serializers.FastJSONResponse(serializers.serialize_dishes(db, rows)).body
+
+    results = []
+    for label, encode in (("legacy ORM + pydantic + json", legacy), ("column rows + orjson", fast)):
+        cpu, size = [], 0
+        for _ in range(args.rounds):
+            db = database.SessionLocal()
+            try:
+                start = time.process_time()
+                size = len(encode(db))
+                cpu.append(time.process_time() - start)
+            finally:
+                db.close()
+        cpu.sort()
+        results.append({"path": label, "cpu_ms": cpu[len(cpu) // 2] * 1000, "bytes": size})
+    return results
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Human-readable regressions of results against a baseline run."""
+    previous = {r["path"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        old = previous.get(r["path"])
+        if not old:
+            continue
+        if old["rps"] and r["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"{r['path']}: throughput {old['rps']:.1f} -> {r['rps']:.1f} req/s")
+        if old["p99_ms"] and r["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{r['path']}: p99 {old['p99_ms']:.2f} -> {r['p99_ms']:.2f} ms")
+        if r["queries_per_request"] > old.get("queries_per_request", 0) * (1 + tolerance) + 0.5:
+            regressions.append(f"{r['path']}: queries/request {old.get('queries_per_request', 0):.1f} -> {r['queries_per_request']:.1f}")
+    return regressions
+
+def strip_option(argv: list, option: str, values: int) -> list:
+    """argv without `option` and the values that follow it."""
+    if option not in argv:
+        return argv
+    at = argv.index(option)
+    return argv[:at] + argv[at + 1 + values:]
+
+def print_results(label: str, results: list):
+    print(f"\n== {label} ==")
+    print(f"{'scenario':<48}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'q/req':>8}{'errors':>8}")
+    for r in results:
+        print(f"{r['path']:<48}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['queries_per_request']:>8.1f}{r['errors']:>8}")
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.environ.setdefault("DATABASE_URL", DEFAULT_BENCH_DB)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("AI_PROVIDER", "fake")
+    os.environ.setdefault("IMAGE_GENERATOR", "fake")
+    if args.ai_latency_ms is not None:
+        os.environ["FAKE_AI_LATENCY_MS"] = str(args.ai_latency_ms)
+
+    if args.serialization:
+        results = serialization_benchmark(args)
+        print(f"\n== CPU per {args.payload_dishes}-dish recipe payload (median of {args.rounds}) ==")
+        for r in results:
+            print(f"{r['path']:<36}{r['cpu_ms']:>10.1f} ms{r['bytes']:>12} bytes")
+        print(f"speedup: {results[0]['cpu_ms'] / results[1]['cpu_ms']:.1f}x")
+    elif args.tenant_scaling:
+        # Each size gets its own database file and process, so nothing is shared between runs
+        passthrough = strip_option(sys.argv[1:], "--tenant-scaling", len(args.tenant_scaling))
+        passthrough = strip_option(passthrough, "--json", 1)
+        runs = {}
+        for households in args.tenant_scaling:
+            out = f"benchmark_tenants_{households}.json"
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///./benchmark_tenants_{households}.db")
+            subprocess.run([sys.executable, __file__, *passthrough, "--households", str(households), "--json", out],
+                           env=env, check=True)
+            with open(out) as f:
+                runs[households] = {r["path"]: r for r in json.load(f)}
+        print("\n== p50 / p99 ms per request by household count ==")
+        print(f"{'scenario':<48}" + "".join(f"{n:>20}" for n in args.tenant_scaling))
+        for path in runs[args.tenant_scaling[0]]:
+            cells = [runs[n].get(path) for n in args.tenant_scaling]
+            print(f"{path:<48}" + "".join(f"{c['p50_ms']:>10.2f}{c['p99_ms']:>10.2f}" if c else f"{'-':>20}" for c in cells))
+    elif args.compare_async:
+        passthrough = [a for a in sys.argv[1:] if a != "--compare-async"]
+        for mode in ("false", "true"):
+            env = dict(os.environ, DB_ASYNC=mode)
+            subprocess.run([sys.executable, __file__, *passthrough], env=env, check=True)
+    else:
+        results = asyncio.run(run_suite(args))
+        print_results(f"DB_ASYNC={os.getenv('DB_ASYNC', 'true')}", results)
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(results, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            for line in regressions:
+                print(f"REGRESSION {line}")
+            sys.exit(1 if regressions else 0)
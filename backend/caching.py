@@ -0,0 +1,318 @@
+"""
+Caches shared by the read paths.
+
+TTLCache is a small in-process LRU for values whose keys already encode
+their freshness (dish versions, catalog versions, days).
+
+ReadThroughCache is for lookups whose rows change rarely but in place:
+ingredient name -> id, ingredient id -> name, a household's nutrition goals.
+A miss runs the loader and keeps the answer. Entries are invalidated from
+the SQLAlchemy session events registered with invalidate_on(): after_flush
+collects the keys of the changed rows and after_commit drops them, so a
+rolled-back write never evicts anything. Values a transaction wants to
+publish (e.g. ids of ingredients it created) go through set_after_commit and
+are dropped on rollback, so no cache ever points at a row that was never
+committed. set_from_read fills from read-only sessions at once, since
+before its first write a transaction only sees committed rows. Bulk UPDATE/DELETE statements bypass these events and must call
+invalidate() themselves.
+
+CACHE_BACKEND picks where ReadThroughCache entries live:
+  * local (default): a TTLCache per process. Enough for a single worker.
+  * memory: MemoryRedis, an in-process stand-in for the Redis client, so
+    the shared code path can run without a server.
+  * redis://host:port/db: a Redis server shared by every uvicorn worker.
+    Invalidations delete the shared key, so all workers stay coherent.
+    Requires the redis package.
+Either way, entries expire after their TTL and hits, misses and
+invalidations are counted per cache (GET /metrics/caches).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+import orjson
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+# Namespace for shared keys, so several deployments can share one Redis
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "smartkitchen")
+
+# Every named cache, for GET /metrics/caches
+caches = {}
+
+class TTLCache:
+    """Small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, ttl: float, maxsize: int = 512, name: Optional[str] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if name:
+            caches[name] = self
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "local", "hits": self.hits, "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None, "size": len(self._data),
+        }
+
+class MemoryRedis:
+    """
+    In-process stand-in for the part of the redis-py client the caches use:
+    get, set(ex=), mget and delete, with bytes values.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def mget(self, keys: list) -> list:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ex: Optional[float] = None) -> bool:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._data.clear()
+        return True
+
+def make_client(backend: str = CACHE_BACKEND):
+    """The shared client for CACHE_BACKEND, or None for per-process caches."""
+    if backend == "local":
+        return None
+    if backend == "memory":
+        return MemoryRedis()
+    if backend.startswith(("redis://", "rediss://", "unix://")):
+        import redis  # optional dependency, only needed for a shared server
+        return redis.Redis.from_url(backend)
+    raise ValueError(f"Unknown CACHE_BACKEND '{backend}'")
+
+shared_client = make_client()
+
+class ReadThroughCache:
+    """Size- and TTL-bounded lookup cache; see the module docstring for invalidation."""
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024, client=None):
+        self.name = name
+        self.ttl = ttl
+        self.client = client if client is not None else shared_client
+        self.local = TTLCache(ttl, maxsize=maxsize) if self.client is None else None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped per key on invalidation; a load that raced an invalidation is not stored
+        self._generations = {}
+        self._lock = threading.Lock()
+        caches[name] = self
+
+    def _shared_key(self, key) -> str:
+        return f"{CACHE_KEY_PREFIX}:{self.name}:{key}"
+
+    def _count(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_many(self, keys: list) -> dict:
+        """{key: value} for the keys that are cached."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        found = {}
+        if self.client is None:
+            for key in keys:
+                value = self.local.get(key)
+                if value is not None:
+                    found[key] = value
+        else:
+            for key, raw in zip(keys, self.client.mget([self._shared_key(key) for key in keys])):
+                if raw is not None:
+                    found[key] = orjson.loads(raw)
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set(self, key, value, generation: Optional[int] = None):
+        if value is None:
+            return
+        with self._lock:
+            if generation is not None and self._generations.get(key, 0) != generation:
+                return
+        if self.client is None:
+            self.local.set(key, value)
+        else:
+            # Redis takes whole seconds
+            self.client.set(self._shared_key(key), orjson.dumps(value), ex=max(1, int(self.ttl)))
+
+    def get_or_load(self, key, loader):
+        """The cached value, or loader() stored under key when it returns something other than None."""
+        value = self.get(key)
+        if value is None:
+            with self._lock:
+                generation = self._generations.get(key, 0)
+            value = loader()
+            self.set(key, value, generation)
+        return value
+
+    def set_after_commit(self, db: Session, key, value):
+        """Publishes a value the session's transaction produced once (and only if) it commits."""
+        db.info.setdefault("cache_fills", []).append((self, key, value))
+
+    def set_from_read(self, db: Session, key, value):
+        """
+        Publishes a value read through db. Until the transaction writes, all it
+        can read is committed data, so the value is cached at once; after a
+        write it may be the transaction's own row and waits for the commit.
+        """
+        if db.info.get("wrote"):
+            self.set_after_commit(db, key, value)
+        else:
+            self.set(key, value)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self.invalidations += len(keys)
+        if self.client is None:
+            for key in keys:
+                self.local.delete(key)
+        elif keys:
+            self.client.delete(*(self._shared_key(key) for key in keys))
+
+    def clear(self):
+        with self._lock:
+            self._generations.clear()
+        if self.client is None:
+            self.local.clear()
+        # Shared entries are left to expire: other workers may still be using them
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "local" if self.client is None else type(self.client).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "size": len(self.local) if self.local is not None else None,
+            }
+
+def stats() -> dict:
+    return {name: cache.stats() for name, cache in sorted(caches.items())}
+
+# --- invalidation from session events ---
+
+_watchers = defaultdict(list)
+
+def invalidate_on(model, cache: ReadThroughCache, keys_for):
+    """
+    Drops keys_for(instance) from cache whenever a model row is inserted,
+    updated or deleted and the transaction commits. keys_for should include
+    the pre-change values of key columns (see previous_value).
+    """
+    _watchers[model].append((cache, keys_for))
+
+def previous_value(instance, attribute: str):
+    """The value an attribute had before this flush, or its current one if unchanged."""
+    history = inspect(instance).attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(instance, attribute)
+
+@event.listens_for(Session, "after_flush")
+def _collect_invalidations(session, flush_context):
+    session.info["wrote"] = True
+    if not _watchers:
+        return
+    pending = session.info.setdefault("cache_invalidations", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        for cache, keys_for in _watchers.get(type(instance), ()):
+            for key in keys_for(instance):
+                if key is not None:
+                    pending.add((cache, key))
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_statement_writes(orm_execute_state):
+    # Core and bulk INSERT/UPDATE/DELETE statements write without a flush
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    for cache, key in session.info.pop("cache_invalidations", ()):
+        cache.invalidate(key)
+    for cache, key, value in session.info.pop("cache_fills", ()):
+        cache.set(key, value)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop("cache_invalidations", None)
+    session.info.pop("cache_fills", None)
+
+@event.listens_for(Session, "after_transaction_end")
+def _reset_transaction_state(session, transaction):
+    # Also covers close() without commit or rollback: nothing carries over to the next transaction
+    if transaction.parent is None:
+        for key in ("wrote", "cache_invalidations", "cache_fills"):
+            session.info.pop(key, None)
@@ -0,0 +1,61 @@
+import hashlib
+from typing import Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+import models
+
+# The catalog_meta table only ever holds this one row
+CATALOG_ROW_ID = 1
+
+def get_catalog_version(db: Session) -> int:
+    """
+    Reads the current catalog version with a single primary-key lookup,
+    without loading any Dish entities. Never writes: the row is seeded by
+    migration 0013, and until it exists the catalog is at version 1 (the
+    first bump_catalog_version creates it at 2).
+    """
+    version = db.execute(
+        select(models.CatalogMeta.version).where(models.CatalogMeta.id == CATALOG_ROW_ID)
+    ).scalar()
+    return 1 if version is None else version
+
+def bump_catalog_version(db: Session) -> None:
+    """
+    Marks the recipe catalog as changed. The caller owns the transaction,
+    so the bump is committed together with the recipe write itself.
+    """
+    result = db.execute(
+        update(models.CatalogMeta)
+        .where(models.CatalogMeta.id == CATALOG_ROW_ID)
+        .values(version=models.CatalogMeta.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(models.CatalogMeta(id=CATALOG_ROW_ID, version=2))
+
+def bump_dish_versions(db: Session, dish_ids=None, ingredient_id: Optional[int] = None) -> None:
+    """
+    Invalidates cached recipe details: bumps the given dishes, or every dish
+    that uses ingredient_id. Runs inside the caller's transaction.
+    """
+    if ingredient_id is not None:
+        dish_ids = select(models.DishIngredient.dish_id).where(models.DishIngredient.ingredient_id == ingredient_id)
+    elif not dish_ids:
+        return
+    db.execute(
+        update(models.Dish)
+        .where(models.Dish.id.in_(dish_ids))
+        .values(version=models.Dish.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def catalog_etag(version: int, **params) -> str:
+    """Weak ETag covering the catalog version and the page/filter parameters."""
+    key = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    return f'W/"catalog-{version}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,174 @@
+"""
+Local stand-in for the OpenAI HTTP API, so OpenAIProvider and the governor
+can be exercised end to end without a key or network access.
+
+    python fake_openai.py --port 8100 --latency-ms 300 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=test uvicorn main:app
+
+It serves /v1/chat/completions and /v1/images/generations. The prompts
+ai_service sends are recognized and answered by FakeAIProvider, so every
+answer is deterministic; generated images are served by the fake itself.
+Faults can be injected:
+  * --error-rate: that share of requests fails with a 503,
+  * POST /_faults {"status": 429, "count": 3, "retry_after": 1} fails the
+    next 3 requests; {"delay_ms": 5000, "count": 2} stalls the next 2 instead.
+GET /_stats reports requests per endpoint and the peak number in flight.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image
+import uvicorn
+from ai_providers import FakeAIProvider
+
+def _user_message(body: dict):
+    return next(message["content"] for message in reversed(body["messages"]) if message["role"] == "user")
+
+def _image_bytes(parts: list) -> bytes:
+    url = next(part["image_url"]["url"] for part in parts if part.get("type") == "image_url")
+    return base64.b64decode(url.split(",", 1)[1])
+
+async def _answer(provider: FakeAIProvider, body: dict) -> str:
+    """The reply content for one of ai_service's prompts."""
+    content = _user_message(body)
+    if isinstance(content, list):
+        text = " ".join(part.get("text", "") for part in content)
+        mode = "dish" if "prepared cooked dish" in text else "pantry"
+        return json.dumps(await provider.analyze_image(_image_bytes(content), mode))
+    if body.get("response_format", {}).get("type") == "json_schema":
+        recipe = await provider.extract_recipe(content.split("recipe for:", 1)[-1].strip())
+        return recipe.model_dump_json()
+    unit = re.search(r"how many (.+?) are in 1 (.+?) of (.+?)\?", content)
+    if unit:
+        factor = await provider.unit_factor(unit.group(3), unit.group(2), unit.group(1))
+        return "UNKNOWN" if factor is None else f"{factor:g}"
+    request = re.search(r"has (\d+) calories remaining today and wants a (\w+) recommendation", content)
+    remaining, slot = (int(request.group(1)), request.group(2)) if request else (0, "Meal")
+    if "Choose exactly one dish" in content:
+        names = re.findall(r"^- (.+?) \(", content, flags=re.MULTILINE)
+        return await provider.choose_recommendation(remaining, slot, [{"name": name} for name in names])
+    listed = re.search(r"shopping list includes: (.*?)\. ", content)
+    ingredients = [name for name in (listed.group(1).split(", ") if listed else []) if name]
+    return await provider.recommend(remaining, ingredients, slot)
+
+def _png(digest: str) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (256, 256), tuple(bytes.fromhex(digest[:6]))).save(out, format="PNG")
+    return out.getvalue()
+
+def create_app(latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    provider = FakeAIProvider(latency_ms=latency_ms, jitter_ms=jitter_ms)
+    rng = random.Random(seed)
+    faults = {"status": None, "delay_ms": 0, "count": 0, "retry_after": None}
+    stats = {"requests": Counter(), "in_flight": 0, "max_in_flight": 0}
+    app.state.provider = provider
+    app.state.stats = stats
+
+    def error(status: int, retry_after=None) -> JSONResponse:
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else None
+        return JSONResponse(
+            {"error": {"message": f"Injected fault ({status})", "type": "server_error", "code": None}},
+            status_code=status, headers=headers
+        )
+
+    async def admit(endpoint: str):
+        """Counts the request and applies any pending fault; returns an error response or None."""
+        stats["requests"][endpoint] += 1
+        if faults["count"] > 0:
+            faults["count"] -= 1
+            if faults["delay_ms"]:
+                await asyncio.sleep(faults["delay_ms"] / 1000)
+            if faults["status"]:
+                return error(faults["status"], faults["retry_after"])
+        if error_rate and rng.random() < error_rate:
+            return error(503)
+        return None
+
+    async def tracked(endpoint: str, handler):
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            return await admit(endpoint) or await handler()
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+
+        async def handler():
+            return {
+                "id": f"chatcmpl-fake-{stats['requests']['chat']}", "object": "chat.completion",
+                "created": int(time.time()), "model": body["model"],
+                "choices": [{
+                    "index": 0, "finish_reason": "stop", "logprobs": None,
+                    "message": {"role": "assistant", "content": await _answer(provider, body), "refusal": None}
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }
+        return await tracked("chat", handler)
+
+    @app.post("/v1/images/generations")
+    async def images_generations(request: Request):
+        body = await request.json()
+
+        async def handler():
+            await provider.generate_image(body["prompt"])
+            digest = hashlib.sha1(body["prompt"].encode("utf-8")).hexdigest()
+            return {"created": int(time.time()), "data": [{"url": f"{request.base_url}images/{digest}.png"}]}
+        return await tracked("images", handler)
+
+    @app.get("/images/{digest}.png")
+    def image(digest: str):
+        return Response(_png(digest), media_type="image/png")
+
+    @app.post("/_faults")
+    async def set_faults(request: Request):
+        faults.update({"status": None, "delay_ms": 0, "count": 1, "retry_after": None})
+        faults.update(await request.json())
+        return faults
+
+    @app.get("/_stats")
+    def get_stats():
+        return {
+            "requests": dict(stats["requests"]), "max_in_flight": stats["max_in_flight"],
+            "calls": dict(provider.calls)
+        }
+
+    return app
+
+def serve_in_thread(app: FastAPI, host: str = "127.0.0.1", port: int = 0):
+    """Starts the fake on a background thread; returns (server, base_url). Stop with server.should_exit = True."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="fake-openai", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("fake OpenAI server failed to start")
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{port}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake of the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    print(f"✅ Fake OpenAI API on http://{args.host}:{args.port}/v1")
+    uvicorn.run(
+        create_app(args.latency_ms, args.jitter_ms, args.error_rate), host=args.host, port=args.port, log_level="warning"
+    )
@@ -0,0 +1,239 @@
+import base64
+import hashlib
+import io
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from PIL import Image
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ai_governor import AIUnavailable
+import catalog
+import models
+
+MAX_ATTEMPTS = int(os.getenv("IMAGE_MAX_ATTEMPTS", "3"))
+# Jobs claimed and generated together; the model's governor limits cap how many run at once
+IMAGE_BATCH_SIZE = int(os.getenv("IMAGE_BATCH_SIZE", "16"))
+# Threads publishing and storing a batch's results
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+BASE_BACKOFF_SECONDS = 5
+
+TARGET_MODELS = {"dish": models.Dish, "ingredient": models.Ingredient}
+
+def fake_image_generator(prompt: str) -> str:
+    """
+    Deterministic local stand-in for DALL-E, for tests and offline development:
+    a solid colour derived from the prompt, as a data: URL.
+    """
+    digest = hashlib.sha1(prompt.encode("utf-8")).digest()
+    out = io.BytesIO()
+    Image.new("RGB", (1024, 1024), tuple(digest[:3])).save(out, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(out.getvalue()).decode("ascii")
+
+def one_at_a_time(generator):
+    """Adapts a prompt -> URL generator to the worker's list-of-prompts interface."""
+    def generate(prompts: list) -> list:
+        results = []
+        for prompt in prompts:
+            try:
+                results.append(generator(prompt))
+            except Exception as e:
+                results.append(e)
+        return results
+    return generate
+
+def enqueue_image(db: Session, target_type: str, target_id: int, prompt: str) -> None:
+    """
+    Queues an image for a dish or ingredient. Not committed here: the job is
+    written in the same transaction as the row it illustrates.
+    """
+    db.add(models.ImageJob(target_type=target_type, target_id=target_id, prompt=prompt))
+
+class ImageWorker:
+    """
+    Consumer of the image_jobs table. A dispatcher thread claims up to
+    batch_size due jobs at a time and passes all their prompts to the
+    generator at once, so a recipe's dish and ingredient images are made
+    together: ai_service.generate_professional_images runs them concurrently
+    within the image model's limits (see ai_governor.py). A small thread pool
+    then publishes and stores the results. Failures are retried with jittered
+    exponential backoff until MAX_ATTEMPTS; while the model's circuit breaker
+    is open, jobs wait for it without spending an attempt. Because the queue
+    lives in the DB, jobs left 'running' by a crash are resumed on start().
+    publish, when given, turns the generator's temporary URL into a permanent
+    one (see assets.publish) before it is stored.
+    """
+
+    def __init__(self, session_factory, generator, concurrency: int = IMAGE_CONCURRENCY, poll_interval: float = 2.0,
+                 publish=None, batch_size: int = IMAGE_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.generator = generator
+        self.publish = publish
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        self._requeue_interrupted()
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="image-worker")
+        self._thread = threading.Thread(target=self._dispatch_loop, name="image-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wake(self):
+        """Signals the dispatcher that new jobs were committed."""
+        self._wake.set()
+
+    def drain(self) -> int:
+        """Synchronously runs every due job from the calling thread. Returns the number processed."""
+        processed = 0
+        while True:
+            job_ids = self._claim(self.batch_size)
+            if not job_ids:
+                return processed
+            self._run_batch(job_ids)
+            processed += len(job_ids)
+
+    def _requeue_interrupted(self):
+        db = self.session_factory()
+        try:
+            db.query(models.ImageJob).filter(models.ImageJob.status == "running").update(
+                {"status": "pending"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            job_ids = self._claim(self.batch_size)
+            if job_ids:
+                self._run_batch(job_ids)
+            # After a full batch more jobs may already be due
+            if len(job_ids) < self.batch_size:
+                self._wake.wait(self.poll_interval)
+
+    def _claim(self, limit: int) -> list:
+        db = self.session_factory()
+        try:
+            jobs = (
+                db.query(models.ImageJob)
+                .filter(models.ImageJob.status == "pending", models.ImageJob.next_attempt_at <= datetime.utcnow())
+                .order_by(models.ImageJob.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for job in jobs:
+                job.status = "running"
+            db.commit()
+            return [job.id for job in jobs]
+        finally:
+            db.close()
+
+    def _run_batch(self, job_ids: list):
+        db = self.session_factory()
+        try:
+            prompts = dict(
+                db.query(models.ImageJob.id, models.ImageJob.prompt).filter(models.ImageJob.id.in_(job_ids))
+            )
+        finally:
+            db.close()
+        try:
+            results = self.generator([prompts[job_id] for job_id in job_ids])
+        except Exception as e:
+            results = [e] * len(job_ids)
+        if self._executor is not None:
+            list(self._executor.map(self._finish, job_ids, results))
+        else:
+            for job_id, result in zip(job_ids, results):
+                self._finish(job_id, result)
+
+    def _finish(self, job_id: int, result):
+        """Publishes one generated image (or records why there is none) and settles its job."""
+        url, error = None, None
+        if isinstance(result, Exception):
+            error = str(result)
+        else:
+            try:
+                url = result
+                if url and self.publish:
+                    url = self.publish(url)
+                error = None if url else "generator returned no image"
+            except Exception as e:
+                url, error = None, str(e)
+
+        db = self.session_factory()
+        try:
+            job = db.get(models.ImageJob, job_id)
+            if isinstance(result, AIUnavailable) and result.retry_after > 0:
+                # The breaker is open: wait it out without spending an attempt
+                job.status = "pending"
+                job.last_error = error
+                job.next_attempt_at = datetime.utcnow() + timedelta(seconds=result.retry_after)
+                db.commit()
+                return
+
+            job.attempts += 1
+            if url:
+                target = db.get(TARGET_MODELS[job.target_type], job.target_id)
+                if target is not None:
+                    target.thumbnail_url = url
+                    if job.target_type == "dish":
+                        catalog.bump_dish_versions(db, [job.target_id])
+                    else:
+                        catalog.bump_dish_versions(db, ingredient_id=job.target_id)
+                    # Listings embed thumbnails too, so their ETags must change with them
+                    catalog.bump_catalog_version(db)
+                job.status = "done"
+                job.last_error = None
+            elif job.attempts >= MAX_ATTEMPTS:
+                job.status = "failed"
+                job.last_error = error
+            else:
+                delay = BASE_BACKOFF_SECONDS * (2 ** (job.attempts - 1)) * random.uniform(0.5, 1.5)
+                job.status = "pending"
+                job.last_error = error
+                job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            db.commit()
+        finally:
+            db.close()
+
+def queue_status(db: Session) -> dict:
+    """Per-status counts plus the jobs that have not finished yet."""
+    counts = dict(
+        db.query(models.ImageJob.status, func.count(models.ImageJob.id))
+        .group_by(models.ImageJob.status)
+        .all()
+    )
+    open_jobs = (
+        db.query(models.ImageJob)
+        .filter(models.ImageJob.status.in_(["pending", "running", "failed"]))
+        .order_by(models.ImageJob.id)
+        .limit(100)
+        .all()
+    )
+    return {
+        "counts": counts,
+        "jobs": [{
+            "id": job.id, "target_type": job.target_type, "target_id": job.target_id,
+            "status": job.status, "attempts": job.attempts, "last_error": job.last_error,
+            "next_attempt_at": job.next_attempt_at
+        } for job in open_jobs]
+    }
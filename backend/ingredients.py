@@ -0,0 +1,169 @@
+"""
+Batched ingredient resolution for recipe ingestion.
+
+resolve_ingredients maps a recipe's ingredient names to ids in a constant
+number of round trips: one IN query for names that already exist, then one
+INSERT ... ON CONFLICT DO NOTHING RETURNING for the rest. A concurrent
+ingestion that creates the same name first makes our insert skip that row,
+so the skipped names are read back once more instead of failing the
+transaction. Nothing here commits; the caller writes the dish, links and
+ingredients as one unit.
+
+Names already resolved once are answered from the ingredient_ids cache
+without a query. Ids read from existing rows are published at once, ids of
+rows a transaction created only when it commits, and renaming or deleting
+an ingredient evicts them (see caching.py). ingredient_names is the reverse lookup for the shopping list
+and recommender.
+"""
+import os
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import image_worker
+import models
+from caching import ReadThroughCache, invalidate_on, previous_value
+
+INGREDIENT_CACHE_SIZE = int(os.getenv("INGREDIENT_CACHE_SIZE", "10000"))
+INGREDIENT_CACHE_TTL = float(os.getenv("INGREDIENT_CACHE_TTL", "3600"))
+
+ingredient_ids = ReadThroughCache("ingredient_ids", INGREDIENT_CACHE_TTL, maxsize=INGREDIENT_CACHE_SIZE)
+ingredient_name_cache = ReadThroughCache("ingredient_names", INGREDIENT_CACHE_TTL, maxsize=INGREDIENT_CACHE_SIZE)
+invalidate_on(models.Ingredient, ingredient_ids, lambda ing: [previous_value(ing, "name"), ing.name])
+invalidate_on(models.Ingredient, ingredient_name_cache, lambda ing: [ing.id])
+
+def _insert_ignoring_conflicts(db: Session, rows: list):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(models.Ingredient).on_conflict_do_nothing(index_elements=["name"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(models.Ingredient).on_conflict_do_nothing(index_elements=["name"])
+    else:
+        stmt = insert(models.Ingredient)
+    return db.execute(stmt.values(rows).returning(models.Ingredient.id, models.Ingredient.name)).all()
+
+def resolve_ingredients(db: Session, items: list, enqueue_images: bool = True) -> dict:
+    """
+    items: (name, category) pairs, duplicates allowed; the first category wins.
+    Returns {name: ingredient_id}. Newly created ingredients get an image job
+    unless enqueue_images is False.
+    """
+    categories = {}
+    for name, category in items:
+        categories.setdefault(name, category or "Pantry")
+    if not categories:
+        return {}
+
+    ids = ingredient_ids.get_many(list(categories))
+    uncached = [name for name in categories if name not in ids]
+    if not uncached:
+        return ids
+
+    found = dict(
+        (name, ingredient_id) for ingredient_id, name in
+        db.query(models.Ingredient.id, models.Ingredient.name).filter(models.Ingredient.name.in_(uncached))
+    )
+    for name, ingredient_id in found.items():
+        ingredient_ids.set_from_read(db, name, ingredient_id)
+    missing = [name for name in uncached if name not in found]
+    if missing:
+        created = _insert_ignoring_conflicts(db, [{"name": name, "category": categories[name]} for name in missing])
+        for ingredient_id, name in created:
+            found[name] = ingredient_id
+            ingredient_ids.set_after_commit(db, name, ingredient_id)
+            # The insert bypasses ORM events; a reused id must not keep an old name
+            ingredient_name_cache.set_after_commit(db, ingredient_id, name)
+            if enqueue_images:
+                image_worker.enqueue_image(db, "ingredient", ingredient_id, f"fresh raw {name}")
+
+        # Lost a race for some names: another transaction inserted them first
+        raced = [name for name in missing if name not in found]
+        if raced:
+            for ingredient_id, name in db.query(models.Ingredient.id, models.Ingredient.name).filter(
+                models.Ingredient.name.in_(raced)
+            ):
+                found[name] = ingredient_id
+                ingredient_ids.set_from_read(db, name, ingredient_id)
+    ids.update(found)
+    return ids
+
+def ingredient_names(db: Session, ids) -> dict:
+    """{ingredient_id: name}, reading only the ids that are not cached."""
+    ids = list(dict.fromkeys(ids))
+    names = ingredient_name_cache.get_many(ids)
+    uncached = [ingredient_id for ingredient_id in ids if ingredient_id not in names]
+    if uncached:
+        for ingredient_id, name in db.query(models.Ingredient.id, models.Ingredient.name).filter(
+            models.Ingredient.id.in_(uncached)
+        ):
+            names[ingredient_id] = name
+            ingredient_name_cache.set_from_read(db, ingredient_id, name)
+    return names
+
+def diff_dish_ingredients(db: Session, dish_id: int, items: list) -> dict:
+    """
+    Brings a dish's ingredient links in line with items (IngredientSchema-like
+    objects), keyed by ingredient: only added, changed or removed links are
+    written. Repeated lines for one ingredient are summed when their units match.
+    Returns the changed names plus need_deltas, the signed per-(ingredient, unit)
+    quantity changes for one portion of the dish. Not committed here.
+    """
+    resolved = resolve_ingredients(db, [(item.name, item.category) for item in items])
+
+    desired = {}
+    for item in items:
+        ingredient_id = resolved[item.name]
+        if ingredient_id in desired:
+            name, quantity, unit = desired[ingredient_id]
+            if unit.lower() != item.unit.lower():
+                raise ValueError(f"'{item.name}' is listed with two different units")
+            desired[ingredient_id] = (name, quantity + item.quantity, unit)
+        else:
+            desired[ingredient_id] = (item.name, item.quantity, item.unit)
+
+    current, stale = {}, []
+    for link in (
+        db.query(models.DishIngredient)
+        .filter(models.DishIngredient.dish_id == dish_id)
+        .order_by(models.DishIngredient.id)
+    ):
+        # Older edits could leave several links for one ingredient; keep the first
+        if link.ingredient_id in current:
+            stale.append(link)
+        else:
+            current[link.ingredient_id] = link
+
+    report = {"inserted": [], "updated": [], "deleted": [], "unchanged": 0}
+    need_deltas = {}
+
+    def need(ingredient_id, unit, delta):
+        need_deltas[(ingredient_id, unit)] = need_deltas.get((ingredient_id, unit), 0.0) + delta
+
+    for ingredient_id, (name, quantity, unit) in desired.items():
+        link = current.pop(ingredient_id, None)
+        if link is None:
+            db.add(models.DishIngredient(dish_id=dish_id, ingredient_id=ingredient_id, quantity=quantity, unit=unit))
+            need(ingredient_id, unit, quantity)
+            report["inserted"].append(name)
+        elif link.quantity != quantity or link.unit != unit:
+            need(ingredient_id, link.unit, -(link.quantity or 0))
+            need(ingredient_id, unit, quantity)
+            link.quantity, link.unit = quantity, unit
+            report["updated"].append(name)
+        else:
+            report["unchanged"] += 1
+
+    removed = list(current.values()) + stale
+    if removed:
+        names = dict(
+            db.query(models.Ingredient.id, models.Ingredient.name)
+            .filter(models.Ingredient.id.in_({link.ingredient_id for link in removed}))
+        )
+        for link in removed:
+            need(link.ingredient_id, link.unit, -(link.quantity or 0))
+            report["deleted"].append(names.get(link.ingredient_id))
+        db.query(models.DishIngredient).filter(
+            models.DishIngredient.id.in_([link.id for link in removed])
+        ).delete(synchronize_session=False)
+
+    report["need_deltas"] = need_deltas
+    return report
@@ -0,0 +1,37 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+import schemas
+import ai_service
+from ai_governor import AIUnavailable
+
+def get_or_extract_recipe(db: Session, input_text: str, force_refresh: bool = False) -> schemas.RecipeSchema:
+    """
+    Persistent, content-addressed cache in front of ai_service.extract_recipe_logic.
+    The raw RecipeSchema is stored under the hash of the request, independently
+    of the Dish rows, so deleting or regenerating a dish reuses the completion.
+    """
+    key = ai_service.recipe_cache_key(input_text)
+    entry = db.get(models.LLMCacheEntry, key)
+    if entry and not force_refresh:
+        return schemas.RecipeSchema(**entry.payload)
+
+    try:
+        data = ai_service.extract_recipe_logic(input_text)
+    except AIUnavailable:
+        # A forced refresh serves the stored completion while the model is unreachable
+        if entry is None:
+            raise
+        return schemas.RecipeSchema(**entry.payload)
+
+    # Committed on its own so the paid completion survives a later pipeline failure
+    try:
+        if entry:
+            entry.payload = data.dict()
+        else:
+            db.add(models.LLMCacheEntry(key=key, model=ai_service.RECIPE_MODEL, payload=data.dict()))
+        db.commit()
+    except IntegrityError:
+        # Another worker stored the same completion first
+        db.rollback()
+    return data
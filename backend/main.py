@@ -1,18 +1,71 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from PIL import UnidentifiedImageError
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from sqlalchemy.orm import joinedload #
+from sqlalchemy import func, update, case, or_, insert
+from collections import defaultdict
+from contextlib import asynccontextmanager
 from datetime import date, timedelta
+from functools import partial
+from typing import Optional
+import math
+import os
 import database
 import models
 import schemas
+import ai_governor
 import ai_service
-
-# Initialize Database tables
-models.Base.metadata.create_all(bind=database.engine)
-
-app = FastAPI(title="SmartKitchen OS - V5.3 Final Pantry Intelligence")
+import alerts
+import assets
+import caching
+import catalog
+import image_worker
+import ingredients
+import llm_cache
+import meal_generator
+import pairings
+import recipe_io
+import recommender
+import metrics
+import migrate
+import search
+import serializers
+import shopping_list
+import singleflight
+import tenancy
+import units
+import vision
+
+# Dish and ingredient images are generated off the request path and copied
+# into the local asset store (see assets.py) before their URL is saved.
+# IMAGE_GENERATOR=fake swaps DALL-E for a deterministic local placeholder.
+asset_store = assets.make_store()
+image_queue = image_worker.ImageWorker(
+    database.SessionLocal,
+    image_worker.one_at_a_time(image_worker.fake_image_generator) if os.getenv("IMAGE_GENERATOR") == "fake"
+    else ai_service.generate_professional_images,
+    publish=partial(assets.publish, asset_store) if asset_store else None
+)
+# Expiry / low-stock alerts are evaluated in the background into pantry_alerts
+alert_scheduler = alerts.AlertScheduler(database.SessionLocal)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes are applied by `python migrate.py`, never at startup
+    waiting = migrate.pending()
+    if waiting:
+        print(f"⚠️ {len(waiting)} pending migration(s); run `python migrate.py` before serving traffic.")
+    image_queue.start()
+    alert_scheduler.start()
+    yield
+    alert_scheduler.stop()
+    image_queue.stop()
+
+app = FastAPI(title="SmartKitchen OS - V5.3 Final Pantry Intelligence", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,212 +73,335 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Server-Timing"],
 )
 
+# Query / AI accounting per request: Server-Timing headers and /metrics
+metrics.instrument_engine(database.engine)
+if database.async_engine is not None:
+    metrics.instrument_engine(database.async_engine.sync_engine)
+app.middleware("http")(metrics.instrument_request)
+
+@app.get("/metrics")
+def get_metrics():
+    """Per-route latency and query-count histograms plus DB and AI totals since startup."""
+    return metrics.registry.snapshot()
+
+@app.get("/metrics/caches")
+def get_cache_metrics():
+    """Hit, miss and invalidation counters of every named cache (see caching.py)."""
+    return caching.stats()
+
+@app.get("/metrics/ai")
+def get_ai_metrics():
+    """Per-model limits, retry/timeout/fallback counters and breaker state (see ai_governor.py)."""
+    return ai_governor.governor.stats()
+
+def _ai_unavailable(e: ai_governor.AIUnavailable) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail="AI service temporarily unavailable",
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    )
+
 # --- RECIPE MANAGEMENT ---
 
+# Keyset page size bounds for the catalog listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _recipe_listing(
+    db: Session, if_none_match: Optional[str],
+    cursor: Optional[int], limit: int, cuisine: Optional[str], meal_type: Optional[str]
+):
+    """
+    Shared keyset pagination for the catalog listings. Returns a 304 Response
+    when the client's ETag is still current, otherwise the encoded page of
+    dishes. The next page's cursor is exposed through the X-Next-Cursor header.
+    """
+    version = catalog.get_catalog_version(db)
+    etag = catalog.catalog_etag(
+        version, cursor=cursor, limit=limit, cuisine=cuisine, meal_type=meal_type
+    )
+    if catalog.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    query = db.query(*serializers.DISH_COLUMNS)
+    if cursor is not None:
+        query = query.filter(models.Dish.id > cursor)
+    if cuisine:
+        query = query.filter(func.lower(models.Dish.cuisine) == cuisine.lower())
+    if meal_type:
+        query = query.filter(models.Dish.meal_type.ilike(f"%{meal_type}%"))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(models.Dish.id).limit(limit + 1).all()
+    headers = {"ETag": etag}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    return serializers.FastJSONResponse(serializers.serialize_dishes(db, rows), headers=headers)
+
 @app.get("/recipes", response_model=list[schemas.RecipeResponse])
-def get_all_recipes(db: Session = Depends(database.get_db)):
-    dishes = db.query(models.Dish).options(
-        joinedload(models.Dish.ingredients).joinedload(models.DishIngredient.ingredient)
-    ).all()
+async def get_all_recipes(
+    cursor: Optional[int] = Query(None, description="Last dish id of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cuisine: Optional[str] = None,
+    meal_type: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    return await database.run_read(
+        _recipe_listing, if_none_match, cursor, limit, cuisine, meal_type
+    )
 
-    # Manually flattening for the response model
-    return [
-        {
-            **dish.__dict__,
-            "ingredients": [
-                {
-                    "name": ing.ingredient.name,
-                    "quantity": ing.quantity,
-                    "unit": ing.unit,
-                    "category": ing.ingredient.category,
-                    "thumbnail_url": ing.ingredient.thumbnail_url
-                } for ing in dish.ingredients
-            ]
-        } for dish in dishes
-    ]
-
-@app.get("/recipes/{recipe_id}")
+@app.get("/recipes/search")
+def search_recipes(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(database.get_db)
+):
+    """Typo-tolerant, similarity-ranked dish search over names."""
+    return [{
+        "id": dish.id,
+        "name": dish.name,
+        "cuisine": dish.cuisine,
+        "meal_type": dish.meal_type,
+        "thumbnail_url": dish.thumbnail_url,
+        "score": round(score, 3)
+    } for dish, score in search.search_dishes(db, q, limit)]
+
+@app.get("/recipes/{recipe_id}", response_model=schemas.RecipeResponse)
 def get_recipe(recipe_id: int, db: Session = Depends(database.get_db)):
-    recipe = db.query(models.Dish).filter(models.Dish.id == recipe_id).first()
-    if not recipe:
+    """The full recipe, served from the per-dish-version cache (see serializers.py)."""
+    body = serializers.recipe_detail_json(db, recipe_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Recipe not found")
-    
-    return {
-        "id": recipe.id,
-        "name": recipe.name,
-        "description": recipe.description,
-        "cuisine": recipe.cuisine,
-        "meal_type": recipe.meal_type,
-        "thumbnail_url": recipe.thumbnail_url,
-        "prep_steps": recipe.prep_steps,
-        "nutrition": recipe.nutrition,
-        "ingredients": [
-            {
-                "name": ing.ingredient.name,
-                "quantity": ing.quantity,
-                "unit": ing.unit,
-                "category": ing.ingredient.category,
-                "thumbnail_url": ing.ingredient.thumbnail_url
-            } for ing in recipe.ingredients
-        ]
-    }
+    return serializers.FastJSONResponse(body)
+
+@app.get("/recipes/{recipe_id}/pairings", response_model=list[schemas.PairingResponse])
+async def get_recipe_pairings(recipe_id: int, limit: int = Query(pairings.DEFAULT_PAIRINGS, ge=1, le=pairings.MAX_PAIRINGS)):
+    """Dishes that go with this one, strongest first, read from the precomputed pairing graph (see pairings.py)."""
+    return await database.run_read(_recipe_pairings, recipe_id, limit)
+
+def _recipe_pairings(db: Session, recipe_id: int, limit: int) -> list:
+    found = pairings.top_pairings(db, recipe_id, limit)
+    # Only an empty answer needs the second lookup
+    if not found and db.get(models.Dish, recipe_id) is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return found
+
+# Concurrent extractions of the same dish share one AI pipeline run
+recipe_flight = singleflight.SingleFlight()
+
+def _find_cached_dish(db: Session, text_input: str):
+    return search.best_match(db, text_input)
 
 @app.post("/extract-recipe", response_model=schemas.RecipeResponse)
-def extract_recipe(text_input: str, db: Session = Depends(database.get_db)):
+def extract_recipe(text_input: str, force_refresh: bool = False, db: Session = Depends(database.get_db)):
     """
     V6.5 CMS Logic: Local Persistence and API Cost Mitigation.
+    force_refresh bypasses the persistent LLM cache and pays for a new completion.
     """
     # 1. Look for the dish in the local CMS first
-    existing_dish = db.query(models.Dish).filter(models.Dish.name.ilike(f"%{text_input}%")).first()
+    existing_dish = _find_cached_dish(db, text_input)
     
     if existing_dish:
         # Returns the cached version immediately
-        return existing_dish
+        return get_recipe(existing_dish.id, db)
 
-    # 2. Cache Miss: Execute AI Pipeline only for new discoveries
+    # 2. Cache Miss: Execute AI Pipeline only for new discoveries,
+    # once per normalized name no matter how many callers are waiting
     try:
-        data = ai_service.extract_recipe_logic(text_input)
-        dish_image = ai_service.generate_professional_image(f"{data.cuisine} {data.name}")
-        
-        new_dish = models.Dish(
-            name=data.name,
-            description=data.description,
-            thumbnail_url=dish_image,
-            cuisine=data.cuisine,
-            meal_type=", ".join(data.suitable_for) if data.suitable_for else "Meal",
-            prep_steps=data.prep_steps,
-            nutrition=data.nutrition.dict()
+        dish_id = recipe_flight.do(
+            ai_service.normalize_dish_name(text_input),
+            lambda: _run_extraction_pipeline(text_input, db, force_refresh)
         )
-        db.add(new_dish)
-        db.commit()
-        db.refresh(new_dish)
-
-        # 3. Persistent Mapping of Ingredients
-        for ing in data.ingredients:
-            db_ing = db.query(models.Ingredient).filter(models.Ingredient.name == ing.name).first()
-            if not db_ing:
-                ing_image = ai_service.generate_professional_image(f"fresh raw {ing.name}")
-                db_ing = models.Ingredient(name=ing.name, category=ing.category, thumbnail_url=ing_image)
-                db.add(db_ing)
-                db.commit()
-                db.refresh(db_ing)
-            
-            dish_ing = models.DishIngredient(
-                dish_id=new_dish.id, 
-                ingredient_id=db_ing.id, 
-                quantity=ing.quantity, 
-                unit=ing.unit
-            )
-            db.add(dish_ing)
-        
-        db.commit()
-        db.refresh(new_dish)
-        return new_dish
+    except ai_governor.AIUnavailable as e:
+        db.rollback()
+        raise _ai_unavailable(e)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    return get_recipe(dish_id, db)
+
+def _run_extraction_pipeline(text_input: str, db: Session, force_refresh: bool) -> int:
+    """Runs the AI pipeline for a new dish and returns the persisted Dish id."""
+    # Another flight for this name may have landed between our lookup and now
+    existing_dish = _find_cached_dish(db, text_input)
+    if existing_dish:
+        return existing_dish.id
+
+    data = llm_cache.get_or_extract_recipe(db, text_input, force_refresh=force_refresh)
+
+    # The model may name the dish differently from the request; reuse an exact name match
+    existing_dish = db.query(models.Dish).filter(func.lower(models.Dish.name) == data.name.lower()).first()
+    if existing_dish:
+        return existing_dish.id
+    
+    # Dish, ingredients, links and image jobs are written in a single transaction.
+    # Images are produced by the background worker; thumbnail_url stays empty until then
+    new_dish = models.Dish(
+        name=data.name,
+        description=data.description,
+        thumbnail_url=None,
+        cuisine=data.cuisine,
+        meal_type=", ".join(data.suitable_for) if data.suitable_for else "Meal",
+        prep_steps=data.prep_steps,
+        nutrition=data.nutrition.dict()
+    )
+    db.add(new_dish)
+    db.flush()
+    image_worker.enqueue_image(db, "dish", new_dish.id, f"{data.cuisine} {data.name}")
+
+    # 3. Persistent Mapping of Ingredients
+    ingredient_ids = ingredients.resolve_ingredients(db, [(ing.name, ing.category) for ing in data.ingredients])
+    db.add_all([
+        models.DishIngredient(
+            dish_id=new_dish.id,
+            ingredient_id=ingredient_ids[ing.name],
+            quantity=ing.quantity,
+            unit=ing.unit
+        ) for ing in data.ingredients
+    ])
+    pairings.link_suggestions(db, {new_dish.id: data.suggested_pairings})
+
+    catalog.bump_catalog_version(db)
+    dish_id = new_dish.id
+    db.commit()
+    image_queue.wake()
+    return dish_id
     
 @app.get("/cms/recipes", response_model=list[schemas.RecipeResponse])
-def get_cms_recipes(db: Session = Depends(database.get_db)):
+async def get_cms_recipes(
+    cursor: Optional[int] = Query(None, description="Last dish id of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cuisine: Optional[str] = None,
+    meal_type: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
     """
-    V6.5 Enhancement: Returns flattened data for the CMS dashboard table.
+    V6.5 Enhancement: Returns flattened data for the CMS dashboard table,
+    one keyset page at a time.
     """
-    dishes = db.query(models.Dish).options(
-        joinedload(models.Dish.ingredients).joinedload(models.DishIngredient.ingredient)
-    ).all()
-    
-    return [
-        {
-            **dish.__dict__,
-            "ingredients": [
-                {
-                    "name": ing.ingredient.name,
-                    "quantity": ing.quantity,
-                    "unit": ing.unit,
-                    "category": ing.ingredient.category,
-                    "thumbnail_url": ing.ingredient.thumbnail_url
-                } for ing in dish.ingredients
-            ]
-        } for dish in dishes
-    ]
+    return await database.run_read(
+        _recipe_listing, if_none_match, cursor, limit, cuisine, meal_type
+    )
 
 @app.get("/cms/recipes/{recipe_id}", response_model=schemas.RecipeResponse)
 def get_cms_recipe_detail(recipe_id: int, db: Session = Depends(database.get_db)):
     """
     Fetches the complete persistent entity mapping for the Detail View.
     """
-    recipe = db.query(models.Dish).options(
-        joinedload(models.Dish.ingredients).joinedload(models.DishIngredient.ingredient)
-    ).filter(models.Dish.id == recipe_id).first()
-    
-    if not recipe:
+    body = serializers.recipe_detail_json(db, recipe_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Asset not found")
-    
-    # Explicitly constructing the response to ensure ingredients list is populated
-    return {
-        "id": recipe.id,
-        "name": recipe.name,
-        "description": recipe.description,
-        "cuisine": recipe.cuisine,
-        "meal_type": recipe.meal_type,
-        "thumbnail_url": recipe.thumbnail_url,
-        "prep_steps": recipe.prep_steps,
-        "nutrition": recipe.nutrition,
-        "ingredients": [
-            {
-                "name": ing.ingredient.name,
-                "quantity": ing.quantity,
-                "unit": ing.unit,
-                "category": ing.ingredient.category,
-                "thumbnail_url": ing.ingredient.thumbnail_url
-            } for ing in recipe.ingredients
-        ]
-    }
+    return serializers.FastJSONResponse(body)
 
-@app.put("/cms/recipes/{recipe_id}", response_model=schemas.RecipeResponse)
-def update_cms_recipe(recipe_id: int, data: dict, db: Session = Depends(database.get_db)):
+# Dish columns a CMS edit may set directly
+EDITABLE_DISH_FIELDS = ["name", "description", "cuisine", "meal_type", "prep_steps", "nutrition"]
+
+def _apply_recipe_update(db: Session, recipe_id: int, update: schemas.RecipeUpdate) -> dict:
     """
-    Manually update persistent dish entities. Changes are stored in DB 
-    and reflected across the OS.
+    Applies the fields set on a partial update and returns the flattened
+    recipe plus a change report. Ingredient links are diffed, so only the
+    links that actually changed are written.
     """
     dish = db.query(models.Dish).filter(models.Dish.id == recipe_id).first()
     if not dish:
         raise HTTPException(status_code=404, detail="Dish not found")
 
+    fields = update.dict(exclude_unset=True)
+    changed_fields = []
     # Update basic fields and JSON entities (Nutrition, Prep Steps)
-    for key in ["name", "description", "cuisine", "prep_steps", "nutrition"]:
-        if key in data:
-            setattr(dish, key, data[key])
-
-    # Update Ingredients if provided
-    if "ingredients" in data:
-        # Clear existing mappings for this dish
-        db.query(models.DishIngredient).filter(models.DishIngredient.dish_id == recipe_id).delete()
-        
-        for ing in data["ingredients"]:
-            # Find or create ingredient entity
-            db_ing = db.query(models.Ingredient).filter(models.Ingredient.name == ing["name"]).first()
-            if not db_ing:
-                db_ing = models.Ingredient(name=ing["name"], category=ing.get("category", "Pantry"))
-                db.add(db_ing); db.commit(); db.refresh(db_ing)
-            
-            db.add(models.DishIngredient(
-                dish_id=dish.id, 
-                ingredient_id=db_ing.id, 
-                quantity=ing["quantity"], 
-                unit=ing["unit"]
-            ))
+    for key in EDITABLE_DISH_FIELDS:
+        if key in fields and fields[key] is not None and getattr(dish, key) != fields[key]:
+            setattr(dish, key, fields[key])
+            changed_fields.append(key)
+
+    ingredient_changes = {"inserted": [], "updated": [], "deleted": [], "unchanged": 0}
+    shopping_ingredient_ids = set()
+    if update.ingredients is not None:
+        try:
+            ingredient_changes = ingredients.diff_dish_ingredients(db, dish.id, update.ingredients)
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=422, detail=str(e))
+        need_deltas = ingredient_changes.pop("need_deltas")
+
+        # Planned copies of this dish, in every household, move only the changed needs
+        planned = db.query(models.MealPlan.household_id, func.count(models.MealPlan.id)).filter(
+            models.MealPlan.dish_id == recipe_id
+        ).group_by(models.MealPlan.household_id).all()
+        if planned and need_deltas:
+            db.flush()
+            for household_id, count in planned:
+                shopping_list.apply_need_deltas(db, household_id, {key: delta * count for key, delta in need_deltas.items()})
+            shopping_ingredient_ids = {ingredient_id for ingredient_id, _ in need_deltas}
+
+    ingredients_changed = any(ingredient_changes[k] for k in ("inserted", "updated", "deleted"))
+    if changed_fields or ingredients_changed:
+        catalog.bump_catalog_version(db)
+        catalog.bump_dish_versions(db, [recipe_id])
+        db.commit()
+        image_queue.wake()
+
+    recipe = serializers.recipe_detail(db, recipe_id)
+    recipe["changes"] = {
+        "fields": changed_fields,
+        "ingredients": ingredient_changes,
+        "recompute": {
+            # Already re-derived in this transaction for every planned copy
+            "shopping_list": sorted(shopping_ingredient_ids),
+            # Nutrition is model-estimated, not computed; it is stale when the
+            # ingredients moved without a matching nutrition edit
+            "nutrition": ingredients_changed and "nutrition" not in changed_fields,
+            "search_index": "name" in changed_fields,
+        }
+    }
+    return recipe
 
-    db.commit()
-    db.refresh(dish)
-    return dish
+@app.put("/cms/recipes/{recipe_id}", response_model=schemas.RecipeUpdateResponse)
+def update_cms_recipe(recipe_id: int, data: dict, db: Session = Depends(database.get_db)):
+    """
+    Manually update persistent dish entities. Changes are stored in DB 
+    and reflected across the OS.
+    """
+    try:
+        update = schemas.RecipeUpdate(**{key: data[key] for key in [*EDITABLE_DISH_FIELDS, "ingredients"] if key in data})
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return _apply_recipe_update(db, recipe_id, update)
+
+@app.patch("/cms/recipes/{recipe_id}", response_model=schemas.RecipeUpdateResponse)
+def patch_cms_recipe(recipe_id: int, update: schemas.RecipeUpdate, db: Session = Depends(database.get_db)):
+    """Partial edit: only the fields present in the body are touched."""
+    return _apply_recipe_update(db, recipe_id, update)
+
+@app.get("/cms/export")
+def export_recipes():
+    """Streams the whole catalog as NDJSON (one RecipeSchema per line) in constant memory."""
+    return StreamingResponse(
+        recipe_io.export_ndjson(database.SessionLocal),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="recipes.ndjson"'}
+    )
+
+@app.post("/cms/import")
+def import_recipes(file: UploadFile = File(...), generate_images: bool = False, db: Session = Depends(database.get_db)):
+    """
+    Bulk-loads an NDJSON file of RecipeSchema records without any AI calls.
+    Names already in the catalog are skipped; invalid lines are reported by
+    line number. generate_images queues artwork for dishes without a thumbnail.
+    """
+    report = recipe_io.import_ndjson(db, file.file, generate_images=generate_images)
+    if generate_images and report["imported"]:
+        image_queue.wake()
+    return report
 
 @app.post("/cms/recipes/{recipe_id}/regenerate")
-def regenerate_dish_content(recipe_id: int, db: Session = Depends(database.get_db)):
+def regenerate_dish_content(recipe_id: int, force_refresh: bool = False, db: Session = Depends(database.get_db)):
     """
-    Force-clears local data and hits OpenAI API again for fresh content.
+    Force-clears local data and rebuilds the dish. The recipe text comes from
+    the persistent LLM cache unless force_refresh asks OpenAI for fresh content.
     """
     dish = db.query(models.Dish).filter(models.Dish.id == recipe_id).first()
     if not dish:
@@ -233,194 +409,533 @@ def regenerate_dish_content(recipe_id: int, db: Session = Depends(database.get_d
     
     dish_name = dish.name
     # Delete existing dish to trigger the logic in /extract-recipe
+    pairings.forget_dish(db, dish.id)
     db.delete(dish)
+    catalog.bump_catalog_version(db)
     db.commit()
     
     # Re-trigger extraction
-    return extract_recipe(text_input=dish_name, db=db)
+    return extract_recipe(text_input=dish_name, force_refresh=force_refresh, db=db)
+
+@app.get("/images/status")
+def get_image_status(db: Session = Depends(database.get_db)):
+    """Progress of the background image pipeline: counts per status and unfinished jobs."""
+    return image_worker.queue_status(db)
+
+@app.get("/assets/{digest}/{variant}")
+def get_asset(digest: str, variant: str, accept: Optional[str] = Header(None)):
+    """
+    A stored image variant. /assets/<hash>/card picks WebP or JPEG from the
+    Accept header; /assets/<hash>/card.jpg names the format. URLs are content
+    addressed, so responses are immutable and honour Range requests.
+    """
+    size, _, extension = variant.partition(".")
+    if (asset_store is None or not assets.valid_hash(digest) or size not in assets.VARIANTS
+            or (extension and extension not in assets.FORMATS)):
+        raise HTTPException(status_code=404, detail="Asset not found")
+
+    headers = {"Cache-Control": assets.IMMUTABLE_CACHE_CONTROL}
+    if not extension:
+        extension = "webp" if "image/webp" in (accept or "") else "jpg"
+        headers["Vary"] = "Accept"
+    key = assets.variant_key(digest, size, extension)
+    media_type = assets.FORMATS[extension][1]
+
+    path = asset_store.local_path(key)
+    if path:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    data = asset_store.read(key)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return Response(content=data, media_type=media_type, headers=headers)
 
 @app.post("/vision/scan")
 async def scan_item(file: UploadFile = File(...), mode: str = "pantry", db: Session = Depends(database.get_db)):
     """
     V7 Entry Point: Processes uploaded images through the Vision AI layer.
+    Images are downscaled before upload and results are cached by perceptual
+    hash; all blocking work runs off the event loop.
     """
     image_data = await file.read()
-    analysis = ai_service.analyze_image_vision(image_data, mode)
+    try:
+        prepared = await run_in_threadpool(vision.prepare_image, image_data)
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=400, detail="Unsupported or corrupt image")
+
+    analysis = await database.run_read(vision.lookup, prepared.phash, mode)
+    if analysis is None:
+        try:
+            analysis = await ai_service.analyze_image_vision_async(prepared.jpeg_bytes, mode)
+        except ai_governor.AIUnavailable as e:
+            raise _ai_unavailable(e)
+        await run_in_threadpool(vision.store, db, prepared.phash, mode, analysis)
     
     if mode == "dish":
-        # CMS Entity Matching: Find if this dish already exists in our persistent library
-        dish_name = analysis.get("name")
-        existing = db.query(models.Dish).filter(models.Dish.name.ilike(f"%{dish_name}%")).first()
-        if existing:
-            return {"status": "match_found", "dish": existing}
-        
-        # If new, trigger the CMS extraction logic
-        return extract_recipe(text_input=dish_name, db=db)
+        return await run_in_threadpool(_match_scanned_dish, db, analysis.get("name"))
 
     return {"status": "success", "items": analysis.get("items", [])}
 
+def _match_scanned_dish(db: Session, dish_name: str):
+    # CMS Entity Matching: Find if this dish already exists in our persistent library
+    existing = search.best_match(db, dish_name)
+    if existing:
+        return {"status": "match_found", "dish": serializers.recipe_detail(db, existing.id)}
+    
+    # If new, trigger the CMS extraction logic
+    return extract_recipe(text_input=dish_name, db=db)
+
 # --- MEAL PLANNING & AUTO-DEDUCTION ---
 
 @app.get("/meal-planner", response_model=list[schemas.MealPlanResponse])
-def get_meal_plan(db: Session = Depends(database.get_db)):
+def get_meal_plan(household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
     """Fetch the current meal plan."""
-    return db.query(models.MealPlan).all()
+    return db.query(models.MealPlan).filter(models.MealPlan.household_id == household_id).all()
 
 @app.post("/meal-planner", response_model=schemas.MealPlanResponse)
-def add_to_planner(plan: schemas.MealPlanCreate, db: Session = Depends(database.get_db)):
+def add_to_planner(plan: schemas.MealPlanCreate, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
     """Add a dish to the planner."""
+    before = pairings.day_dishes(db, household_id, [plan.planned_date])
     new_entry = models.MealPlan(
+        household_id=household_id,
         dish_id=plan.dish_id,
         planned_date=plan.planned_date,
         meal_slot=plan.meal_slot
     )
     db.add(new_entry)
+    shopping_list.apply_plan_delta(db, household_id, plan.dish_id, +1)
+    db.flush()
+    pairings.apply_plan_changes(db, household_id, before)
     db.commit()
     db.refresh(new_entry)
     return new_entry
 
 @app.delete("/meal-planner/{plan_id}")
-def remove_from_planner(plan_id: int, db: Session = Depends(database.get_db)):
+def remove_from_planner(plan_id: int, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
     """RESTORED: Endpoint to remove items from the planner UI."""
-    plan_entry = db.query(models.MealPlan).filter(models.MealPlan.id == plan_id).first()
+    plan_entry = db.query(models.MealPlan).filter(
+        models.MealPlan.household_id == household_id, models.MealPlan.id == plan_id
+    ).first()
     if not plan_entry:
         raise HTTPException(status_code=404, detail="Plan entry not found")
+    before = pairings.day_dishes(db, household_id, [plan_entry.planned_date])
+    shopping_list.apply_plan_delta(db, household_id, plan_entry.dish_id, -1)
     db.delete(plan_entry)
+    db.flush()
+    pairings.apply_plan_changes(db, household_id, before)
     db.commit()
     return {"status": "success", "message": "Meal removed from planner"}
 
+# Longest window /meal-planner/generate fills in one call
+MAX_GENERATE_DAYS = 92
+
+@app.post("/meal-planner/generate")
+def generate_meal_plan(request: schemas.MealPlanGenerateRequest, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
+    """
+    Fills every slot in the date range toward the profile's daily goals
+    (see meal_generator.py) and writes the new plans in one bulk insert.
+    """
+    days = meal_generator.date_range(request.start_date, request.end_date)
+    if not days:
+        raise HTTPException(status_code=400, detail="'end_date' must not be before 'start_date'")
+    if len(days) > MAX_GENERATE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Generate at most {MAX_GENERATE_DAYS} days at a time")
+    slots = list(dict.fromkeys(request.slots))
+    if not slots:
+        raise HTTPException(status_code=400, detail="At least one slot is required")
+
+    goals = _profile_goals(db, household_id)
+    goal_vector = [models.nutrient_amount(goals[key]) or 0 for key in ("calories", "protein", "carbs", "fats")]
+    dish_catalog = meal_generator.load_catalog(db, household_id)
+    position = {dish_id: i for i, dish_id in enumerate(dish_catalog["ids"].tolist())}
+
+    existing = db.query(models.MealPlan).filter(
+        models.MealPlan.household_id == household_id,
+        models.MealPlan.planned_date.between(days[0], days[-1]),
+        models.MealPlan.meal_slot.in_(slots)
+    ).all()
+    before = pairings.day_dishes(db, household_id, days)
+    replaced = 0
+    fixed = {}
+    if request.replace_existing and existing:
+        removed = defaultdict(int)
+        for plan in existing:
+            removed[plan.dish_id] -= 1
+        shopping_list.apply_plan_deltas(db, household_id, removed)
+        db.query(models.MealPlan).filter(
+            models.MealPlan.id.in_([plan.id for plan in existing])
+        ).delete(synchronize_session=False)
+        replaced = len(existing)
+    else:
+        day_index = {day: i for i, day in enumerate(days)}
+        slot_index = {slot: i for i, slot in enumerate(slots)}
+        for plan in existing:
+            key = (day_index[plan.planned_date], slot_index[plan.meal_slot])
+            # Dishes without nutrition still block the slot; -2 marks "kept, not scored"
+            fixed.setdefault(key, position.get(plan.dish_id, -2))
+
+    picks = meal_generator.solve(dish_catalog, goal_vector, len(days), slots, fixed=fixed, seed=request.seed)
+
+    rows, added = [], defaultdict(int)
+    for d, day in enumerate(days):
+        for s, slot in enumerate(slots):
+            row = picks[d, s]
+            if (d, s) in fixed or row < 0:
+                continue
+            dish_id = int(dish_catalog["ids"][row])
+            rows.append({"household_id": household_id, "dish_id": dish_id, "planned_date": day, "meal_slot": slot})
+            added[dish_id] += 1
+    if rows:
+        db.execute(insert(models.MealPlan), rows)
+        shopping_list.apply_plan_deltas(db, household_id, added)
+    pairings.apply_plan_changes(db, household_id, before)
+    db.commit()
+
+    unfilled = sum(1 for d in range(len(days)) for s in range(len(slots)) if picks[d, s] < 0 and (d, s) not in fixed)
+    return {"status": "success", "created": len(rows), "replaced": replaced, "kept": len(fixed), "unfilled": unfilled}
+
+def _complete_plans(db: Session, household_id: int, plans: list) -> list:
+    """
+    Cooks many planned meals in one transaction: one IN query for recipe
+    links, an unlocked read of the pantry units to convert into, then one
+    locking IN query and an atomic decrement per pantry row so concurrent
+    completions never lose an update.
+    Returns a per-ingredient deduction report. The caller commits.
+    """
+    dish_counts = defaultdict(int)
+    for plan in plans:
+        dish_counts[plan.dish_id] += 1
+
+    # Gross needs per (ingredient, recipe unit) across every plan
+    needs = defaultdict(float)
+    names = {}
+    for dish_id, ingredient_id, name, quantity, unit in (
+        db.query(
+            models.DishIngredient.dish_id, models.DishIngredient.ingredient_id,
+            models.Ingredient.name, models.DishIngredient.quantity, models.DishIngredient.unit
+        )
+        .join(models.Ingredient, models.Ingredient.id == models.DishIngredient.ingredient_id)
+        .filter(models.DishIngredient.dish_id.in_(dish_counts))
+        .all()
+    ):
+        needs[(ingredient_id, unit)] += (quantity or 0) * dish_counts[dish_id]
+        names[ingredient_id] = name
+
+    # Conversions are worked out before any pantry row is locked: a pair with
+    # no local path asks the model, and nothing may wait on that behind our
+    # locks. A pantry row's unit never changes, so an unlocked read is enough.
+    pantry_rows = {}
+    for item_id, ingredient_id, pantry_unit in (
+        db.query(models.PantryItem.id, models.PantryItem.ingredient_id, models.PantryItem.unit)
+        .filter(models.PantryItem.household_id == household_id, models.PantryItem.ingredient_id.in_(names))
+        .order_by(models.PantryItem.id)
+    ):
+        pantry_rows.setdefault(ingredient_id, (item_id, pantry_unit))
+
+    deductions = defaultdict(float)
+    for (ingredient_id, unit), quantity in needs.items():
+        if ingredient_id not in pantry_rows:
+            continue
+        item_id, pantry_unit = pantry_rows[ingredient_id]
+        if pantry_unit.lower() != unit.lower():
+            quantity = units.convert_quantity(db, ingredient_id, names[ingredient_id], quantity, unit, pantry_unit)
+        deductions[item_id] += quantity
+
+    # Lock in id order so concurrent completions cannot deadlock
+    db.query(models.PantryItem.id).filter(models.PantryItem.id.in_(deductions)).order_by(
+        models.PantryItem.id
+    ).with_for_update().all()
+    for item_id, amount in sorted(deductions.items()):
+        remaining = models.PantryItem.current_quantity - amount
+        db.execute(
+            update(models.PantryItem)
+            .where(models.PantryItem.id == item_id)
+            .values(current_quantity=case((remaining < 0, 0), else_=remaining), last_updated=date.today())
+        )
+
+    # Re-read the decremented rows and drop the cooked meals' shopping-list needs
+    pantry = {
+        item.ingredient_id: item for item in
+        db.query(models.PantryItem).filter(models.PantryItem.id.in_(deductions)).populate_existing()
+    }
+    shopping_list.apply_plan_deltas(db, household_id, {dish_id: -count for dish_id, count in dish_counts.items()})
+    db.query(models.MealPlan).filter(
+        models.MealPlan.id.in_([plan.id for plan in plans])
+    ).delete(synchronize_session=False)
+
+    report = []
+    for ingredient_id, name in sorted(names.items(), key=lambda pair: pair[1]):
+        item = pantry.get(ingredient_id)
+        report.append({
+            "ingredient": name,
+            "deducted": round(deductions.get(item.id, 0.0), 2) if item else 0.0,
+            "unit": item.unit if item else None,
+            "remaining": item.current_quantity if item else None,
+            "in_pantry": item is not None
+        })
+    return report
+
+@app.post("/meal-planner/complete")
+def complete_meals(request: schemas.MealCompletionRequest, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
+    """Mark many meals (e.g. a whole day or week) as cooked in a single transaction."""
+    query = db.query(models.MealPlan)
+    conditions = []
+    if request.plan_ids:
+        conditions.append(models.MealPlan.id.in_(request.plan_ids))
+    if request.planned_from or request.planned_to:
+        start = request.planned_from or request.planned_to
+        end = request.planned_to or request.planned_from
+        conditions.append(models.MealPlan.planned_date.between(start, end))
+    if not conditions:
+        raise HTTPException(status_code=400, detail="Provide plan_ids or a planned date range")
+
+    plans = (
+        query.filter(models.MealPlan.household_id == household_id, or_(*conditions))
+        .order_by(models.MealPlan.id).with_for_update().all()
+    )
+    found = {plan.id for plan in plans}
+    report = _complete_plans(db, household_id, plans) if plans else []
+    db.commit()
+    alert_scheduler.wake()
+
+    return {
+        "status": "success",
+        "completed": sorted(found),
+        "not_found": [plan_id for plan_id in request.plan_ids if plan_id not in found],
+        "deductions": report
+    }
+
 @app.post("/meal-planner/{plan_id}/complete")
-def complete_meal(plan_id: int, db: Session = Depends(database.get_db)):
+def complete_meal(plan_id: int, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
     """Mark meal as cooked and deduct ingredients from pantry."""
-    plan_entry = db.query(models.MealPlan).filter(models.MealPlan.id == plan_id).first()
+    plan_entry = db.query(models.MealPlan).filter(
+        models.MealPlan.household_id == household_id, models.MealPlan.id == plan_id
+    ).with_for_update().first()
     if not plan_entry:
         raise HTTPException(status_code=404, detail="Plan entry not found")
 
-    for dish_ing in plan_entry.dish.ingredients:
-        pantry_item = db.query(models.PantryItem).filter(
-            models.PantryItem.ingredient_id == dish_ing.ingredient_id
-        ).first()
-        
-        if pantry_item:
-            deduction = dish_ing.quantity
-            if pantry_item.unit.lower() != dish_ing.unit.lower():
-                deduction = ai_service.get_unit_conversion(
-                    dish_ing.ingredient.name, dish_ing.quantity, dish_ing.unit, pantry_item.unit
-                )
-            pantry_item.current_quantity = max(0, pantry_item.current_quantity - deduction)
-    
-    db.delete(plan_entry)
+    report = _complete_plans(db, household_id, [plan_entry])
     db.commit()
-    return {"status": "success", "message": "Pantry inventory updated."}
+    alert_scheduler.wake()
+    return {"status": "success", "message": "Pantry inventory updated.", "deductions": report}
 
 # --- HEALTH INTELLIGENCE ---
 
-@app.get("/health-stats/{date_str}")
-def get_health_stats(date_str: str, db: Session = Depends(database.get_db)):
-    planned_meals = db.query(models.MealPlan).filter(models.MealPlan.planned_date == date_str).all()
-    actual_stats = {"calories": 0, "protein": 0, "carbs": 0, "fats": 0}
-    
-    for plan in planned_meals:
-        nutr = plan.dish.nutrition
-        if nutr:
-            actual_stats["calories"] += int(nutr.get("calories", 0))
-            # Handle the 'g' suffix for actual values
-            actual_stats["protein"] += int(str(nutr.get("protein", "0")).replace('g', ''))
-            actual_stats["carbs"] += int(str(nutr.get("carbs", "0")).replace('g', ''))
-            actual_stats["fats"] += int(str(nutr.get("fats", "0")).replace('g', ''))
-            
-    profile = db.query(models.UserProfile).first() or models.UserProfile()
+# Longest window /health-stats will aggregate in one call
+MAX_STATS_RANGE_DAYS = 366
+
+def _daily_nutrition_totals(db: Session, household_id: int, start: date, end: date) -> dict:
+    """Per-day macro totals for the household's planned meals in [start, end], as one SQL aggregate."""
+    rows = (
+        db.query(
+            models.MealPlan.planned_date,
+            func.coalesce(func.sum(models.Dish.calories), 0),
+            func.coalesce(func.sum(models.Dish.protein_g), 0),
+            func.coalesce(func.sum(models.Dish.carbs_g), 0),
+            func.coalesce(func.sum(models.Dish.fats_g), 0)
+        )
+        .join(models.Dish, models.Dish.id == models.MealPlan.dish_id)
+        .filter(
+            models.MealPlan.household_id == household_id,
+            models.MealPlan.planned_date >= start, models.MealPlan.planned_date <= end
+        )
+        .group_by(models.MealPlan.planned_date)
+        .all()
+    )
+    return {
+        day: {"calories": int(cals), "protein": int(protein), "carbs": int(carbs), "fats": int(fats)}
+        for day, cals, protein, carbs, fats in rows
+    }
+
+# Goal column per macro; column defaults apply until a profile row exists
+GOAL_COLUMNS = {
+    "calories": "daily_calorie_goal",
+    "protein": "daily_protein_goal",
+    "carbs": "daily_carbs_goal",
+    "fats": "daily_fats_goal",
+}
+
+PROFILE_GOALS_CACHE_TTL = float(os.getenv("PROFILE_GOALS_CACHE_TTL", "600"))
+
+# Read on every /health-stats and /recommend-me call, written only by PUT /profile
+profile_goals = caching.ReadThroughCache("profile_goals", PROFILE_GOALS_CACHE_TTL, maxsize=4096)
+caching.invalidate_on(models.UserProfile, profile_goals, lambda profile: [profile.household_id])
+
+def _profile_goals(db: Session, household_id: int) -> dict:
+    def load():
+        profile = db.query(models.UserProfile).filter(models.UserProfile.household_id == household_id).first()
+        columns = models.UserProfile.__table__.c
+        return {
+            key: getattr(profile, column) if profile else columns[column].default.arg
+            for key, column in GOAL_COLUMNS.items()
+        }
+    return profile_goals.get_or_load(household_id, load)
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+
+def get_health_stats(date_str: str, db: Session, household_id: int):
+    day = _parse_date(date_str)
+    empty = {"calories": 0, "protein": 0, "carbs": 0, "fats": 0}
     
     return {
         "date": date_str,
-        "actual": actual_stats,
-        "goals": {
-            "calories": profile.daily_calorie_goal,
-            "protein": profile.daily_protein_goal,
-            "carbs": profile.daily_carbs_goal,
-            "fats": profile.daily_fats_goal
-        }
+        "actual": _daily_nutrition_totals(db, household_id, day, day).get(day, empty),
+        "goals": _profile_goals(db, household_id)
     }
 
+@app.get("/health-stats/{date_str}")
+async def get_health_stats_for_day(date_str: str, household_id: int = Depends(tenancy.current_household)):
+    return await database.run_read(lambda db: get_health_stats(date_str, db, household_id))
+
+@app.get("/health-stats")
+async def get_health_stats_range(
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+    household_id: int = Depends(tenancy.current_household)
+):
+    """Per-day totals for a whole week or month; every day in the range is listed."""
+    return await database.run_read(_health_stats_range, household_id, from_date, to_date)
+
+def _health_stats_range(db: Session, household_id: int, from_date: str, to_date: str):
+    start, end = _parse_date(from_date), _parse_date(to_date)
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (end - start).days >= MAX_STATS_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_STATS_RANGE_DAYS} days")
+
+    totals = _daily_nutrition_totals(db, household_id, start, end)
+    goals = _profile_goals(db, household_id)
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        days.append({
+            "date": day.isoformat(),
+            "actual": totals.get(day, {"calories": 0, "protein": 0, "carbs": 0, "fats": 0}),
+            "goals": goals
+        })
+    return {"from": start.isoformat(), "to": end.isoformat(), "days": days}
+
 @app.get("/recommend-me")
-def recommend_meal(slot: str = Query("Dinner"), db: Session = Depends(database.get_db)):
-    """RESTORED: AI recommendation logic to fix 404 on UI."""
-    today_str = date.today().isoformat()
-    health_data = get_health_stats(today_str, db)
-    # Extract integer from calorie goals
-    remaining = health_data["goals"].get("daily_calorie_goal", 2000) - health_data["actual"]["calories"]
-
-    ingredients = db.query(models.Ingredient.name).select_from(models.Ingredient).join(
-        models.DishIngredient, models.Ingredient.id == models.DishIngredient.ingredient_id
-    ).join(
-        models.MealPlan, models.DishIngredient.dish_id == models.MealPlan.dish_id
-    ).distinct().all()
-    
-    ing_list = [i.name for i in ingredients]
-    recommendation = ai_service.get_smart_recommendation(max(0, remaining), ing_list, slot)
-    
-    return {"recommendation": recommendation}
+def recommend_meal(slot: str = Query("Dinner"), household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
+    """
+    Recommends a dish for the slot from the remaining calorie budget. Saved
+    dishes are ranked locally and the model only picks among the best few;
+    answers are cached (see recommender.py).
+    """
+    health_data = get_health_stats(date.today().isoformat(), db, household_id)
+    remaining = (health_data["goals"]["calories"] or 2000) - health_data["actual"]["calories"]
+    return recommender.recommend(db, household_id, remaining, slot)
 
 # --- DYNAMIC PANTRY & UNIFIED SHOPPING ---
 
 @app.get("/pantry")
-def get_pantry(db: Session = Depends(database.get_db)):
-    items = db.query(models.PantryItem).all()
+async def get_pantry(household_id: int = Depends(tenancy.current_household)):
+    return await database.run_read(_pantry_listing, household_id)
+
+def _pantry_listing(db: Session, household_id: int):
+    items = (
+        db.query(models.PantryItem, models.Ingredient.name)
+        .join(models.Ingredient, models.Ingredient.id == models.PantryItem.ingredient_id)
+        .filter(models.PantryItem.household_id == household_id)
+        .all()
+    )
     return [{
-        "id": item.id, "name": item.ingredient.name, 
-        "quantity": item.current_quantity, "unit": item.unit, 
+        "id": item.id, "name": name,
+        "quantity": item.current_quantity, "unit": item.unit,
         "threshold": item.min_threshold, "expiry": item.expiry_date
-    } for item in items]
+    } for item, name in items]
+
+@app.post("/pantry/purchase")
+def purchase_pantry_item(item_name: str, quantity: float, unit: str, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
+    """Restock the pantry; the quantity is converted into the item's stored unit."""
+    ingredient_id = ingredients.resolve_ingredients(db, [(item_name, "Pantry")], enqueue_images=False)[item_name]
+
+    item = db.query(models.PantryItem).filter(
+        models.PantryItem.household_id == household_id, models.PantryItem.ingredient_id == ingredient_id
+    ).first()
+    if item:
+        added = units.convert_quantity(db, ingredient_id, item_name, quantity, unit, item.unit)
+        # Relative update, so a completion deducting from the row meanwhile is not overwritten
+        db.execute(
+            update(models.PantryItem).where(models.PantryItem.id == item.id)
+            .values(current_quantity=models.PantryItem.current_quantity + added, last_updated=date.today())
+        )
+        db.refresh(item)
+    else:
+        item = models.PantryItem(household_id=household_id, ingredient_id=ingredient_id, current_quantity=quantity, unit=unit)
+        db.add(item)
+    db.flush()
+
+    shopping_list.refresh_ingredients(db, household_id, [ingredient_id])
+    db.commit()
+    alert_scheduler.wake()
+    return {"status": "success", "name": item_name, "quantity": item.current_quantity, "unit": item.unit}
 
 @app.get("/shopping-list")
-def get_shopping_list(db: Session = Depends(database.get_db)):
-    """Unified logic combining recipe needs and safety buffers."""
-    recipe_needs = (
-        db.query(
-            models.Ingredient.name.label("name"),
-            models.Ingredient.category.label("category"),
-            func.sum(models.DishIngredient.quantity).label("gross_qty"),
-            models.DishIngredient.unit.label("unit")
-        )
-        .select_from(models.Ingredient)
-        .join(models.DishIngredient, models.Ingredient.id == models.DishIngredient.ingredient_id)
-        .join(models.MealPlan, models.DishIngredient.dish_id == models.MealPlan.dish_id)
-        .group_by(models.Ingredient.name, models.Ingredient.category, models.DishIngredient.unit)
-        .all()
-    )
+async def get_shopping_list(household_id: int = Depends(tenancy.current_household)):
+    """
+    Unified logic combining recipe needs and safety buffers. The list is
+    maintained incrementally (see shopping_list.py), so this is a single read.
+    """
+    return await database.run_read(shopping_list.read_shopping_list, household_id)
 
-    pantry_items = db.query(models.PantryItem).all()
-    pantry_map = {item.ingredient.name: item for item in pantry_items}
-    shopping_dict = {}
-
-    for need in recipe_needs:
-        p_item = pantry_map.get(need.name)
-        on_hand = 0
-        if p_item:
-            on_hand = p_item.current_quantity
-            if p_item.unit.lower() != need.unit.lower():
-                on_hand = ai_service.get_unit_conversion(need.name, on_hand, p_item.unit, need.unit)
-        
-        gap = max(0, need.gross_qty - on_hand)
-        if gap > 0:
-            shopping_dict[need.name] = {"name": need.name, "quantity": round(gap, 2), "unit": need.unit, "reason": "Planned Meals"}
-
-    for name, item in pantry_map.items():
-        if item.current_quantity < item.min_threshold:
-            shortfall = item.min_threshold - item.current_quantity
-            if name in shopping_dict:
-                shopping_dict[name]["quantity"] += round(shortfall, 2)
-                shopping_dict[name]["reason"] += " + Safety Buffer"
-            else:
-                shopping_dict[name] = {"name": name, "quantity": round(shortfall, 2), "unit": item.unit, "reason": "Low Stock"}
-
-    return list(shopping_dict.values())
+@app.put("/ingredients/{ingredient_id}/units")
+def update_ingredient_units(ingredient_id: int, data: schemas.IngredientUnitsUpdate, db: Session = Depends(database.get_db)):
+    """Pin the density / piece weight the local unit-conversion engine uses for an ingredient."""
+    if not db.get(models.Ingredient, ingredient_id):
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    units.set_ingredient_factors(db, ingredient_id, data.density_g_per_ml, data.piece_weight_g)
+    return {"status": "success"}
 
 @app.get("/pantry/expiry-alerts")
-def get_expiry_alerts(db: Session = Depends(database.get_db)):
-    upcoming = date.today() + timedelta(days=3)
-    expiring = db.query(models.PantryItem).filter(models.PantryItem.expiry_date <= upcoming).all()
-    return [{"item": i.ingredient.name, "expiry": i.expiry_date} for i in expiring]
+async def get_expiry_alerts(household_id: int = Depends(tenancy.current_household)):
+    """Unacknowledged expiring / expired items, read from the precomputed alert feed."""
+    rows = await database.run_read(
+        alerts.feed, household_id, 0, alerts.MAX_FEED_LIMIT, False, False, list(alerts.EXPIRY_KINDS)
+    )
+    return [{"item": row["item"], "expiry": row["expiry"]} for row in rows]
+
+@app.get("/alerts")
+async def get_alerts(
+    response: Response,
+    since: int = Query(0, ge=0, description="Last alert id already seen"),
+    limit: int = Query(100, ge=1, le=alerts.MAX_FEED_LIMIT),
+    include_acknowledged: bool = False,
+    include_resolved: bool = False,
+    household_id: int = Depends(tenancy.current_household),
+):
+    """
+    Expiry and low-stock alerts newer than the since cursor. Cheap to poll:
+    alerts are computed by the background scheduler (see alerts.py), and the
+    cursor for the next poll is in the X-Next-Cursor header.
+    """
+    rows = await database.run_read(alerts.feed, household_id, since, limit, include_acknowledged, include_resolved)
+    response.headers["X-Next-Cursor"] = str(rows[-1]["id"] if rows else since)
+    return rows
+
+@app.post("/alerts/{alert_id}/acknowledge")
+def acknowledge_alert(alert_id: int, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
+    alert = db.get(models.PantryAlert, alert_id)
+    if not alert or alert.household_id != household_id:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    alerts.acknowledge(db, household_id, alert_ids=[alert_id])
+    return {"status": "success"}
+
+@app.post("/alerts/acknowledge")
+def acknowledge_alerts(
+    up_to: int = Query(..., description="Acknowledge every alert with id <= up_to"),
+    household_id: int = Depends(tenancy.current_household),
+    db: Session = Depends(database.get_db)
+):
+    return {"status": "success", "acknowledged": alerts.acknowledge(db, household_id, up_to=up_to)}
+
+@app.post("/alerts/evaluate")
+def evaluate_alerts(household_id: int = Depends(tenancy.current_household)):
+    """Re-evaluates this household's alerts now instead of waiting for the scheduler's next tick."""
+    return alert_scheduler.run_for_household(household_id)
 
 # --- NEW V6: PROFILE MANAGEMENT & CALCULATION ---
 
@@ -449,20 +964,26 @@ def calculate_nutritional_goals(user: models.UserProfile):
     return int(tdee), f"{int(protein_g)}g", f"{int(carbs_g)}g", f"{int(fats_g)}g"
 
 @app.get("/profile")
-def get_profile(db: Session = Depends(database.get_db)):
-    profile = db.query(models.UserProfile).first()
+def get_profile(household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
+    return _household_profile(db, household_id)
+
+def _household_profile(db: Session, household_id: int) -> models.UserProfile:
+    profile = db.query(models.UserProfile).filter(models.UserProfile.household_id == household_id).first()
     if not profile:
-        profile = models.UserProfile()
+        profile = models.UserProfile(household_id=household_id)
         db.add(profile)
         db.commit()
         db.refresh(profile)
     return profile
 
+# Profile columns a client may never overwrite
+PROTECTED_PROFILE_FIELDS = {"id", "household_id"}
+
 @app.put("/profile")
-def update_profile(data: dict, db: Session = Depends(database.get_db)):
-    profile = db.query(models.UserProfile).first()
+def update_profile(data: dict, household_id: int = Depends(tenancy.current_household), db: Session = Depends(database.get_db)):
+    profile = _household_profile(db, household_id)
     for key, value in data.items():
-        if hasattr(profile, key):
+        if hasattr(profile, key) and key not in PROTECTED_PROFILE_FIELDS:
             setattr(profile, key, value)
     
     # Recalculate goals based on new metrics
@@ -473,4 +994,9 @@ def update_profile(data: dict, db: Session = Depends(database.get_db)):
     profile.daily_fats_goal = fats
     
     db.commit()
-    return profile
\ No newline at end of file
+    return profile
+
+@app.post("/households", response_model=schemas.HouseholdResponse)
+def create_household(request: schemas.HouseholdCreate, db: Session = Depends(database.get_db)):
+    """Creates a kitchen; send the returned token as X-Household-Token to act for it."""
+    return tenancy.create_household(db, request.name)
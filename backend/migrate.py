@@ -0,0 +1,182 @@
+"""
+Versioned schema migrations.
+
+    python migrate.py            # apply every pending migration
+    python migrate.py --status   # list applied and pending versions
+
+Migrations live in migrations/NNNN_description.py. Each defines
+`upgrade(conn)` and runs in its own transaction. Its number is recorded in
+schema_migrations only when it commits, and the first failure stops the run
+with a non-zero exit. The API never runs DDL: deploy by running this first.
+
+Data backfills that go through the ORM belong in an optional
+`finalize(session)`. It runs after every pending migration has been applied,
+so the models and the schema agree. A migration counts as finalized only
+once its finalize commits; one that failed is re-run by the next upgrade.
+
+0001 creates any missing table from the current models, so a fresh database
+is complete after it. Every later migration must therefore be idempotent.
+Use the add_column / create_index helpers, which inspect before altering.
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+import database
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+    Column("finalized_at", DateTime, nullable=True),
+)
+
+class MigrationError(RuntimeError):
+    pass
+
+def discover() -> list:
+    """(version, name, module) for every migration file, in version order."""
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        spec = importlib.util.spec_from_file_location(f"migration_{match.group(1)}", os.path.join(MIGRATIONS_DIR, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        found.append((int(match.group(1)), match.group(2), module))
+    versions = [version for version, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise MigrationError("Duplicate migration version numbers")
+    return found
+
+def applied_versions(conn: Connection) -> set:
+    if not inspect(conn).has_table("schema_migrations"):
+        return set()
+    return {version for (version,) in conn.execute(select(schema_migrations.c.version))}
+
+def unfinalized_versions(conn: Connection) -> set:
+    """Applied versions whose finalize has not committed yet."""
+    if not inspect(conn).has_table("schema_migrations") or not has_column(conn, "schema_migrations", "finalized_at"):
+        return set()
+    return {
+        version for (version,) in
+        conn.execute(select(schema_migrations.c.version).where(schema_migrations.c.finalized_at.is_(None)))
+    }
+
+def pending(engine=None) -> list:
+    """Migrations not yet applied, or applied but not finalized."""
+    engine = engine or database.engine
+    with engine.connect() as conn:
+        done = applied_versions(conn) - unfinalized_versions(conn)
+    return [(version, name) for version, name, _ in discover() if version not in done]
+
+def upgrade(engine=None, log=print) -> list:
+    """Applies pending migrations in order; returns the versions applied."""
+    engine = engine or database.engine
+    with engine.begin() as conn:
+        _meta.create_all(conn)
+        if add_column(conn, "schema_migrations", "finalized_at", "TIMESTAMP"):
+            # Recorded before finalization was tracked, when finalize ran right after
+            conn.execute(schema_migrations.update().values(finalized_at=schema_migrations.c.applied_at))
+        done = applied_versions(conn)
+        unfinalized = unfinalized_versions(conn)
+
+    applied, finalizers = [], []
+    for version, name, module in discover():
+        if version in done:
+            if version in unfinalized and hasattr(module, "finalize"):
+                finalizers.append((version, name, module.finalize))
+            continue
+        log(f"Applying {version:04d}_{name} ...")
+        has_finalize = hasattr(module, "finalize")
+        try:
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version, name=name, finalized_at=None if has_finalize else datetime.utcnow()
+                ))
+        except Exception as e:
+            raise MigrationError(f"Migration {version:04d}_{name} failed: {e}") from e
+        applied.append(version)
+        if has_finalize:
+            finalizers.append((version, name, module.finalize))
+
+    for version, name, finalize in finalizers:
+        log(f"Finalizing {version:04d}_{name} ...")
+        db = Session(bind=engine)
+        try:
+            finalize(db)
+            db.execute(
+                schema_migrations.update().where(schema_migrations.c.version == version)
+                .values(finalized_at=datetime.utcnow())
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise MigrationError(f"Finalizing {version:04d}_{name} failed: {e}") from e
+        finally:
+            db.close()
+    return applied
+
+# --- Idempotent DDL helpers for migration modules ---
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN unless present. ddl is the type and default, e.g. "FLOAT DEFAULT 0.0"."""
+    if has_column(conn, table, column):
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+def has_index(conn: Connection, table: str, name: str) -> bool:
+    inspector = inspect(conn)
+    names = {index["name"] for index in inspector.get_indexes(table)}
+    names |= {constraint["name"] for constraint in inspector.get_unique_constraints(table)}
+    return name in names
+
+def create_index(conn: Connection, name: str, table: str, columns: list, unique: bool = False) -> bool:
+    if has_index(conn, table, name):
+        return False
+    conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"))
+    return True
+
+def drop_index(conn: Connection, table: str, name: str) -> bool:
+    if not has_index(conn, table, name):
+        return False
+    conn.execute(text(f"DROP INDEX {name}"))
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        waiting = pending()
+        waiting_versions = {version for version, _ in waiting}
+        for version, name, _ in discover():
+            print(f"{'pending' if version in waiting_versions else 'applied'}  {version:04d}_{name}")
+        return
+
+    try:
+        applied = upgrade()
+    except MigrationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Database is up to date ({len(applied)} migration(s) applied).")
+
+if __name__ == "__main__":
+    main()
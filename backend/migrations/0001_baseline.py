@@ -0,0 +1,5 @@
+"""Creates every table (and its declared indexes) that does not exist yet."""
+import models
+
+def upgrade(conn):
+    models.Base.metadata.create_all(conn)
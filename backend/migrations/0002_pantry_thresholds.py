@@ -0,0 +1,6 @@
+"""V5.3: low-stock threshold and expiry tracking on pantry rows (was migrate_v5.py)."""
+from migrate import add_column
+
+def upgrade(conn):
+    add_column(conn, "pantry_inventory", "min_threshold", "FLOAT DEFAULT 1.0")
+    add_column(conn, "pantry_inventory", "expiry_date", "DATE")
@@ -0,0 +1,10 @@
+"""V6: biometric fields on user profiles (was migrate_v6.py)."""
+from migrate import add_column
+
+def upgrade(conn):
+    add_column(conn, "user_profiles", "name", "VARCHAR DEFAULT 'User'")
+    add_column(conn, "user_profiles", "age", "INTEGER DEFAULT 25")
+    add_column(conn, "user_profiles", "weight_kg", "FLOAT DEFAULT 70.0")
+    add_column(conn, "user_profiles", "height_cm", "FLOAT DEFAULT 175.0")
+    add_column(conn, "user_profiles", "gender", "VARCHAR DEFAULT 'male'")
+    add_column(conn, "user_profiles", "activity_level", "VARCHAR DEFAULT 'moderate'")
@@ -0,0 +1,13 @@
+"""Materialized shopping list: planned needs, reasons and one row per (ingredient, unit) (was migrate_v7.py)."""
+from migrate import add_column, create_index
+import shopping_list
+
+def upgrade(conn):
+    add_column(conn, "shopping_list", "planned_quantity", "FLOAT DEFAULT 0.0")
+    add_column(conn, "shopping_list", "reason", "VARCHAR")
+    create_index(conn, "uq_shopping_list_ingredient_unit", "shopping_list", ["ingredient_id", "unit"], unique=True)
+    create_index(conn, "ix_shopping_list_total_quantity", "shopping_list", ["total_quantity"])
+
+def finalize(db):
+    # Populate the materialized list from the current meal plan and pantry
+    shopping_list.rebuild(db, fix=True)
@@ -0,0 +1,13 @@
+"""Numeric copies of the nutrition JSON on dishes, for SQL aggregates (was migrate_v8.py)."""
+from migrate import add_column
+import models
+
+def upgrade(conn):
+    for column in ["calories", "protein_g", "carbs_g", "fats_g"]:
+        add_column(conn, "dishes", column, "FLOAT")
+
+def finalize(db):
+    # Re-assigning the JSON runs Dish's validator, which fills the numeric columns
+    for dish in db.query(models.Dish).filter(models.Dish.calories.is_(None)).yield_per(500):
+        dish.nutrition = dict(dish.nutrition or {})
+    db.commit()
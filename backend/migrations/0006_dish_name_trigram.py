@@ -0,0 +1,8 @@
+"""pg_trgm GIN index behind /recipes/search (was migrate_v9.py). Postgres only; other backends search in Python."""
+from sqlalchemy import text
+
+def upgrade(conn):
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_dishes_name_trgm ON dishes USING gin (lower(name) gin_trgm_ops)"))
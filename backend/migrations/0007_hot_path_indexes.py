@@ -0,0 +1,53 @@
+"""
+Indexes behind the hot paths: plans by date, recipe links in both
+directions, and pantry rows by ingredient (one row per ingredient) and by
+expiry date. Duplicate pantry rows for one ingredient are merged into the
+oldest row first when they share a unit; mixed units stop the migration.
+"""
+from collections import defaultdict
+from sqlalchemy import text
+from migrate import create_index, has_index
+
+def _merge_duplicate_pantry_rows(conn):
+    groups = defaultdict(list)
+    for row in conn.execute(text(
+        "SELECT id, ingredient_id, current_quantity, unit, min_threshold, expiry_date "
+        "FROM pantry_inventory ORDER BY id"
+    )).mappings():
+        groups[row["ingredient_id"]].append(row)
+
+    mixed = []
+    for ingredient_id, rows in groups.items():
+        if len(rows) < 2:
+            continue
+        if len({(row["unit"] or "").lower() for row in rows}) > 1:
+            mixed.append(ingredient_id)
+            continue
+        keep, extra = rows[0], rows[1:]
+        expiries = [row["expiry_date"] for row in rows if row["expiry_date"] is not None]
+        conn.execute(
+            text("UPDATE pantry_inventory SET current_quantity = :quantity, min_threshold = :threshold, "
+                 "expiry_date = :expiry WHERE id = :id"),
+            {
+                "id": keep["id"],
+                "quantity": sum(row["current_quantity"] or 0 for row in rows),
+                "threshold": max(row["min_threshold"] or 0 for row in rows),
+                "expiry": min(expiries) if expiries else None,
+            }
+        )
+        conn.execute(text("DELETE FROM pantry_inventory WHERE id = :id"), [{"id": row["id"]} for row in extra])
+
+    if mixed:
+        raise RuntimeError(
+            f"pantry_inventory has rows in different units for ingredient ids {sorted(mixed)}; "
+            "merge them by hand, then re-run the migration"
+        )
+
+def upgrade(conn):
+    create_index(conn, "ix_meal_plans_planned_date", "meal_plans", ["planned_date"])
+    create_index(conn, "ix_dish_ingredients_dish_id", "dish_ingredients", ["dish_id"])
+    create_index(conn, "ix_dish_ingredients_ingredient_id", "dish_ingredients", ["ingredient_id"])
+    create_index(conn, "ix_pantry_inventory_expiry_date", "pantry_inventory", ["expiry_date"])
+    if not has_index(conn, "pantry_inventory", "ix_pantry_inventory_ingredient_id"):
+        _merge_duplicate_pantry_rows(conn)
+        create_index(conn, "ix_pantry_inventory_ingredient_id", "pantry_inventory", ["ingredient_id"], unique=True)
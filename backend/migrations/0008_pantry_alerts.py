@@ -0,0 +1,8 @@
+"""Alert feed table for the expiry / low-stock scheduler, and the pantry change index it scans."""
+import models
+from migrate import add_column, create_index
+
+def upgrade(conn):
+    models.PantryAlert.__table__.create(conn, checkfirst=True)
+    add_column(conn, "pantry_inventory", "last_updated", "DATE")
+    create_index(conn, "ix_pantry_inventory_last_updated", "pantry_inventory", ["last_updated"])
@@ -0,0 +1,5 @@
+"""Per-dish version counter keying the cached recipe detail payloads."""
+from migrate import add_column
+
+def upgrade(conn):
+    add_column(conn, "dishes", "version", "INTEGER NOT NULL DEFAULT 1")
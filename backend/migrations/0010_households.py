@@ -0,0 +1,54 @@
+"""
+Multi-household tenancy. Existing plans, pantry rows, alerts and the profile
+move into the default household; extra profile rows (only the first one was
+ever read) are dropped. Single-column indexes that tenant queries no longer
+use give way to composites led by household_id. The shopping list is
+derived data, so an unscoped copy is rebuilt rather than altered.
+"""
+from sqlalchemy import text
+import models
+import shopping_list
+import tenancy
+from migrate import add_column, create_index, drop_index, has_column
+
+TENANT_TABLES = ["meal_plans", "pantry_inventory", "user_profiles", "pantry_alerts"]
+
+def upgrade(conn):
+    postgres = conn.dialect.name == "postgresql"
+    models.Household.__table__.create(conn, checkfirst=True)
+    if not conn.execute(text("SELECT 1 FROM households WHERE id = :id"), {"id": tenancy.DEFAULT_HOUSEHOLD_ID}).first():
+        conn.execute(
+            text("INSERT INTO households (id, name, created_at) VALUES (:id, 'My Kitchen', CURRENT_TIMESTAMP)"),
+            {"id": tenancy.DEFAULT_HOUSEHOLD_ID}
+        )
+    if postgres:
+        # The explicit id above does not advance the serial sequence
+        conn.execute(text("SELECT setval(pg_get_serial_sequence('households', 'id'), (SELECT MAX(id) FROM households))"))
+
+    for table in TENANT_TABLES:
+        added = add_column(conn, table, "household_id", f"INTEGER NOT NULL DEFAULT {tenancy.DEFAULT_HOUSEHOLD_ID}")
+        if added and postgres:
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT fk_{table}_household "
+                "FOREIGN KEY (household_id) REFERENCES households (id)"
+            ))
+
+    drop_index(conn, "meal_plans", "ix_meal_plans_planned_date")
+    create_index(conn, "ix_meal_plans_household_date", "meal_plans", ["household_id", "planned_date"])
+
+    drop_index(conn, "pantry_inventory", "ix_pantry_inventory_ingredient_id")
+    create_index(conn, "uq_pantry_household_ingredient", "pantry_inventory", ["household_id", "ingredient_id"], unique=True)
+
+    conn.execute(text("DELETE FROM user_profiles WHERE id > (SELECT MIN(id) FROM user_profiles)"))
+    create_index(conn, "uq_user_profiles_household", "user_profiles", ["household_id"], unique=True)
+
+    create_index(conn, "ix_pantry_alerts_household_id_id", "pantry_alerts", ["household_id", "id"])
+
+    if not has_column(conn, "shopping_list", "household_id"):
+        conn.execute(text("DROP TABLE shopping_list"))
+        models.ShoppingListItem.__table__.create(conn)
+    else:
+        drop_index(conn, "shopping_list", "uq_shopping_list_ingredient_unit")
+
+def finalize(db):
+    shopping_list.rebuild(db, fix=True)
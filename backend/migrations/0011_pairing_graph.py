@@ -0,0 +1,29 @@
+"""
+Weighted dish pairing graph: evidence columns and the adjacency index on
+dish_pairings, plus the table of suggestions still waiting for their dish.
+Links made before this migration could only be explicit pairings, so they
+count as suggested and get their missing reverse edge. Co-occurrence counts
+are seeded from the current plans.
+"""
+from sqlalchemy import text
+import models
+import pairings
+from migrate import add_column, create_index
+
+def upgrade(conn):
+    if add_column(conn, "dish_pairings", "suggested", "BOOLEAN NOT NULL DEFAULT FALSE"):
+        conn.execute(text("UPDATE dish_pairings SET suggested = TRUE"))
+        conn.execute(text(
+            "INSERT INTO dish_pairings (dish_id, paired_dish_id, suggested) "
+            "SELECT p.paired_dish_id, p.dish_id, TRUE FROM dish_pairings p WHERE NOT EXISTS ("
+            "SELECT 1 FROM dish_pairings r WHERE r.dish_id = p.paired_dish_id AND r.paired_dish_id = p.dish_id)"
+        ))
+    add_column(conn, "dish_pairings", "co_occurrences", "INTEGER NOT NULL DEFAULT 0")
+    if add_column(conn, "dish_pairings", "weight", "FLOAT NOT NULL DEFAULT 0"):
+        conn.execute(text("UPDATE dish_pairings SET weight = :weight WHERE suggested"),
+                     {"weight": pairings.PAIRING_SUGGESTION_WEIGHT})
+    create_index(conn, "ix_dish_pairings_adjacency", "dish_pairings", ["dish_id", "weight", "paired_dish_id"])
+    models.PairingSuggestion.__table__.create(conn, checkfirst=True)
+
+def finalize(db):
+    pairings.rebuild(db)
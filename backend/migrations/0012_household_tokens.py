@@ -0,0 +1,19 @@
+"""
+Secret per-household tokens replacing the guessable X-Household-Id header.
+Existing households other than the default get a token here; hand them out
+with `python tenancy.py --issue-token <id>`, which replaces it.
+"""
+from sqlalchemy import text
+import tenancy
+from migrate import add_column, create_index
+
+def upgrade(conn):
+    add_column(conn, "households", "token", "VARCHAR")
+    missing = conn.execute(
+        text("SELECT id FROM households WHERE token IS NULL AND id != :default"),
+        {"default": tenancy.DEFAULT_HOUSEHOLD_ID}
+    ).scalars().all()
+    if missing:
+        conn.execute(text("UPDATE households SET token = :token WHERE id = :id"),
+                     [{"id": household_id, "token": tenancy.new_token()} for household_id in missing])
+    create_index(conn, "ix_households_token", "households", ["token"], unique=True)
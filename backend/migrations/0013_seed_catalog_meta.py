@@ -0,0 +1,9 @@
+"""Seeds the single catalog_meta row, so reading the catalog version never has to write it."""
+from sqlalchemy import text
+import catalog
+
+def upgrade(conn):
+    conn.execute(
+        text("INSERT INTO catalog_meta (id, version) SELECT :id, 1 WHERE NOT EXISTS (SELECT 1 FROM catalog_meta WHERE id = :id)"),
+        {"id": catalog.CATALOG_ROW_ID}
+    )
@@ -1,17 +1,24 @@
-from datetime import date
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, Table, JSON, Date, Boolean
-from sqlalchemy.orm import relationship
+from datetime import date, datetime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, Table, JSON, Date, Boolean, DateTime, Index, UniqueConstraint, false
+from sqlalchemy.orm import relationship, validates
 from database import Base
 
-# Many-to-Many Link for Pairing Dishes
+# Many-to-Many Link for Pairing Dishes: a weighted graph with both directions
+# stored, so a dish's neighbours are one range scan of the adjacency index (see pairings.py)
 pairing_table = Table(
     'dish_pairings', Base.metadata,
     Column('dish_id', Integer, ForeignKey('dishes.id'), primary_key=True),
-    Column('paired_dish_id', Integer, ForeignKey('dishes.id'), primary_key=True)
+    Column('paired_dish_id', Integer, ForeignKey('dishes.id'), primary_key=True),
+    Column('suggested', Boolean, nullable=False, default=False, server_default=false()),
+    Column('co_occurrences', Integer, nullable=False, default=0, server_default="0"),
+    Column('weight', Float, nullable=False, default=0.0, server_default="0"),
+    Index('ix_dish_pairings_adjacency', 'dish_id', 'weight', 'paired_dish_id'),
 )
 
 class Dish(Base):
     __tablename__ = "dishes"
+    # Never reuse ids on SQLite either: (id, version) keys the recipe detail cache
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(Text)
@@ -20,6 +27,13 @@ class Dish(Base):
     meal_type = Column(String) 
     prep_steps = Column(JSON) 
     nutrition = Column(JSON) 
+    # Numeric copies of the nutrition JSON, kept in sync on assignment, for SQL aggregates
+    calories = Column(Float, nullable=True)
+    protein_g = Column(Float, nullable=True)
+    carbs_g = Column(Float, nullable=True)
+    fats_g = Column(Float, nullable=True)
+    # Bumped by every write that changes this dish's detail payload (cache key)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     ingredients = relationship("DishIngredient", back_populates="dish")
     paired_with = relationship(
         "Dish", 
@@ -28,6 +42,27 @@ class Dish(Base):
         secondaryjoin=id==pairing_table.c.paired_dish_id
     )
 
+    @validates("nutrition")
+    def _sync_nutrition_columns(self, key, value):
+        value = value or {}
+        self.calories = nutrient_amount(value.get("calories"))
+        self.protein_g = nutrient_amount(value.get("protein"))
+        self.carbs_g = nutrient_amount(value.get("carbs"))
+        self.fats_g = nutrient_amount(value.get("fats"))
+        return value
+
+def nutrient_amount(value):
+    """Parses nutrition values such as 450, "35g" or "12.5 g" into a float (None if absent)."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    digits = "".join(c for c in str(value) if c.isdigit() or c == ".")
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
 class Ingredient(Base):
     __tablename__ = "ingredients"
     id = Column(Integer, primary_key=True, index=True)
@@ -35,37 +70,124 @@ class Ingredient(Base):
     thumbnail_url = Column(String, nullable=True)
     category = Column(String) 
 
+class UnitConversion(Base):
+    """
+    Per-ingredient conversion factors between base units (see units.py):
+    1 from_unit = factor to_unit. ("ml", "g") is the density and ("pc", "g")
+    the piece weight; custom units such as "bunch" get their own rows.
+    """
+    __tablename__ = "unit_conversions"
+    __table_args__ = (UniqueConstraint("ingredient_id", "from_unit", "to_unit"),)
+    id = Column(Integer, primary_key=True, index=True)
+    ingredient_id = Column(Integer, ForeignKey("ingredients.id"), index=True)
+    from_unit = Column(String, nullable=False)
+    to_unit = Column(String, nullable=False)
+    factor = Column(Float, nullable=False)
+    source = Column(String, default="llm") # llm / manual
+
 class DishIngredient(Base):
     __tablename__ = "dish_ingredients"
     id = Column(Integer, primary_key=True, index=True)
-    dish_id = Column(Integer, ForeignKey("dishes.id"))
-    ingredient_id = Column(Integer, ForeignKey("ingredients.id"))
+    dish_id = Column(Integer, ForeignKey("dishes.id"), index=True)
+    ingredient_id = Column(Integer, ForeignKey("ingredients.id"), index=True)
     quantity = Column(Float)
     unit = Column(String)
     dish = relationship("Dish", back_populates="ingredients")
     ingredient = relationship("Ingredient")
 
+class CatalogMeta(Base):
+    """Single-row counter bumped on every recipe catalog write (drives ETags)."""
+    __tablename__ = "catalog_meta"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+
+class LLMCacheEntry(Base):
+    """Raw model responses keyed by the SHA-256 of the request content."""
+    __tablename__ = "llm_cache"
+    key = Column(String(64), primary_key=True)
+    model = Column(String)
+    payload = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ImageJob(Base):
+    """Durable queue entry for a pending dish/ingredient image (see image_worker.py)."""
+    __tablename__ = "image_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    target_type = Column(String, nullable=False) # dish / ingredient
+    target_id = Column(Integer, nullable=False)
+    prompt = Column(String, nullable=False)
+    status = Column(String, default="pending", index=True) # pending, running, done, failed
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class VisionCacheEntry(Base):
+    """Vision model output keyed by the perceptual hash of the scanned image."""
+    __tablename__ = "vision_cache"
+    __table_args__ = (UniqueConstraint("phash", "mode"),)
+    id = Column(Integer, primary_key=True, index=True)
+    phash = Column(String(16), nullable=False, index=True)
+    mode = Column(String, nullable=False)
+    result = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Household(Base):
+    """A kitchen: owns its meal plan, pantry, shopping list, alerts and profile (see tenancy.py)."""
+    __tablename__ = "households"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, default="My Kitchen")
+    # Secret sent as X-Household-Token; NULL only for the default household
+    token = Column(String, unique=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PairingSuggestion(Base):
+    """A model-suggested pairing whose dish is not in the catalog yet; linked once it is."""
+    __tablename__ = "pairing_suggestions"
+    __table_args__ = (UniqueConstraint("dish_id", "name_key", name="uq_pairing_suggestions_dish_name"),)
+    id = Column(Integer, primary_key=True, index=True)
+    dish_id = Column(Integer, ForeignKey("dishes.id"), nullable=False)
+    name = Column(String, nullable=False)
+    # normalize_dish_name(name), matched against new dishes
+    name_key = Column(String, nullable=False, index=True)
+
 class MealPlan(Base):
     __tablename__ = "meal_plans"
+    __table_args__ = (Index("ix_meal_plans_household_date", "household_id", "planned_date"),)
     id = Column(Integer, primary_key=True, index=True)
+    household_id = Column(Integer, ForeignKey("households.id"), nullable=False)
     dish_id = Column(Integer, ForeignKey("dishes.id"))
-    planned_date = Column(Date) 
+    planned_date = Column(Date)
     meal_slot = Column(String) 
     dish = relationship("Dish")
 
 class ShoppingListItem(Base):
+    """
+    Materialized shopping list, one row per (household, ingredient, unit),
+    kept current by deltas in shopping_list.py. planned_quantity is the gross
+    need from the meal plan; total_quantity is what still has to be bought.
+    """
     __tablename__ = "shopping_list"
+    __table_args__ = (
+        UniqueConstraint("household_id", "ingredient_id", "unit", name="uq_shopping_list_household_ingredient_unit"),
+    )
     id = Column(Integer, primary_key=True, index=True)
+    household_id = Column(Integer, ForeignKey("households.id"), nullable=False)
     ingredient_id = Column(Integer, ForeignKey("ingredients.id"))
-    total_quantity = Column(Float)
+    planned_quantity = Column(Float, default=0.0)
+    total_quantity = Column(Float, default=0.0, index=True)
     unit = Column(String)
+    reason = Column(String, nullable=True)
     is_purchased = Column(Boolean, default=False)
     ingredient = relationship("Ingredient")
 
 # --- UPDATED V6: DATA-DRIVEN USER PROFILE ---
 class UserProfile(Base):
     __tablename__ = "user_profiles"
+    __table_args__ = (Index("uq_user_profiles_household", "household_id", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
+    household_id = Column(Integer, ForeignKey("households.id"), nullable=False)
     name = Column(String, default="User")
     age = Column(Integer, default=25)
     weight_kg = Column(Float, default=70.0)
@@ -81,11 +203,35 @@ class UserProfile(Base):
 
 class PantryItem(Base):
     __tablename__ = "pantry_inventory"
+    # One row per ingredient in each household
+    __table_args__ = (Index("uq_pantry_household_ingredient", "household_id", "ingredient_id", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
+    household_id = Column(Integer, ForeignKey("households.id"), nullable=False)
     ingredient_id = Column(Integer, ForeignKey("ingredients.id"))
     current_quantity = Column(Float)
     unit = Column(String)
-    last_updated = Column(Date, default=date.today)
+    last_updated = Column(Date, default=date.today, index=True)
     min_threshold = Column(Float, default=1.0) 
+    expiry_date = Column(Date, nullable=True, index=True)
+    ingredient = relationship("Ingredient")
+
+class PantryAlert(Base):
+    """
+    Expiry / low-stock alert raised by the alert scheduler (see alerts.py).
+    open_key is "<kind>:<pantry item id>" while the condition holds and NULL
+    once resolved, so each condition has at most one open alert.
+    """
+    __tablename__ = "pantry_alerts"
+    __table_args__ = (Index("ix_pantry_alerts_household_id_id", "household_id", "id"),)
+    id = Column(Integer, primary_key=True, index=True) # doubles as the feed cursor
+    household_id = Column(Integer, ForeignKey("households.id"), nullable=False)
+    pantry_item_id = Column(Integer, ForeignKey("pantry_inventory.id"), index=True)
+    ingredient_id = Column(Integer, ForeignKey("ingredients.id"))
+    kind = Column(String, nullable=False) # expiring, expired, low_stock
+    message = Column(String)
     expiry_date = Column(Date, nullable=True)
-    ingredient = relationship("Ingredient")
\ No newline at end of file
+    open_key = Column(String, unique=True, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    acknowledged_at = Column(DateTime, nullable=True)
+    resolved_at = Column(DateTime, nullable=True)
+    ingredient = relationship("Ingredient")
@@ -0,0 +1,228 @@
+"""
+Dish pairing graph.
+
+dish_pairings holds one weighted edge per direction. Two kinds of evidence
+feed it:
+  * the model's suggested_pairings for an extracted or imported dish. A
+    suggestion that already matches a catalog dish is linked at once; any
+    other is kept in pairing_suggestions and linked when a dish with that
+    name arrives.
+  * same-day co-occurrence: the number of (household, day) meal plans that
+    contain both dishes. Plan writes pass a before-snapshot of the days
+    they touch to apply_plan_changes, which moves only the pairs that
+    appeared or disappeared. Cooking a meal keeps its pairs; removing or
+    replacing a plan takes them back.
+
+weight = co_occurrences + PAIRING_SUGGESTION_WEIGHT for a suggested edge.
+The top-k neighbours of a dish are then one range scan of the
+(dish_id, weight, paired_dish_id) adjacency index; no model call is involved.
+
+    python pairings.py   # recount co-occurrences from the current meal plans
+"""
+import os
+from collections import Counter, defaultdict
+from itertools import combinations
+from sqlalchemy import and_, bindparam, case, delete, false, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import ai_service
+import database
+import models
+import search
+
+# A model suggestion counts as this many same-day co-occurrences
+PAIRING_SUGGESTION_WEIGHT = float(os.getenv("PAIRING_SUGGESTION_WEIGHT", "3"))
+DEFAULT_PAIRINGS = 5
+MAX_PAIRINGS = 50
+
+edges = models.pairing_table
+
+def edge_weight(suggested: bool, co_occurrences: int) -> float:
+    return co_occurrences + (PAIRING_SUGGESTION_WEIGHT if suggested else 0.0)
+
+def _apply(db: Session, suggested: set = frozenset(), co_deltas: dict = None) -> None:
+    """
+    Marks unordered pairs as suggested and/or adds signed co-occurrence
+    counts, writing both directions. Each edge is changed by one atomic
+    upsert relative to its stored values, so concurrent plan writes add up
+    instead of overwriting each other. Edges left with no evidence are
+    deleted. Not committed here.
+    """
+    suggested = {pair for a, b in suggested if a != b for pair in ((a, b), (b, a))}
+    deltas = defaultdict(int)
+    for (a, b), delta in (co_deltas or {}).items():
+        if delta and a != b:
+            deltas[(a, b)] += delta
+            deltas[(b, a)] += delta
+    keys = suggested | {key for key, delta in deltas.items() if delta}
+    if not keys:
+        return
+
+    params = []
+    for a, b in keys:
+        is_suggested, delta = (a, b) in suggested, deltas.get((a, b), 0)
+        count = max(0, delta)
+        params.append({
+            "dish_id": a, "paired_dish_id": b, "suggested": is_suggested, "co_occurrences": count,
+            "weight": edge_weight(is_suggested, count), "delta": delta, "mark": is_suggested
+        })
+    summed = edges.c.co_occurrences + bindparam("delta")
+    new_count = case((summed < 0, 0), else_=summed)
+    new_suggested = or_(edges.c.suggested, bindparam("mark"))
+    changes = {
+        "suggested": new_suggested, "co_occurrences": new_count,
+        "weight": new_count + case((new_suggested, PAIRING_SUGGESTION_WEIGHT), else_=0.0)
+    }
+    match = and_(edges.c.dish_id == bindparam("from_id"), edges.c.paired_dish_id == bindparam("to_id"))
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = upsert(edges).values(
+            dish_id=bindparam("dish_id"), paired_dish_id=bindparam("paired_dish_id"), suggested=bindparam("suggested"),
+            co_occurrences=bindparam("co_occurrences"), weight=bindparam("weight")
+        ).on_conflict_do_update(index_elements=["dish_id", "paired_dish_id"], set_=changes)
+        db.execute(stmt, params)
+    else:
+        columns = ("dish_id", "paired_dish_id", "suggested", "co_occurrences", "weight")
+        for param in params:
+            keyed = {"from_id": param["dish_id"], "to_id": param["paired_dish_id"], **param}
+            if db.execute(update(edges).where(match).values(**changes), keyed).rowcount == 0:
+                db.execute(insert(edges), {key: param[key] for key in columns})
+
+    db.execute(
+        delete(edges).where(match, edges.c.suggested.is_(false()), edges.c.co_occurrences <= 0),
+        [{"from_id": a, "to_id": b} for a, b in keys]
+    )
+
+def link_suggestions(db: Session, suggestions: dict) -> None:
+    """
+    Records the model's pairing suggestions for new dishes, {dish_id: [names]}.
+    Call before bumping the catalog version, so the name search uses the
+    committed catalog. Not committed here.
+    """
+    pairs = set()
+    pending = {}
+    for dish_id, names in suggestions.items():
+        for name in names or []:
+            key = ai_service.normalize_dish_name(name)
+            if not key:
+                continue
+            found = search.search_dish_ids(db, name, limit=1, min_score=search.MATCH_THRESHOLD)
+            if found and found[0][0] != dish_id:
+                pairs.add((dish_id, found[0][0]))
+            elif not found:
+                pending.setdefault((dish_id, key), name)
+    if pending:
+        db.execute(insert(models.PairingSuggestion), [
+            {"dish_id": dish_id, "name": name, "name_key": key} for (dish_id, key), name in pending.items()
+        ])
+
+    # Earlier suggestions (including ones just stored) that name one of the new dishes
+    keys = defaultdict(list)
+    for dish_id, name in db.query(models.Dish.id, models.Dish.name).filter(models.Dish.id.in_(list(suggestions))):
+        keys[ai_service.normalize_dish_name(name)].append(dish_id)
+    resolved = db.query(models.PairingSuggestion).filter(models.PairingSuggestion.name_key.in_(list(keys))).all()
+    for suggestion in resolved:
+        pairs.update((suggestion.dish_id, dish_id) for dish_id in keys[suggestion.name_key])
+        db.delete(suggestion)
+    _apply(db, suggested=pairs)
+    db.flush()
+
+def pending_suggestions(db: Session, dish_ids: list) -> dict:
+    """{dish_id: [names]} of suggestions still waiting for their dish."""
+    names = defaultdict(list)
+    for dish_id, name in db.query(models.PairingSuggestion.dish_id, models.PairingSuggestion.name).filter(
+        models.PairingSuggestion.dish_id.in_(dish_ids)
+    ).order_by(models.PairingSuggestion.id):
+        names[dish_id].append(name)
+    return names
+
+def day_dishes(db: Session, household_id: int, days) -> dict:
+    """{planned_date: set of dish ids} for the household's given days; the snapshot apply_plan_changes diffs against."""
+    snapshot = {day: set() for day in days}
+    if snapshot:
+        for day, dish_id in db.query(models.MealPlan.planned_date, models.MealPlan.dish_id).filter(
+            models.MealPlan.household_id == household_id, models.MealPlan.planned_date.in_(list(snapshot))
+        ).distinct():
+            snapshot[day].add(dish_id)
+    return snapshot
+
+def _pairs(dish_ids: set) -> set:
+    return set(combinations(sorted(dish_ids), 2))
+
+def apply_plan_changes(db: Session, household_id: int, before: dict) -> None:
+    """
+    Moves co-occurrence counts by what changed on the snapshotted days. Call
+    after the plan writes are flushed, within the same transaction.
+    """
+    after = day_dishes(db, household_id, before)
+    deltas = Counter()
+    for day, old in before.items():
+        old_pairs, new_pairs = _pairs(old), _pairs(after[day])
+        for pair in new_pairs - old_pairs:
+            deltas[pair] += 1
+        for pair in old_pairs - new_pairs:
+            deltas[pair] -= 1
+    _apply(db, co_deltas=deltas)
+
+def forget_dish(db: Session, dish_id: int) -> None:
+    """Drops every edge and pending suggestion of a dish that is being deleted."""
+    db.execute(delete(edges).where((edges.c.dish_id == dish_id) | (edges.c.paired_dish_id == dish_id)))
+    db.query(models.PairingSuggestion).filter(models.PairingSuggestion.dish_id == dish_id).delete(synchronize_session=False)
+
+def top_pairings(db: Session, dish_id: int, limit: int = DEFAULT_PAIRINGS) -> list:
+    """The strongest neighbours of a dish, from one adjacency-index range scan."""
+    rows = db.execute(
+        select(
+            models.Dish.id, models.Dish.name, models.Dish.cuisine, models.Dish.meal_type, models.Dish.thumbnail_url,
+            edges.c.weight, edges.c.co_occurrences, edges.c.suggested
+        )
+        .join(models.Dish, models.Dish.id == edges.c.paired_dish_id)
+        .where(edges.c.dish_id == dish_id)
+        # Both descending, so the adjacency index is walked backwards with no sort
+        .order_by(edges.c.weight.desc(), edges.c.paired_dish_id.desc())
+        .limit(min(limit, MAX_PAIRINGS))
+    )
+    return [{
+        "id": paired_id, "name": name, "cuisine": cuisine, "meal_type": meal_type, "thumbnail_url": thumbnail_url,
+        "weight": weight, "co_occurrences": co_occurrences, "suggested": suggested
+    } for paired_id, name, cuisine, meal_type, thumbnail_url, weight, co_occurrences, suggested in rows]
+
+def rebuild(db: Session) -> int:
+    """
+    Recounts every co-occurrence from the current meal plans, keeping the
+    suggested flags. Counts from meals cooked since are lost. Returns the
+    number of edges changed.
+    """
+    daily = select(models.MealPlan.household_id, models.MealPlan.planned_date, models.MealPlan.dish_id).distinct().subquery()
+    other = daily.alias("other")
+    counts = {
+        (a, b): count for a, b, count in db.execute(
+            select(daily.c.dish_id, other.c.dish_id, func.count())
+            .join(other, and_(
+                other.c.household_id == daily.c.household_id,
+                other.c.planned_date == daily.c.planned_date,
+                other.c.dish_id != daily.c.dish_id
+            ))
+            .group_by(daily.c.dish_id, other.c.dish_id)
+        )
+    }
+    stored = {(row.dish_id, row.paired_dish_id): row.co_occurrences for row in db.execute(select(edges))}
+    # _apply mirrors each delta, so only one direction is passed in
+    deltas = {
+        (a, b): counts.get((a, b), 0) - stored.get((a, b), 0)
+        for a, b in set(counts) | set(stored) if a < b
+    }
+    deltas = {pair: delta for pair, delta in deltas.items() if delta}
+    _apply(db, co_deltas=deltas)
+    db.commit()
+    return len(deltas)
+
+if __name__ == "__main__":
+    db = database.SessionLocal()
+    try:
+        changed = rebuild(db)
+    finally:
+        db.close()
+    print(f"✅ Recounted meal-plan co-occurrences; {changed} dish pairs changed.")
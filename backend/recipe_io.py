@@ -0,0 +1,195 @@
+"""
+Bulk catalog transfer as NDJSON, one RecipeSchema object per line.
+
+export_ndjson streams dishes off a server-side cursor in EXPORT_CHUNK_SIZE
+partitions (yield_per), fetching each partition's ingredient links and
+suggested pairings (linked and still pending) with one IN query apiece.
+Memory stays flat however large the catalog.
+
+import_ndjson validates each line, drops names already in the catalog or
+seen earlier in the upload (compared after normalize_dish_name), and writes
+accepted recipes IMPORT_BATCH_SIZE at a time. Each batch uses a constant
+number of statements and one commit. Bad lines are reported by line number
+and never abort the import.
+"""
+import json
+from collections import defaultdict
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+import ai_service
+import catalog
+import image_worker
+import ingredients
+import models
+import pairings
+import schemas
+
+EXPORT_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+# Per-line errors echoed back; the total is always reported
+MAX_REPORTED_ERRORS = 1000
+
+EXPORT_COLUMNS = (
+    models.Dish.id, models.Dish.name, models.Dish.description, models.Dish.thumbnail_url,
+    models.Dish.cuisine, models.Dish.meal_type, models.Dish.prep_steps, models.Dish.nutrition,
+)
+
+def _export_partition(db: Session, dishes: list) -> str:
+    dish_ids = [dish.id for dish in dishes]
+    links = defaultdict(list)
+    for dish_id, name, category, quantity, unit in (
+        db.query(
+            models.DishIngredient.dish_id, models.Ingredient.name, models.Ingredient.category,
+            models.DishIngredient.quantity, models.DishIngredient.unit
+        )
+        .join(models.Ingredient, models.Ingredient.id == models.DishIngredient.ingredient_id)
+        .filter(models.DishIngredient.dish_id.in_(dish_ids))
+        .order_by(models.DishIngredient.id)
+    ):
+        links[dish_id].append({"name": name, "quantity": quantity, "unit": unit, "category": category})
+
+    # Only the model's suggestions are recipe content; co-occurrence edges are usage data
+    paired = models.Dish.__table__.alias("paired")
+    suggested = pairings.pending_suggestions(db, dish_ids)
+    for dish_id, name in db.execute(
+        select(models.pairing_table.c.dish_id, paired.c.name)
+        .join(paired, paired.c.id == models.pairing_table.c.paired_dish_id)
+        .where(models.pairing_table.c.dish_id.in_(dish_ids), models.pairing_table.c.suggested.is_(True))
+        .order_by(models.pairing_table.c.paired_dish_id)
+    ):
+        suggested[dish_id].append(name)
+
+    lines = []
+    for dish in dishes:
+        lines.append(json.dumps({
+            "name": dish.name,
+            "description": dish.description,
+            "thumbnail_url": dish.thumbnail_url,
+            "cuisine": dish.cuisine,
+            "suitable_for": [slot.strip() for slot in (dish.meal_type or "").split(",") if slot.strip()],
+            "ingredients": links[dish.id],
+            "prep_steps": dish.prep_steps or [],
+            "nutrition": dish.nutrition,
+            "suggested_pairings": suggested[dish.id],
+        }))
+    return "\n".join(lines) + "\n"
+
+def export_ndjson(session_factory):
+    """Generator of NDJSON text chunks; opens its own session so it can outlive the request scope."""
+    db = session_factory()
+    try:
+        # Plain column rows, not entities, so nothing accumulates in the identity map
+        result = db.execute(
+            select(*EXPORT_COLUMNS).order_by(models.Dish.id).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        for partition in result.partitions():
+            yield _export_partition(db, partition)
+    finally:
+        db.close()
+
+def _existing_names(db: Session, normalized: list) -> set:
+    return {
+        ai_service.normalize_dish_name(name) for (name,) in
+        db.query(models.Dish.name).filter(func.lower(models.Dish.name).in_(normalized))
+    }
+
+def _import_batch(db: Session, batch: list, generate_images: bool) -> int:
+    """Writes one batch of validated (line_no, RecipeSchema) pairs; returns how many were new."""
+    known = _existing_names(db, [ai_service.normalize_dish_name(recipe.name) for _, recipe in batch])
+    fresh = [recipe for _, recipe in batch if ai_service.normalize_dish_name(recipe.name) not in known]
+    if not fresh:
+        return 0
+
+    ingredient_ids = ingredients.resolve_ingredients(
+        db, [(ing.name, ing.category) for recipe in fresh for ing in recipe.ingredients],
+        enqueue_images=generate_images
+    )
+    dishes = [
+        models.Dish(
+            name=recipe.name,
+            description=recipe.description,
+            thumbnail_url=recipe.thumbnail_url,
+            cuisine=recipe.cuisine,
+            meal_type=", ".join(recipe.suitable_for) if recipe.suitable_for else "Meal",
+            prep_steps=recipe.prep_steps,
+            nutrition=recipe.nutrition.dict()
+        ) for recipe in fresh
+    ]
+    db.add_all(dishes)
+    db.flush()
+
+    links = [
+        {"dish_id": dish.id, "ingredient_id": ingredient_ids[ing.name], "quantity": ing.quantity, "unit": ing.unit}
+        for dish, recipe in zip(dishes, fresh) for ing in recipe.ingredients
+    ]
+    if links:
+        db.execute(insert(models.DishIngredient), links)
+    if generate_images:
+        for dish in dishes:
+            if not dish.thumbnail_url:
+                image_worker.enqueue_image(db, "dish", dish.id, f"{dish.cuisine} {dish.name}")
+    pairings.link_suggestions(db, {dish.id: recipe.suggested_pairings for dish, recipe in zip(dishes, fresh)})
+
+    catalog.bump_catalog_version(db)
+    db.commit()
+    return len(dishes)
+
+def import_ndjson(db: Session, lines, generate_images: bool = False) -> dict:
+    """
+    lines: iterable of bytes/str NDJSON lines. suggested_pairings feed the
+    pairing graph, as for /extract-recipe.
+    """
+    imported = duplicates = error_count = 0
+    errors = []
+    seen = set()
+    batch = []
+
+    def fail(line_no: int, message: str):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_no, "error": message})
+
+    def flush(batch: list):
+        nonlocal imported, duplicates
+        try:
+            added = _import_batch(db, batch, generate_images)
+        except SQLAlchemyError as e:
+            db.rollback()
+            for line_no, _ in batch:
+                fail(line_no, f"batch rejected by database: {e.__class__.__name__}")
+            return
+        imported += added
+        duplicates += len(batch) - added
+
+    for line_no, raw in enumerate(lines, start=1):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="replace")
+        if not raw.strip():
+            continue
+        try:
+            recipe = schemas.RecipeSchema(**json.loads(raw))
+        except json.JSONDecodeError as e:
+            fail(line_no, f"invalid JSON: {e.msg}")
+            continue
+        except (ValidationError, TypeError) as e:
+            fail(line_no, str(e))
+            continue
+
+        key = ai_service.normalize_dish_name(recipe.name)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        batch.append((line_no, recipe))
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+
+    return {"imported": imported, "skipped_duplicates": duplicates, "error_count": error_count, "errors": errors}
@@ -0,0 +1,176 @@
+"""
+Smart meal recommendations, ranked locally first.
+
+Candidate dishes for the slot are scored in SQL + Python on numeric
+nutrition (fit to the remaining calorie budget, protein) and on how many of
+their ingredients are already in the pantry or on the shopping list. The
+model is only asked to pick and explain one of the top RECOMMEND_TOP_K, or to
+free-style a dish when the catalog has nothing for the slot.
+
+Answers are cached for RECOMMEND_CACHE_TTL seconds by (household, calorie
+bucket, slot, available-ingredient set, catalog version, day), and concurrent
+misses for one key share a single computation, so repeat visits make no
+network call.
+RECOMMEND_AI=false skips the model entirely and explains the top pick locally.
+"""
+import hashlib
+import os
+from datetime import date
+from typing import Optional
+from sqlalchemy import case, false, func
+from sqlalchemy.orm import Session
+import ai_service
+from ai_governor import AIUnavailable
+import catalog
+from caching import TTLCache
+import ingredients
+import models
+import singleflight
+
+RECOMMEND_TOP_K = int(os.getenv("RECOMMEND_TOP_K", "5"))
+RECOMMEND_CACHE_TTL = float(os.getenv("RECOMMEND_CACHE_TTL", "900"))
+RECOMMEND_AI = os.getenv("RECOMMEND_AI", "true").lower() == "true"
+# Remaining calories are bucketed so nearby budgets share a cache entry
+CALORIE_BUCKET = 100
+# A single meal is aimed at the remaining budget, clamped to a sane portion
+MIN_MEAL_CALORIES = 250
+MAX_MEAL_CALORIES = 900
+# Dishes closest to the calorie target that are scored in detail
+CANDIDATE_POOL = 200
+
+cache = TTLCache(RECOMMEND_CACHE_TTL, name="recommendations")
+_flight = singleflight.SingleFlight()
+
+def available_ingredient_ids(db: Session, household_id: int) -> list:
+    """Ingredients in the household's stock or already needed by its meal plan."""
+    in_pantry = db.query(models.PantryItem.ingredient_id).filter(
+        models.PantryItem.household_id == household_id, models.PantryItem.current_quantity > 0
+    )
+    planned = db.query(models.ShoppingListItem.ingredient_id).filter(
+        models.ShoppingListItem.household_id == household_id, models.ShoppingListItem.planned_quantity > 0
+    )
+    return sorted({ingredient_id for (ingredient_id,) in in_pantry.union(planned)})
+
+def rank_candidates(db: Session, household_id: int, remaining: int, slot: str, ingredient_ids: list,
+                    k: int = RECOMMEND_TOP_K) -> list:
+    target = min(max(remaining, MIN_MEAL_CALORIES), MAX_MEAL_CALORIES)
+    planned_today = db.query(models.MealPlan.dish_id).filter(
+        models.MealPlan.household_id == household_id, models.MealPlan.planned_date == date.today()
+    )
+    pool = (
+        db.query(models.Dish.id, models.Dish.name, models.Dish.calories, models.Dish.protein_g)
+        .filter(
+            models.Dish.calories.isnot(None),
+            models.Dish.meal_type.ilike(f"%{slot}%"),
+            models.Dish.id.notin_(planned_today)
+        )
+        .order_by(func.abs(models.Dish.calories - target))
+        .limit(CANDIDATE_POOL)
+        .all()
+    )
+    if not pool:
+        return []
+
+    matching = models.DishIngredient.ingredient_id.in_(ingredient_ids) if ingredient_ids else false()
+    overlap = {
+        dish_id: (int(matches or 0), total)
+        for dish_id, matches, total in db.query(
+            models.DishIngredient.dish_id,
+            func.sum(case((matching, 1), else_=0)),
+            func.count(models.DishIngredient.id)
+        )
+        .filter(models.DishIngredient.dish_id.in_([row.id for row in pool]))
+        .group_by(models.DishIngredient.dish_id)
+    }
+
+    scored = []
+    for row in pool:
+        matches, total = overlap.get(row.id, (0, 0))
+        calorie_fit = max(0.0, 1 - abs(row.calories - target) / target)
+        over_budget = 0.25 if remaining > 0 and row.calories > remaining else 0.0
+        score = (
+            0.5 * calorie_fit
+            + 0.35 * (matches / total if total else 0.0)
+            + 0.15 * min((row.protein_g or 0) / 40, 1.0)
+            - over_budget
+        )
+        scored.append({
+            "id": row.id,
+            "name": row.name,
+            "calories": row.calories,
+            "protein_g": row.protein_g,
+            "matching_ingredients": matches,
+            "score": round(score, 4),
+        })
+    scored.sort(key=lambda c: (-c["score"], c["id"]))
+    return scored[:k]
+
+def _local_explanation(candidate: dict, slot: str) -> str:
+    reason = f"{candidate['calories']:.0f} kcal fits your {slot.lower()} budget"
+    if candidate["matching_ingredients"]:
+        reason += f" and uses {candidate['matching_ingredients']} ingredients you already have or plan to buy"
+    return f"{candidate['name']}: {reason.capitalize()}."
+
+def _pick(text: str, candidates: list) -> Optional[dict]:
+    """The candidate the model named, or None when it named none of them."""
+    head = text.split(":", 1)[0].strip().strip("*\"' ").lower()
+    for candidate in candidates:
+        if candidate["name"].lower() == head:
+            return candidate
+    return None
+
+def _compute(db: Session, household_id: int, remaining: int, slot: str, ingredient_ids: list) -> tuple:
+    """(response, degraded); degraded means the model was wanted but could not answer, so it must not be cached."""
+    candidates = rank_candidates(db, household_id, remaining, slot, ingredient_ids)
+    if not candidates:
+        # Nothing in the catalog for this slot: let the model suggest a new dish
+        text, degraded = None, False
+        if RECOMMEND_AI:
+            names = list(ingredients.ingredient_names(db, ingredient_ids).values())
+            try:
+                text = ai_service.get_smart_recommendation(remaining, names, slot)
+            except AIUnavailable as e:
+                print(f"AI Recommendation Error: {e}")
+                degraded = True
+        if not text:
+            text = f"Light {slot} Salad: To keep you refreshed and within your calorie goals."
+        return {"recommendation": text, "dish_id": None, "candidates": []}, degraded
+
+    choice, text, degraded = candidates[0], None, False
+    if RECOMMEND_AI:
+        try:
+            text = ai_service.choose_recommendation(remaining, slot, candidates)
+            picked = _pick(text, candidates)
+            if picked is None:
+                # The text must name the dish the response links to
+                text = None
+            else:
+                choice = picked
+        except Exception as e:
+            print(f"AI Recommendation Error: {e}")
+            degraded = True
+    if not text:
+        text = _local_explanation(choice, slot)
+    return {"recommendation": text, "dish_id": choice["id"], "candidates": candidates}, degraded
+
+def recommend(db: Session, household_id: int, remaining: int, slot: str) -> dict:
+    remaining = max(0, int(remaining))
+    ingredient_ids = available_ingredient_ids(db, household_id)
+    key = "|".join([
+        str(household_id),
+        str(remaining // CALORIE_BUCKET),
+        slot.lower(),
+        hashlib.sha1(",".join(map(str, ingredient_ids)).encode()).hexdigest(),
+        str(catalog.get_catalog_version(db)),
+        date.today().isoformat(),
+    ])
+    cached = cache.get(key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    def compute():
+        result, degraded = _compute(db, household_id, remaining, slot, ingredient_ids)
+        if not degraded:
+            cache.set(key, result)
+        return result
+    return dict(_flight.do(key, compute), cached=False)
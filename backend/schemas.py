@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import date
 
@@ -40,6 +40,24 @@ class RecipeResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class RecipeUpdate(BaseModel):
+    # Partial CMS edit: only the fields that are sent are applied
+    name: Optional[str] = None
+    description: Optional[str] = None
+    cuisine: Optional[str] = None
+    meal_type: Optional[str] = None
+    prep_steps: Optional[List[str]] = None
+    nutrition: Optional[dict] = None
+    ingredients: Optional[List[IngredientSchema]] = None
+
+class RecipeUpdateResponse(RecipeResponse):
+    # What the edit touched and which derived data it affected
+    changes: dict = {}
+
+class IngredientUnitsUpdate(BaseModel):
+    density_g_per_ml: Optional[float] = Field(default=None, gt=0)
+    piece_weight_g: Optional[float] = Field(default=None, gt=0)
+
 class VisionIngredient(BaseModel):
     name: str
     quantity: float
@@ -56,6 +74,20 @@ class MealPlanCreate(BaseModel):
     planned_date: date
     meal_slot: str
 
+class MealCompletionRequest(BaseModel):
+    """Plans to mark as cooked: explicit ids and/or every plan in a date range."""
+    plan_ids: List[int] = []
+    planned_from: Optional[date] = None
+    planned_to: Optional[date] = None
+
+class MealPlanGenerateRequest(BaseModel):
+    start_date: date
+    end_date: date
+    slots: List[str] = ["Breakfast", "Lunch", "Dinner"]
+    # False keeps meals that are already planned and only fills empty slots
+    replace_existing: bool = False
+    seed: Optional[int] = None
+
 class MealPlanResponse(BaseModel):
     id: int
     dish: RecipeResponse
@@ -63,4 +95,27 @@ class MealPlanResponse(BaseModel):
     meal_slot: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PairingResponse(BaseModel):
+    id: int
+    name: str
+    cuisine: Optional[str] = None
+    meal_type: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    weight: float
+    # Same-day plans containing both dishes; suggested = the model proposed the pairing
+    co_occurrences: int
+    suggested: bool
+
+class HouseholdCreate(BaseModel):
+    name: Optional[str] = None
+
+class HouseholdResponse(BaseModel):
+    id: int
+    name: str
+    # Only returned here; send it as X-Household-Token
+    token: str
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,122 @@
+"""
+Ranked, typo-tolerant dish name search.
+
+On PostgreSQL this uses pg_trgm similarity backed by a GIN trigram index
+(created by migration 0006). Elsewhere (SQLite test runs, or Postgres without
+the extension) an in-process trigram index with the same scoring is built
+from the dishes table and rebuilt whenever the catalog version changes.
+"""
+import os
+import re
+import threading
+from collections import defaultdict
+from sqlalchemy import func, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+import catalog
+import models
+
+# auto: pg_trgm on PostgreSQL, Python index otherwise; python: always in-process
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+# Minimum score for a result to be listed by /recipes/search
+MIN_SEARCH_SCORE = 0.2
+# Minimum score for an existing dish to count as the same dish (extract-recipe cache hit)
+MATCH_THRESHOLD = 0.5
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def trigrams(value: str) -> set:
+    """pg_trgm-compatible trigrams: each word is padded with two leading and one trailing space."""
+    grams = set()
+    for word in _WORD.findall((value or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+class TrigramIndex:
+    """Inverted trigram -> dish id index over dish names."""
+
+    def __init__(self, rows=()):
+        self.version = None
+        self._grams = {}
+        self._postings = defaultdict(set)
+        for dish_id, name in rows:
+            grams = trigrams(name)
+            self._grams[dish_id] = grams
+            for gram in grams:
+                self._postings[gram].add(dish_id)
+
+    def search(self, query: str, limit: int, min_score: float) -> list:
+        query_grams = trigrams(query)
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self._postings.get(gram, set())
+        scored = [(similarity(query_grams, self._grams[dish_id]), dish_id) for dish_id in candidates]
+        scored = [(score, dish_id) for score, dish_id in scored if score >= min_score]
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [(dish_id, score) for score, dish_id in scored[:limit]]
+
+_index = TrigramIndex()
+_index_lock = threading.Lock()
+_pg_trgm_available = True
+
+def _python_index(db: Session) -> TrigramIndex:
+    global _index
+    version = catalog.get_catalog_version(db)
+    if _index.version != version:
+        with _index_lock:
+            if _index.version != version:
+                index = TrigramIndex(db.query(models.Dish.id, models.Dish.name).all())
+                index.version = version
+                _index = index
+    return _index
+
+def _pg_search(db: Session, query: str, limit: int, min_score: float) -> list:
+    lowered = query.lower()
+    score = func.similarity(func.lower(models.Dish.name), lowered)
+    # Lets the % operator (and therefore the GIN index) apply our cut-off
+    db.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :limit, true)"), {"limit": str(min_score)})
+    rows = (
+        db.query(models.Dish.id, score.label("score"))
+        .filter(func.lower(models.Dish.name).op("%")(lowered))
+        .order_by(score.desc(), models.Dish.id)
+        .limit(limit)
+        .all()
+    )
+    return [(dish_id, float(s)) for dish_id, s in rows]
+
+def search_dish_ids(db: Session, query: str, limit: int = 10, min_score: float = MIN_SEARCH_SCORE) -> list:
+    """Returns [(dish_id, score)] best first."""
+    global _pg_trgm_available
+    if not query or not query.strip():
+        return []
+    use_pg = SEARCH_BACKEND == "auto" and _pg_trgm_available and db.bind.dialect.name == "postgresql"
+    if use_pg:
+        try:
+            # A savepoint, so a failure never rolls back the caller's pending writes
+            with db.begin_nested():
+                return _pg_search(db, query, limit, min_score)
+        except DBAPIError as e:
+            # pg_trgm not installed (migration 0006 not applied): degrade to the in-process index
+            print(f"pg_trgm search unavailable, using in-process index: {e}")
+            _pg_trgm_available = False
+    return _python_index(db).search(query, limit, min_score)
+
+def search_dishes(db: Session, query: str, limit: int = 10, min_score: float = MIN_SEARCH_SCORE) -> list:
+    """Returns [(Dish, score)] best first."""
+    ranked = search_dish_ids(db, query, limit, min_score)
+    if not ranked:
+        return []
+    dishes = {d.id: d for d in db.query(models.Dish).filter(models.Dish.id.in_([i for i, _ in ranked]))}
+    return [(dishes[dish_id], score) for dish_id, score in ranked if dish_id in dishes]
+
+def best_match(db: Session, query: str, threshold: float = MATCH_THRESHOLD):
+    """The closest existing dish if it is similar enough to be the same dish, else None."""
+    results = search_dishes(db, query, limit=1, min_score=threshold)
+    return results[0][0] if results else None
@@ -0,0 +1,96 @@
+"""
+Shared recipe serialization.
+
+Recipe payloads are built from plain column tuples: one SELECT for the
+dishes and one IN query for their ingredient links. No ORM entities are
+involved, so there are no identity-map or lazy-load costs. The dicts have
+exactly the shape RecipeResponse emits. Endpoints send them as orjson bytes
+through FastJSONResponse, skipping FastAPI's second validation and encoding
+pass.
+
+Full recipe details are cached as encoded bytes keyed by
+(dish id, Dish.version). Every write that changes a detail payload bumps the
+dish version (catalog.bump_dish_versions), so a stale entry is never served;
+it just ages out of the LRU.
+"""
+import os
+from collections import defaultdict
+from typing import Optional
+import orjson
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models
+from caching import TTLCache
+
+RECIPE_DETAIL_CACHE_SIZE = int(os.getenv("RECIPE_DETAIL_CACHE_SIZE", "2048"))
+# Entries are keyed by version and never stale; the TTL only bounds idle memory
+RECIPE_DETAIL_CACHE_TTL = float(os.getenv("RECIPE_DETAIL_CACHE_TTL", "3600"))
+
+# RecipeResponse field order, so the fast path emits the same bytes layout
+DISH_COLUMNS = (
+    models.Dish.id, models.Dish.name, models.Dish.description, models.Dish.cuisine,
+    models.Dish.meal_type, models.Dish.nutrition, models.Dish.thumbnail_url, models.Dish.prep_steps,
+)
+
+detail_cache = TTLCache(RECIPE_DETAIL_CACHE_TTL, maxsize=RECIPE_DETAIL_CACHE_SIZE, name="recipe_detail")
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson; already-encoded bytes pass straight through."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
+
+def ingredients_by_dish(db: Session, dish_ids: list) -> dict:
+    """{dish_id: [IngredientSchema-shaped dicts]} in link order, as one joined IN query."""
+    links = defaultdict(list)
+    if not dish_ids:
+        return links
+    for dish_id, name, quantity, unit, category, thumbnail_url in db.execute(
+        select(
+            models.DishIngredient.dish_id, models.Ingredient.name, models.DishIngredient.quantity,
+            models.DishIngredient.unit, models.Ingredient.category, models.Ingredient.thumbnail_url
+        )
+        .join(models.Ingredient, models.Ingredient.id == models.DishIngredient.ingredient_id)
+        .where(models.DishIngredient.dish_id.in_(dish_ids))
+        .order_by(models.DishIngredient.id)
+    ):
+        links[dish_id].append({
+            "name": name, "quantity": quantity, "unit": unit,
+            "category": category, "thumbnail_url": thumbnail_url
+        })
+    return links
+
+def serialize_dishes(db: Session, rows: list) -> list:
+    """RecipeResponse-shaped dicts for DISH_COLUMNS rows, with their ingredients."""
+    links = ingredients_by_dish(db, [row[0] for row in rows])
+    return [{
+        "id": dish_id, "name": name, "description": description, "cuisine": cuisine,
+        "meal_type": meal_type, "nutrition": nutrition, "thumbnail_url": thumbnail_url,
+        "prep_steps": prep_steps or [], "ingredients": links.get(dish_id, [])
+    } for dish_id, name, description, cuisine, meal_type, nutrition, thumbnail_url, prep_steps in rows]
+
+def recipe_detail(db: Session, dish_id: int) -> Optional[dict]:
+    """The flattened recipe as a dict, or None when the dish does not exist."""
+    row = db.execute(select(*DISH_COLUMNS).where(models.Dish.id == dish_id)).first()
+    if row is None:
+        return None
+    return serialize_dishes(db, [row])[0]
+
+def recipe_detail_json(db: Session, dish_id: int) -> Optional[bytes]:
+    """The encoded recipe detail, served from cache while the dish version is unchanged."""
+    version = db.execute(select(models.Dish.version).where(models.Dish.id == dish_id)).scalar()
+    if version is None:
+        return None
+    key = (dish_id, version)
+    body = detail_cache.get(key)
+    if body is None:
+        recipe = recipe_detail(db, dish_id)
+        if recipe is None:
+            return None
+        body = orjson.dumps(recipe)
+        detail_cache.set(key, body)
+    return body
@@ -0,0 +1,265 @@
+"""
+Incrementally maintained shopping list.
+
+Meal-plan changes apply signed deltas to planned_quantity; pantry changes
+only re-derive the affected ingredients. GET /shopping-list is then a single
+read of the household's shopping_list rows. Every function is scoped to one
+household except rebuild. Run `python shopping_list.py` to compare every
+stored list with a from-scratch computation, and `--fix` to repair drift.
+"""
+import sys
+from collections import defaultdict
+from sqlalchemy import and_, bindparam, case, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import database
+import ingredients
+import models
+import units
+
+# Differences below this are float noise from accumulated deltas
+DRIFT_TOLERANCE = 1e-6
+
+def apply_plan_delta(db: Session, household_id: int, dish_id: int, multiplier: int) -> None:
+    """
+    Adds (multiplier > 0) or removes (multiplier < 0) a dish's ingredient needs,
+    e.g. +1 when a meal is planned and -1 when it is removed or cooked.
+    Not committed here: runs inside the caller's transaction.
+    """
+    apply_plan_deltas(db, household_id, {dish_id: multiplier})
+
+def apply_plan_deltas(db: Session, household_id: int, multipliers: dict) -> None:
+    """Set-based apply_plan_delta for many dishes: {dish_id: multiplier}."""
+    multipliers = {dish_id: m for dish_id, m in multipliers.items() if m}
+    if not multipliers:
+        return
+    links = db.query(
+        models.DishIngredient.dish_id, models.DishIngredient.ingredient_id,
+        models.DishIngredient.unit, models.DishIngredient.quantity
+    ).filter(models.DishIngredient.dish_id.in_(multipliers)).all()
+    if not links:
+        return
+
+    deltas = defaultdict(float)
+    for dish_id, ingredient_id, unit, quantity in links:
+        deltas[(ingredient_id, unit)] += (quantity or 0) * multipliers[dish_id]
+    apply_need_deltas(db, household_id, deltas)
+
+def apply_need_deltas(db: Session, household_id: int, deltas: dict) -> None:
+    """
+    Adds signed planned quantities per (ingredient_id, unit), e.g. when a
+    planned dish's recipe is edited in place. Not committed here.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ingredient_ids = {ingredient_id for ingredient_id, _ in deltas}
+    db.flush()
+    _add_planned(db, household_id, deltas)
+    # The statement above bypassed the ORM; reload the rows it changed
+    rows = _rows_by_key(db, household_id, ingredient_ids, reload=True)
+    refresh_ingredients(db, household_id, ingredient_ids, rows)
+
+def _add_planned(db: Session, household_id: int, deltas: dict) -> None:
+    """
+    planned_quantity += delta (floored at 0) per key as one atomic statement,
+    so concurrent plan writes add up instead of overwriting each other. A
+    missing row is inserted, with ON CONFLICT covering a concurrent insert.
+    """
+    table = models.ShoppingListItem.__table__
+    added = table.c.planned_quantity + bindparam("delta")
+    floored = case((added < 0, 0.0), else_=added)
+    params = [{
+        "household_id": household_id, "ingredient_id": ingredient_id, "unit": unit,
+        "planned_quantity": max(0.0, delta), "total_quantity": 0.0, "delta": delta
+    } for (ingredient_id, unit), delta in deltas.items()]
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = upsert(table).values(
+            household_id=bindparam("household_id"), ingredient_id=bindparam("ingredient_id"), unit=bindparam("unit"),
+            planned_quantity=bindparam("planned_quantity"), total_quantity=bindparam("total_quantity")
+        ).on_conflict_do_update(
+            index_elements=["household_id", "ingredient_id", "unit"], set_={"planned_quantity": floored}
+        )
+        db.execute(stmt, params)
+        return
+
+    match = and_(
+        table.c.household_id == bindparam("household_id"), table.c.ingredient_id == bindparam("ingredient_id"),
+        table.c.unit == bindparam("unit")
+    )
+    for param in params:
+        if db.execute(update(table).where(match).values(planned_quantity=floored), param).rowcount == 0:
+            db.execute(insert(table), {key: value for key, value in param.items() if key != "delta"})
+
+def refresh_ingredients(db: Session, household_id: int, ingredient_ids, rows: dict = None) -> None:
+    """
+    Re-derives total_quantity and reason for the given ingredients from their
+    planned needs and current pantry stock. Call after any pantry quantity change.
+    """
+    ingredient_ids = set(ingredient_ids)
+    if not ingredient_ids:
+        return
+    if rows is None:
+        rows = _rows_by_key(db, household_id, ingredient_ids)
+
+    pantry = {}
+    for item in db.query(models.PantryItem).filter(
+        models.PantryItem.household_id == household_id,
+        models.PantryItem.ingredient_id.in_(ingredient_ids)
+    ).order_by(models.PantryItem.id):
+        pantry.setdefault(item.ingredient_id, item)
+    names = ingredients.ingredient_names(db, ingredient_ids)
+
+    by_ingredient = defaultdict(list)
+    for (ingredient_id, _), row in rows.items():
+        by_ingredient[ingredient_id].append(row)
+
+    for ingredient_id in ingredient_ids:
+        item = pantry.get(ingredient_id)
+        ing_rows = by_ingredient.get(ingredient_id, [])
+
+        shortfall = 0.0
+        if item and item.current_quantity < item.min_threshold:
+            shortfall = item.min_threshold - item.current_quantity
+            # The safety buffer is expressed in the pantry's own unit
+            if not any(row.unit == item.unit for row in ing_rows):
+                buffer_row = models.ShoppingListItem(
+                    household_id=household_id, ingredient_id=ingredient_id, unit=item.unit,
+                    planned_quantity=0.0, total_quantity=0.0
+                )
+                db.add(buffer_row)
+                rows[(ingredient_id, item.unit)] = buffer_row
+                ing_rows.append(buffer_row)
+
+        for row in ing_rows:
+            on_hand = 0.0
+            if item:
+                on_hand = item.current_quantity
+                if item.unit.lower() != row.unit.lower():
+                    on_hand = units.convert_quantity(
+                        db, ingredient_id, names.get(ingredient_id, ""), on_hand, item.unit, row.unit
+                    )
+            gap = max(0.0, (row.planned_quantity or 0) - on_hand)
+            buffer = shortfall if item and row.unit == item.unit else 0.0
+
+            row.total_quantity = round(gap + buffer, 2)
+            if gap > 0 and buffer > 0:
+                row.reason = "Planned Meals + Safety Buffer"
+            elif gap > 0:
+                row.reason = "Planned Meals"
+            elif buffer > 0:
+                row.reason = "Low Stock"
+            else:
+                row.reason = None
+
+            if (row.planned_quantity or 0) <= DRIFT_TOLERANCE and buffer == 0:
+                if row.id is not None:
+                    db.delete(row)
+                else:
+                    db.expunge(row)
+                rows.pop((ingredient_id, row.unit), None)
+
+    # Sessions don't autoflush: make new and deleted rows visible to any
+    # further delta applied in this transaction
+    db.flush()
+
+def read_shopping_list(db: Session, household_id: int) -> list:
+    """The household's whole list in one indexed read."""
+    rows = (
+        db.query(
+            models.Ingredient.name, models.Ingredient.category,
+            models.ShoppingListItem.total_quantity, models.ShoppingListItem.unit,
+            models.ShoppingListItem.reason, models.ShoppingListItem.is_purchased
+        )
+        .join(models.Ingredient, models.Ingredient.id == models.ShoppingListItem.ingredient_id)
+        .filter(models.ShoppingListItem.household_id == household_id, models.ShoppingListItem.total_quantity > 0)
+        .order_by(models.Ingredient.name)
+        .all()
+    )
+    return [{
+        "name": name, "category": category, "quantity": quantity,
+        "unit": unit, "reason": reason, "is_purchased": is_purchased
+    } for name, category, quantity, unit, reason, is_purchased in rows]
+
+def rebuild(db: Session, fix: bool = False) -> list:
+    """
+    Recomputes every household's planned needs from meal_plans and compares
+    them with the stored rows. Returns the drifted (household_id, ingredient_id,
+    unit, stored, expected) entries; with fix=True the stored lists are
+    corrected and fully re-derived.
+    """
+    expected = {
+        (household_id, ingredient_id, unit): qty or 0.0
+        for household_id, ingredient_id, unit, qty in db.query(
+            models.MealPlan.household_id, models.DishIngredient.ingredient_id, models.DishIngredient.unit,
+            func.sum(models.DishIngredient.quantity)
+        )
+        .join(models.MealPlan, models.DishIngredient.dish_id == models.MealPlan.dish_id)
+        .group_by(models.MealPlan.household_id, models.DishIngredient.ingredient_id, models.DishIngredient.unit)
+        .all()
+    }
+    stored = {
+        (row.household_id, row.ingredient_id, row.unit): row
+        for row in db.query(models.ShoppingListItem).all()
+    }
+
+    drift = []
+    for key in set(expected) | set(stored):
+        have = stored[key].planned_quantity if key in stored else 0.0
+        want = expected.get(key, 0.0)
+        if abs((have or 0.0) - want) > DRIFT_TOLERANCE:
+            drift.append((*key, have, want))
+
+    if fix:
+        for key, want in expected.items():
+            row = stored.get(key)
+            if row is None:
+                row = models.ShoppingListItem(household_id=key[0], ingredient_id=key[1], unit=key[2], total_quantity=0.0)
+                db.add(row)
+                stored[key] = row
+            row.planned_quantity = want
+        for key, row in stored.items():
+            if key not in expected:
+                row.planned_quantity = 0.0
+
+        by_household = defaultdict(dict)
+        for (household_id, ingredient_id, unit), row in stored.items():
+            by_household[household_id][(ingredient_id, unit)] = row
+        low_stock = defaultdict(set)
+        for household_id, ingredient_id in db.query(models.PantryItem.household_id, models.PantryItem.ingredient_id).filter(
+            models.PantryItem.current_quantity < models.PantryItem.min_threshold
+        ):
+            low_stock[household_id].add(ingredient_id)
+        for household_id in set(by_household) | set(low_stock):
+            rows = by_household[household_id]
+            refresh_ingredients(db, household_id, {key[0] for key in rows} | low_stock[household_id], rows)
+        db.commit()
+    return drift
+
+def _rows_by_key(db: Session, household_id: int, ingredient_ids, reload: bool = False) -> dict:
+    query = db.query(models.ShoppingListItem).filter(
+        models.ShoppingListItem.household_id == household_id,
+        models.ShoppingListItem.ingredient_id.in_(ingredient_ids)
+    )
+    if reload:
+        query = query.populate_existing()
+    return {(row.ingredient_id, row.unit): row for row in query}
+
+if __name__ == "__main__":
+    fix = "--fix" in sys.argv
+    db = database.SessionLocal()
+    try:
+        drift = rebuild(db, fix=fix)
+        for household_id, ingredient_id, unit, have, want in drift:
+            print(f"household {household_id} ingredient {ingredient_id} [{unit}]: stored {have} expected {want}")
+        if not drift:
+            print("✅ Shopping list is in sync with the meal plan.")
+        elif fix:
+            print(f"✅ Repaired {len(drift)} drifted rows.")
+        else:
+            print(f"❌ {len(drift)} rows drifted. Re-run with --fix to repair.")
+    finally:
+        db.close()
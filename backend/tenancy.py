@@ -0,0 +1,124 @@
+"""
+Household (tenant) scoping.
+
+Recipes and ingredients are one shared catalog. Meal plans, pantry rows, the
+shopping list, alerts and the profile belong to a household. Each request
+acts for a single household, chosen by the X-Household-Token header. The
+token is a random secret issued once by POST /households, so one kitchen
+cannot reach another by counting ids. Without the header it is
+DEFAULT_HOUSEHOLD_ID, which pre-tenancy data was migrated into, so
+single-kitchen clients keep working unchanged. The default household has no
+token: anyone who can reach the API acts for it.
+
+    python tenancy.py --issue-token 42   # replace household 42's token and print it
+
+Endpoints receive the id through the current_household dependency and pass
+it to every query on a tenant table. Those tables lead their composite
+indexes with household_id, so a household's queries stay index range scans
+however many households share the database.
+"""
+import argparse
+import secrets
+import sys
+import threading
+from typing import Optional
+from fastapi import Header, HTTPException
+from starlette.concurrency import run_in_threadpool
+import database
+import models
+
+DEFAULT_HOUSEHOLD_ID = 1
+
+# Households are never deleted, so an id seen once stays valid
+_known = set()
+# token -> household id; dropped by issue_token when a token is replaced
+_tokens = {}
+_lock = threading.Lock()
+
+def ensure_household(household_id: int) -> bool:
+    """True when the household exists. The default household is created on first use."""
+    if household_id in _known:
+        return True
+    db = database.SessionLocal()
+    try:
+        exists = db.get(models.Household, household_id) is not None
+        if not exists and household_id == DEFAULT_HOUSEHOLD_ID:
+            with _lock:
+                if db.get(models.Household, household_id) is None:
+                    db.add(models.Household(id=household_id))
+                    db.commit()
+            exists = True
+    finally:
+        db.close()
+    if exists:
+        _known.add(household_id)
+    return exists
+
+def new_token() -> str:
+    return secrets.token_urlsafe(32)
+
+def resolve_token(token: str) -> Optional[int]:
+    """The id of the household holding token, or None."""
+    if token in _tokens:
+        return _tokens[token]
+    db = database.SessionLocal()
+    try:
+        household_id = db.query(models.Household.id).filter(models.Household.token == token).scalar()
+    finally:
+        db.close()
+    if household_id is not None:
+        _tokens[token] = household_id
+    return household_id
+
+async def current_household(x_household_token: Optional[str] = Header(None)) -> int:
+    """FastAPI dependency: the household this request acts for. Only an unseen token costs a query."""
+    if not x_household_token:
+        if DEFAULT_HOUSEHOLD_ID not in _known:
+            await run_in_threadpool(ensure_household, DEFAULT_HOUSEHOLD_ID)
+        return DEFAULT_HOUSEHOLD_ID
+    household_id = _tokens.get(x_household_token)
+    if household_id is None:
+        household_id = await run_in_threadpool(resolve_token, x_household_token)
+    if household_id is None:
+        raise HTTPException(status_code=404, detail="Household not found")
+    return household_id
+
+def create_household(db, name: Optional[str] = None) -> models.Household:
+    # The default id must not be handed to a new household
+    ensure_household(DEFAULT_HOUSEHOLD_ID)
+    household = models.Household(name=name or "My Kitchen", token=new_token())
+    db.add(household)
+    db.commit()
+    _known.add(household.id)
+    _tokens[household.token] = household.id
+    return household
+
+def issue_token(db, household_id: int) -> str:
+    """Gives a household a fresh token; the old one stops working (in other workers once they restart)."""
+    household = db.get(models.Household, household_id)
+    if household is None:
+        raise ValueError(f"household {household_id} does not exist")
+    if household_id == DEFAULT_HOUSEHOLD_ID:
+        raise ValueError("the default household is used without a token")
+    _tokens.pop(household.token, None)
+    household.token = new_token()
+    db.commit()
+    return household.token
+
+def main():
+    parser = argparse.ArgumentParser(description="Household tokens")
+    parser.add_argument("--issue-token", type=int, metavar="HOUSEHOLD_ID", required=True,
+                        help="replace the household's token and print the new one")
+    args = parser.parse_args()
+    db = database.SessionLocal()
+    try:
+        token = issue_token(db, args.issue_token)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+    print(f"✅ Household {args.issue_token}: X-Household-Token: {token}")
+
+if __name__ == "__main__":
+    main()
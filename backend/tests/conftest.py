@@ -0,0 +1,86 @@
+"""
+Shared fixtures. Each test runs against a fresh SQLite database, the fake AI
+provider and the fake image generator, so the suite needs no key or network:
+
+    cd backend && pip install -r requirements-dev.txt && python -m pytest
+"""
+import os
+import sys
+import tempfile
+
+# Configuration is read at import time, so it has to be in place before any backend module loads
+_tmp = tempfile.mkdtemp(prefix="smart-kitchen-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["AI_PROVIDER"] = "fake"
+os.environ["IMAGE_GENERATOR"] = "fake"
+os.environ["ASSET_STORE"] = "none"
+os.environ.setdefault("CACHE_BACKEND", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+import ai_providers
+import ai_service
+import caching
+import catalog
+import database
+import main
+import models
+import search
+import serializers
+import tenancy
+import units
+
+@pytest.fixture(autouse=True)
+def fresh_db():
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    tenancy._known.clear()
+    tenancy._tokens.clear()
+    units.conversion_table.clear()
+    search._index = search.TrigramIndex()
+    serializers.detail_cache.clear()
+    for cache in caching.caches.values():
+        cache.clear()
+    if caching.shared_client is not None:
+        caching.shared_client.flushdb()
+    yield
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def client():
+    """A client without the lifespan, so the background image worker and alert scheduler stay off."""
+    return TestClient(main.app)
+
+@pytest.fixture
+def fake_ai():
+    """A fresh fake provider, so tests can count the model calls they cause."""
+    provider = ai_providers.FakeAIProvider()
+    previous = ai_service.set_provider(provider)
+    yield provider
+    ai_service.set_provider(previous)
+
+def add_dish(db, name: str, ingredients=(("rice", 100, "g"),), calories: float = 400, meal_type: str = "Lunch",
+             cuisine: str = "Indian") -> int:
+    """Adds a committed dish with its ingredient links and returns its id."""
+    dish = models.Dish(
+        name=name, description="A test dish", cuisine=cuisine, meal_type=meal_type, prep_steps=["Cook"],
+        nutrition={"calories": calories, "protein": "10g", "carbs": "50g", "fats": "5g"}
+    )
+    db.add(dish)
+    db.flush()
+    for ingredient_name, quantity, unit in ingredients:
+        ingredient = db.query(models.Ingredient).filter_by(name=ingredient_name).first()
+        if ingredient is None:
+            ingredient = models.Ingredient(name=ingredient_name, category="Pantry")
+            db.add(ingredient)
+            db.flush()
+        db.add(models.DishIngredient(dish_id=dish.id, ingredient_id=ingredient.id, quantity=quantity, unit=unit))
+    catalog.bump_catalog_version(db)
+    db.commit()
+    return dish.id
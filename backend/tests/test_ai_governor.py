@@ -0,0 +1,118 @@
+import asyncio
+import time
+import pytest
+import ai_governor
+import ai_service
+import database
+import image_worker
+import models
+from ai_governor import AIUnavailable, Governor, parse_limits
+from conftest import add_dish
+
+class Overloaded(Exception):
+    status_code = 503
+
+async def unavailable():
+    raise Overloaded()
+
+def flaky(failures: int):
+    attempts = {"count": 0}
+
+    async def call():
+        attempts["count"] += 1
+        if attempts["count"] <= failures:
+            raise Overloaded()
+        return "ok"
+    return call
+
+def test_limits_are_parsed_per_model():
+    assert parse_limits("gpt-4o-mini=8/600, dall-e-3=2") == {
+        "gpt-4o-mini": (8, 600.0), "dall-e-3": (2, ai_governor.AI_REQUESTS_PER_MINUTE)
+    }
+    with pytest.raises(ValueError):
+        parse_limits("gpt-4o-mini=lots")
+
+def test_fan_out_is_capped_per_model():
+    governor = Governor(limits={"m": (5, 0)})
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return 1
+    started = time.monotonic()
+    assert governor.map("m", [work] * 20) == [1] * 20
+    assert time.monotonic() - started < 0.5
+    assert governor.stats()["m"]["max_in_flight"] == 5
+
+def test_requests_per_minute_are_paced():
+    governor = Governor(limits={"m": (50, 600)})
+
+    async def work():
+        return 1
+    started = time.monotonic()
+    governor.map("m", [work] * 20)
+    assert time.monotonic() - started > 0.8
+
+def test_transient_errors_are_retried_and_slow_calls_time_out():
+    governor = Governor(limits={"m": (4, 0)}, retry_base=0.01)
+    assert governor.run("m", flaky(2)) == "ok"
+    assert governor.stats()["m"]["retries"] == 2
+
+    async def stalled():
+        await asyncio.sleep(2)
+    started = time.monotonic()
+    with pytest.raises(AIUnavailable):
+        governor.run("m", stalled, deadline=0.2)
+    assert time.monotonic() - started < 0.5
+
+def test_open_breaker_serves_fallbacks_then_recovers():
+    governor = Governor(limits={"m": (4, 0)}, retry_base=0.01, breaker_failures=3, breaker_cooldown=0.3)
+    assert governor.run("m", flaky(0), cache_key="answer") == "ok"
+    # The last good answer under the same key, then a local fallback, then a rejection
+    assert governor.run("m", unavailable, cache_key="answer") == "ok"
+    assert governor.stats()["m"]["breaker"] == "open"
+    assert governor.run("m", unavailable, fallback=lambda: "local") == "local"
+    with pytest.raises(AIUnavailable) as rejected:
+        governor.run("m", unavailable)
+    assert rejected.value.retry_after > 0
+
+    time.sleep(0.35)
+    assert governor.run("m", flaky(0)) == "ok" and governor.stats()["m"]["breaker"] == "closed"
+
+    async def invalid():
+        raise ValueError("not a transient failure")
+    with pytest.raises(AIUnavailable):
+        governor.run("m", invalid)
+    assert governor.stats()["m"]["breaker"] == "closed"
+
+def test_half_open_breaker_lets_one_probe_through():
+    governor = Governor(limits={"m": (8, 0)}, retry_base=0.01, max_attempts=1, breaker_failures=1, breaker_cooldown=0.1)
+    with pytest.raises(AIUnavailable):
+        governor.run("m", unavailable)
+    time.sleep(0.15)
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "ok"
+    results = governor.map("m", [slow] * 5)
+    rejected = [result for result in results if isinstance(result, AIUnavailable)]
+    assert results.count("ok") == 1 and len(rejected) == 4
+    assert all(result.retry_after > 0 for result in rejected)
+
+def test_unavailable_model_maps_to_503_with_retry_after(client, monkeypatch):
+    def down(text):
+        raise AIUnavailable("breaker open", retry_after=12.2)
+    monkeypatch.setattr(ai_service, "extract_recipe_logic", down)
+    response = client.post("/extract-recipe", params={"text_input": "Nothing Here"})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "13"
+    assert client.get("/metrics/ai").status_code == 200
+
+def test_image_jobs_wait_out_an_open_breaker(db):
+    dish_id = add_dish(db, "Dal")
+    image_worker.enqueue_image(db, "dish", dish_id, "a bowl of dal")
+    db.commit()
+
+    def breaker_open(prompts):
+        return [AIUnavailable("breaker open", retry_after=30) for _ in prompts]
+    image_worker.ImageWorker(database.SessionLocal, breaker_open).drain()
+    job = db.query(models.ImageJob).one()
+    assert (job.status, job.attempts) == ("pending", 0)
@@ -0,0 +1,104 @@
+import logging
+import threading
+from datetime import date, timedelta
+import pytest
+import alerts
+import database
+import models
+
+TODAY = date(2026, 10, 17)
+
+def pantry_item(db, name: str, quantity: float, expiry=None, threshold: float = 1.0, updated=None):
+    ingredient = models.Ingredient(name=name, category="Pantry")
+    db.add(ingredient)
+    db.flush()
+    item = models.PantryItem(
+        household_id=1, ingredient_id=ingredient.id, current_quantity=quantity, unit="g",
+        min_threshold=threshold, expiry_date=expiry, last_updated=updated or TODAY - timedelta(days=10)
+    )
+    db.add(item)
+    db.flush()
+    return item
+
+@pytest.fixture
+def scheduler():
+    return alerts.AlertScheduler(database.SessionLocal)
+
+def test_runs_only_look_at_rows_that_can_have_changed(client, db, scheduler):
+    milk = pantry_item(db, "milk", 5, TODAY + timedelta(days=2))
+    pantry_item(db, "eggs", 5, TODAY + timedelta(days=5))
+    pantry_item(db, "salt", 0.5)
+    pantry_item(db, "old", 3, TODAY - timedelta(days=1))
+    pantry_item(db, "fine", 10)
+    db.commit()
+
+    report = scheduler.run_once(TODAY)
+    assert (report["evaluated"], report["raised"]) == (3, 3)
+    assert {(a["item"], a["kind"]) for a in client.get("/alerts").json()} == {
+        ("milk", "expiring"), ("salt", "low_stock"), ("old", "expired")
+    }
+    cursor = int(client.get("/alerts").headers["X-Next-Cursor"])
+    assert scheduler.run_once(TODAY)["raised"] == 0
+
+    # Eggs enter the warning window two days later; milk expires the day after
+    report = scheduler.run_once(TODAY + timedelta(days=2))
+    assert (report["evaluated"], report["raised"]) == (1, 1)
+    assert [(a["item"], a["kind"]) for a in client.get(f"/alerts?since={cursor}").json()] == [("eggs", "expiring")]
+    report = scheduler.run_once(TODAY + timedelta(days=3))
+    assert (report["raised"], report["resolved"]) == (1, 1)
+
+    # Used-up milk is no longer reported as expired, only as low
+    db.query(models.PantryItem).filter_by(id=milk.id).update(
+        {"current_quantity": 0, "last_updated": TODAY + timedelta(days=3)}
+    )
+    db.commit()
+    scheduler.run_once(TODAY + timedelta(days=3))
+    kinds = {(a["item"], a["kind"]) for a in client.get("/alerts").json()}
+    assert ("milk", "expired") not in kinds and ("milk", "low_stock") in kinds
+
+def test_writes_later_on_the_run_day_are_picked_up(db, scheduler):
+    item = pantry_item(db, "flour", 5)
+    db.commit()
+    assert scheduler.run_once(TODAY)["raised"] == 0
+
+    # Same date as the watermark: the inclusive date match still finds it
+    db.query(models.PantryItem).filter_by(id=item.id).update({"current_quantity": 0.5, "last_updated": TODAY})
+    db.commit()
+    report = scheduler.run_once(TODAY)
+    assert (report["evaluated"], report["raised"]) == (1, 1)
+
+def test_acknowledged_alerts_leave_the_feed(client, db, scheduler):
+    pantry_item(db, "old", 3, TODAY - timedelta(days=1))
+    pantry_item(db, "salt", 0.5)
+    db.commit()
+    scheduler.run_once(TODAY)
+    old = next(a for a in client.get("/alerts").json() if a["item"] == "old")
+    assert client.post(f"/alerts/{old['id']}/acknowledge").status_code == 200
+    assert [a["item"] for a in client.get("/alerts").json()] == ["salt"]
+    assert client.post("/alerts/999/acknowledge").status_code == 404
+    assert client.post("/alerts/acknowledge?up_to=100000").json()["acknowledged"] == 1
+    assert client.get("/alerts").json() == []
+
+def test_failed_runs_are_logged_and_retried(caplog):
+    def broken_session():
+        raise RuntimeError("database is down")
+    scheduler = alerts.AlertScheduler(broken_session, interval=60)
+    ran = threading.Event()
+    run_once = scheduler.run_once
+
+    def run_and_signal():
+        try:
+            return run_once()
+        finally:
+            ran.set()
+    scheduler.run_once = run_and_signal
+
+    with caplog.at_level(logging.ERROR, logger="smartkitchen.alerts"):
+        scheduler.start()
+        try:
+            assert ran.wait(5)
+        finally:
+            scheduler.stop()
+    record, = [r for r in caplog.records if r.name == "smartkitchen.alerts"]
+    assert record.message == "Alert scheduler run failed" and record.exc_info[0] is RuntimeError
+    assert scheduler._since is None
@@ -0,0 +1,83 @@
+import io
+import os
+from functools import partial
+import pytest
+from PIL import Image
+import assets
+import fake_openai
+import image_worker
+import main
+import models
+from conftest import add_dish
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = assets.FilesystemAssetStore(str(tmp_path))
+    monkeypatch.setattr(main, "asset_store", store)
+    return store
+
+def publishing_worker(store) -> image_worker.ImageWorker:
+    return image_worker.ImageWorker(
+        main.database.SessionLocal, image_worker.one_at_a_time(image_worker.fake_image_generator),
+        publish=partial(assets.publish, store)
+    )
+
+def test_generated_images_are_served_as_immutable_variants(client, db, store, tmp_path):
+    dish_id = add_dish(db, "Dal")
+    # The same picture twice is stored once
+    image_worker.enqueue_image(db, "dish", dish_id, "Indian Dal")
+    image_worker.enqueue_image(db, "dish", dish_id, "Indian Dal")
+    db.commit()
+    assert publishing_worker(store).drain() == 2
+
+    url = client.get(f"/recipes/{dish_id}").json()["thumbnail_url"]
+    assert url.startswith("/assets/") and assets.is_asset_url(url)
+    files = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert sorted(files) == sorted(f"{size}.{ext}" for size in assets.VARIANTS for ext in assets.FORMATS)
+
+    response = client.get(url, headers={"Accept": "image/webp,*/*"})
+    assert response.headers["content-type"] == "image/webp"
+    assert "immutable" in response.headers["cache-control"]
+    digest = url.split("/")[2]
+    thumb = client.get(f"/assets/{digest}/thumb.jpg")
+    assert thumb.headers["content-type"] == "image/jpeg"
+    assert max(Image.open(io.BytesIO(thumb.content)).size) == assets.VARIANTS["thumb"]
+    partial_response = client.get(f"/assets/{digest}/thumb.jpg", headers={"Range": "bytes=0-9"})
+    assert partial_response.status_code == 206 and len(partial_response.content) == 10
+    assert client.get(f"/assets/{'0' * 64}/card").status_code == 404
+
+def test_backfill_stores_remote_images_and_changes_the_listing_etag(client, db, store):
+    stored_id, expired_id = add_dish(db, "Dal"), add_dish(db, "Pulao")
+    db.get(models.Dish, stored_id).thumbnail_url = image_worker.fake_image_generator("Dal")
+    db.get(models.Dish, expired_id).thumbnail_url = "http://127.0.0.1:9/expired.png"
+    db.commit()
+    etag = client.get("/recipes").headers["etag"]
+
+    assert assets.backfill(db, store, dry_run=True)["remote"] == 2
+    assert assets.backfill(db, store) == {"remote": 2, "relinked": 0, "stored": 1, "requeued": 1}
+    db.expire_all()
+    assert assets.is_asset_url(db.get(models.Dish, stored_id).thumbnail_url)
+    assert db.get(models.Dish, expired_id).thumbnail_url is None
+    assert db.query(models.ImageJob).filter_by(target_id=expired_id, status="pending").count() == 1
+    assert client.get("/recipes", headers={"If-None-Match": etag}).status_code == 200
+
+def test_backfill_rewrites_asset_urls_stored_under_another_base(db, store):
+    dish_id = add_dish(db, "Dal")
+    digest = assets.ingest(store, assets.fetch(image_worker.fake_image_generator("Dal")))
+    db.get(models.Dish, dish_id).thumbnail_url = f"http://localhost:8000/assets/{digest}/card"
+    db.commit()
+
+    assert assets.backfill(db, store) == {"remote": 0, "relinked": 1, "stored": 0, "requeued": 0}
+    db.expire_all()
+    assert db.get(models.Dish, dish_id).thumbnail_url == f"/assets/{digest}/card"
+
+def test_fetch_aborts_downloads_past_the_size_limit(monkeypatch):
+    server, base_url = fake_openai.serve_in_thread(fake_openai.create_app())
+    try:
+        image_url = base_url.replace("/v1", "/images/" + "ab" * 20 + ".png")
+        assert Image.open(io.BytesIO(assets.fetch(image_url))).size == (256, 256)
+        monkeypatch.setattr(assets, "MAX_ASSET_BYTES", 100)
+        with pytest.raises(ValueError):
+            assets.fetch(image_url)
+    finally:
+        server.should_exit = True
@@ -0,0 +1,38 @@
+import asyncio
+import httpx
+import ai_providers
+import benchmark
+import main
+import models
+
+def test_fake_provider_is_deterministic():
+    first, second = ai_providers.FakeAIProvider(), ai_providers.FakeAIProvider()
+    recipe = asyncio.run(first.extract_recipe("Paneer  Tikka"))
+    assert recipe == asyncio.run(second.extract_recipe("paneer tikka"))
+    assert recipe.name == "Paneer Tikka" and len(recipe.ingredients) == 6
+    assert asyncio.run(first.unit_factor("rice", "cup", "g")) == 200
+    assert asyncio.run(first.unit_factor("rice", "g", "cup")) == 1 / 200
+    assert first.calls == {"extract_recipe": 1, "unit_factor": 2}
+
+def test_read_scenarios_run_cleanly(db):
+    benchmark.seed(db, dishes=20, ingredients=30, plans=15)
+    assert db.query(models.Dish).count() == 20
+    scenarios = benchmark.build_scenarios(db, complete_pool=5, active_households=1)
+    reads = [(label, next_request) for label, next_request in scenarios if label.startswith("/")]
+    assert len(reads) == len(benchmark.HOT_ENDPOINTS)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            return [await benchmark.drive(client, label, next_request, 2, 0.05, benchmark.QueryCounter())
+                    for label, next_request in reads]
+    for result in asyncio.run(run()):
+        assert result["requests"] > 0 and result["errors"] == 0, result
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = [{"path": "/pantry", "rps": 100.0, "p99_ms": 10.0, "queries_per_request": 2.0}]
+    within = [{"path": "/pantry", "rps": 90.0, "p99_ms": 11.0, "queries_per_request": 2.0}]
+    assert benchmark.compare(within, baseline, tolerance=0.2) == []
+    worse = [{"path": "/pantry", "rps": 50.0, "p99_ms": 30.0, "queries_per_request": 5.0}]
+    assert len(benchmark.compare(worse, baseline, tolerance=0.2)) == 3
+    assert benchmark.compare([{**worse[0], "path": "/new"}], baseline, tolerance=0.2) == []
@@ -0,0 +1,46 @@
+import database
+import ingredients
+import models
+from conftest import add_dish
+
+def test_read_only_lookups_fill_the_name_cache(db):
+    add_dish(db, "Dal", ingredients=[("rice", 100, "g"), ("lentils", 50, "g")])
+    ids = [ingredient_id for (ingredient_id,) in db.query(models.Ingredient.id).order_by(models.Ingredient.id)]
+    ingredients.ingredient_name_cache.clear()
+
+    reader = database.SessionLocal()
+    assert ingredients.ingredient_names(reader, ids) == {ids[0]: "rice", ids[1]: "lentils"}
+    reader.close()  # never committed
+    assert ingredients.ingredient_name_cache.get_many(ids) == {ids[0]: "rice", ids[1]: "lentils"}
+
+def test_rows_a_transaction_wrote_are_cached_only_after_commit(db):
+    ingredient = models.Ingredient(name="saffron", category="Spices")
+    db.add(ingredient)
+    db.flush()
+    assert ingredients.ingredient_names(db, [ingredient.id]) == {ingredient.id: "saffron"}
+    assert ingredients.ingredient_name_cache.get(ingredient.id) is None
+    db.rollback()
+    assert ingredients.ingredient_name_cache.get(ingredient.id) is None
+
+    ingredient = models.Ingredient(name="saffron", category="Spices")
+    db.add(ingredient)
+    db.flush()
+    ingredients.ingredient_names(db, [ingredient.id])
+    db.commit()
+    assert ingredients.ingredient_name_cache.get(ingredient.id) == "saffron"
+
+def test_resolved_ids_are_cached_and_evicted_on_rename(db):
+    created = ingredients.resolve_ingredients(db, [("cumin", "Spices")], enqueue_images=False)
+    assert ingredients.ingredient_ids.get("cumin") is None
+    db.commit()
+    assert ingredients.ingredient_ids.get("cumin") == created["cumin"]
+
+    db.get(models.Ingredient, created["cumin"]).name = "jeera"
+    db.commit()
+    assert ingredients.ingredient_ids.get("cumin") is None
+    assert ingredients.ingredient_name_cache.get(created["cumin"]) is None
+
+    reader = database.SessionLocal()
+    assert ingredients.resolve_ingredients(reader, [("jeera", "Spices")]) == {"jeera": created["cumin"]}
+    reader.close()
+    assert ingredients.ingredient_ids.get("jeera") == created["cumin"]
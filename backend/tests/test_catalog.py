@@ -0,0 +1,39 @@
+import catalog
+import database
+import migrate
+import models
+from conftest import add_dish
+
+def test_listing_is_paginated_and_etag_cached(client, db):
+    ids = [add_dish(db, name) for name in ("Biryani", "Dal", "Paneer")]
+    first = client.get("/recipes", params={"limit": 2})
+    assert [recipe["id"] for recipe in first.json()] == ids[:2]
+    cursor, etag = first.headers["x-next-cursor"], first.headers["etag"]
+    assert client.get("/recipes", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 304
+
+    last = client.get("/cms/recipes", params={"cursor": cursor, "cuisine": "indian", "meal_type": "lunch"})
+    assert [recipe["id"] for recipe in last.json()] == ids[2:]
+    assert "x-next-cursor" not in last.headers
+
+    client.put(f"/cms/recipes/{ids[0]}", json={"description": "Now with more saffron"})
+    assert client.get("/recipes", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 200
+
+def test_reading_the_version_never_commits_the_callers_work(db):
+    assert catalog.get_catalog_version(db) == 1
+    assert db.query(models.CatalogMeta).count() == 0
+    db.add(models.Dish(name="Uncommitted", description="", prep_steps=[]))
+    db.flush()
+    catalog.get_catalog_version(db)
+    db.rollback()
+    assert db.query(models.Dish).count() == 0
+
+    catalog.bump_catalog_version(db)
+    db.commit()
+    assert catalog.get_catalog_version(db) == 2
+
+def test_migration_seeds_the_catalog_row(db):
+    seed = next(module for version, _, module in migrate.discover() if version == 13)
+    with database.engine.begin() as conn:
+        seed.upgrade(conn)
+        seed.upgrade(conn)
+    assert [(row.id, row.version) for row in db.query(models.CatalogMeta)] == [(catalog.CATALOG_ROW_ID, 1)]
@@ -0,0 +1,28 @@
+import asyncio
+import pytest
+import database
+import models
+from conftest import add_dish
+
+@pytest.mark.parametrize("url, expected", [
+    ("postgres://u:p@db/kitchen", "postgresql+asyncpg://u:p@db/kitchen"),
+    ("postgresql://u:p@db/kitchen", "postgresql+asyncpg://u:p@db/kitchen"),
+    ("sqlite:///kitchen.db", "sqlite+aiosqlite:///kitchen.db"),
+    ("postgresql+psycopg://u:p@db/kitchen", "postgresql+psycopg://u:p@db/kitchen"),
+])
+def test_async_driver_is_pinned(url, expected):
+    assert database._with_driver(url, "asyncpg", "aiosqlite") == expected
+
+def test_pool_settings_only_apply_to_server_databases():
+    assert database._engine_options("sqlite:///kitchen.db") == {}
+    options = database._engine_options("postgresql+psycopg2://u:p@db/kitchen")
+    assert options["pool_size"] == database.DB_POOL_SIZE and options["pool_pre_ping"] == database.DB_POOL_PRE_PING
+
+def test_run_read_passes_a_session_and_arguments(db):
+    dish_id = add_dish(db, "Dal")
+
+    def read(session, wanted):
+        engine = database.async_engine.sync_engine if database.DB_ASYNC else database.engine
+        assert session.get_bind() is engine
+        return session.get(models.Dish, wanted).name
+    assert asyncio.run(database.run_read(read, dish_id)) == "Dal"
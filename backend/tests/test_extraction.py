@@ -0,0 +1,35 @@
+import threading
+import models
+from conftest import add_dish
+
+def extract(client, text: str, **params):
+    response = client.post("/extract-recipe", params={"text_input": text, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_concurrent_extractions_share_one_completion(client, db, fake_ai):
+    fake_ai.latency_ms = 300
+    threads = [threading.Thread(target=extract, args=(client, "Korma Special")) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake_ai.calls["extract_recipe"] == 1
+    assert db.query(models.Dish).filter_by(name="Korma Special").count() == 1
+    assert db.query(models.LLMCacheEntry).count() == 1
+
+def test_regenerate_reuses_the_stored_completion(client, db, fake_ai):
+    dish_id = extract(client, "Korma Special")["id"]
+    assert client.post(f"/cms/recipes/{dish_id}/regenerate").status_code == 200
+    assert fake_ai.calls["extract_recipe"] == 1
+
+    dish_id = db.query(models.Dish.id).filter_by(name="Korma Special").scalar()
+    assert client.post(f"/cms/recipes/{dish_id}/regenerate", params={"force_refresh": True}).status_code == 200
+    assert fake_ai.calls["extract_recipe"] == 2
+    assert db.query(models.LLMCacheEntry).count() == 1
+
+def test_known_dishes_skip_the_model(client, db, fake_ai):
+    dish_id = add_dish(db, "Dal Makhani")
+    assert extract(client, "  dal   MAKHANI ")["id"] == dish_id
+    assert fake_ai.calls["extract_recipe"] == 0
@@ -0,0 +1,32 @@
+from datetime import date
+import models
+from conftest import add_dish
+
+def test_nutrition_is_stored_numerically(db):
+    dish = db.get(models.Dish, add_dish(db, "Dal", calories=450))
+    assert (dish.calories, dish.protein_g, dish.carbs_g, dish.fats_g) == (450, 10, 50, 5)
+    dish.nutrition = {"calories": "320 kcal", "protein": "12.5 g", "carbs": None, "fats": "7g"}
+    assert (dish.calories, dish.protein_g, dish.carbs_g, dish.fats_g) == (320, 12.5, None, 7)
+    assert models.nutrient_amount("n/a") is None
+
+def test_day_and_range_totals(client, db):
+    biryani, dal = add_dish(db, "Biryani"), add_dish(db, "Dal")
+    db.add_all([
+        models.MealPlan(household_id=1, dish_id=biryani, planned_date=date(2026, 10, 17), meal_slot="Lunch"),
+        models.MealPlan(household_id=1, dish_id=dal, planned_date=date(2026, 10, 17), meal_slot="Dinner"),
+        models.MealPlan(household_id=1, dish_id=dal, planned_date=date(2026, 10, 19), meal_slot="Dinner"),
+    ])
+    db.commit()
+
+    day = client.get("/health-stats/2026-10-17").json()
+    assert day["actual"] == {"calories": 800, "protein": 20, "carbs": 100, "fats": 10}
+    assert day["goals"]["calories"] == models.UserProfile.__table__.c.daily_calorie_goal.default.arg
+
+    week = client.get("/health-stats", params={"from": "2026-10-16", "to": "2026-10-22"}).json()
+    assert [d["date"] for d in week["days"]][::6] == ["2026-10-16", "2026-10-22"]
+    assert [d["actual"]["calories"] for d in week["days"]] == [0, 800, 0, 400, 0, 0, 0]
+
+def test_invalid_ranges_are_rejected(client):
+    assert client.get("/health-stats", params={"from": "2026-10-16", "to": "2026-10-01"}).status_code == 400
+    assert client.get("/health-stats", params={"from": "2026-01-01", "to": "2027-06-01"}).status_code == 400
+    assert client.get("/health-stats/bad").status_code == 400
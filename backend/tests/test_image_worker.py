@@ -0,0 +1,110 @@
+import time
+from datetime import datetime, timedelta
+import database
+import image_worker
+import models
+from conftest import add_dish
+
+def fake_worker(generator=image_worker.fake_image_generator, **kwargs) -> image_worker.ImageWorker:
+    return image_worker.ImageWorker(database.SessionLocal, image_worker.one_at_a_time(generator), **kwargs)
+
+def test_extraction_commits_pending_jobs_with_the_dish(client, db):
+    response = client.post("/extract-recipe", params={"text_input": "Vegetable Pulao"})
+    assert response.status_code == 200, response.text
+    recipe = response.json()
+    assert recipe["thumbnail_url"] is None
+
+    jobs = db.query(models.ImageJob).all()
+    assert {(job.target_type, job.status) for job in jobs} >= {("dish", "pending"), ("ingredient", "pending")}
+    assert any(job.target_type == "dish" and job.target_id == recipe["id"] for job in jobs)
+    status = client.get("/images/status").json()
+    assert status["counts"]["pending"] == len(jobs)
+
+def test_worker_stores_generated_images(client, db):
+    client.post("/extract-recipe", params={"text_input": "Vegetable Pulao"})
+    processed = fake_worker().drain()
+
+    assert processed == db.query(models.ImageJob).count()
+    assert client.get("/images/status").json() == {"counts": {"done": processed}, "jobs": []}
+    dish = db.query(models.Dish).one()
+    assert dish.thumbnail_url == image_worker.fake_image_generator(db.query(models.ImageJob.prompt).filter_by(
+        target_type="dish"
+    ).scalar())
+
+def test_failed_jobs_back_off_then_succeed(client, db):
+    dish_id = add_dish(db, "Dal")
+    image_worker.enqueue_image(db, "dish", dish_id, "Dal")
+    db.commit()
+    calls = []
+
+    def flaky(prompt):
+        calls.append(prompt)
+        if len(calls) == 1:
+            raise RuntimeError("model overloaded")
+        return image_worker.fake_image_generator(prompt)
+
+    worker = fake_worker(flaky)
+    assert worker.drain() == 1
+    job = db.query(models.ImageJob).one()
+    assert (job.status, job.attempts, job.last_error) == ("pending", 1, "model overloaded")
+    assert job.next_attempt_at > datetime.utcnow()
+    # Not due yet: a second pass leaves it alone
+    assert worker.drain() == 0
+    assert client.get("/images/status").json()["jobs"][0]["last_error"] == "model overloaded"
+
+    job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert worker.drain() == 1
+    db.expire_all()
+    assert (job.status, job.attempts) == ("done", 2)
+    assert db.get(models.Dish, dish_id).thumbnail_url.startswith("data:image/png")
+
+def test_jobs_fail_after_max_attempts(client, db, monkeypatch):
+    monkeypatch.setattr(image_worker, "BASE_BACKOFF_SECONDS", 0)
+    dish_id = add_dish(db, "Dal")
+    image_worker.enqueue_image(db, "dish", dish_id, "Dal")
+    db.commit()
+
+    def broken(prompt):
+        raise RuntimeError("no image")
+
+    worker = fake_worker(broken)
+    while worker.drain():
+        pass
+    status = client.get("/images/status").json()
+    assert status["counts"] == {"failed": 1}
+    assert status["jobs"][0]["attempts"] == image_worker.MAX_ATTEMPTS
+    assert db.get(models.Dish, dish_id).thumbnail_url is None
+
+def test_jobs_interrupted_by_a_restart_are_resumed(client, db):
+    dish_id = add_dish(db, "Dal")
+    image_worker.enqueue_image(db, "dish", dish_id, "Dal")
+    db.commit()
+    # A previous process claimed the job and died before finishing it
+    crashed = fake_worker()
+    assert len(crashed._claim(10)) == 1
+    assert client.get("/images/status").json()["counts"] == {"running": 1}
+    assert fake_worker().drain() == 0
+
+    worker = fake_worker(poll_interval=0.05)
+    worker.start()
+    try:
+        for _ in range(100):
+            if client.get("/images/status").json()["counts"] == {"done": 1}:
+                break
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+    assert client.get("/images/status").json()["counts"] == {"done": 1}
+    db.expire_all()
+    assert db.get(models.Dish, dish_id).thumbnail_url.startswith("data:image/png")
+
+def test_new_thumbnails_change_the_listing_etag(client, db):
+    dish_id = add_dish(db, "Dal")
+    etag = client.get("/recipes").headers["etag"]
+    image_worker.enqueue_image(db, "dish", dish_id, "Dal")
+    db.commit()
+    fake_worker().drain()
+    response = client.get("/recipes", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["thumbnail_url"].startswith("data:image/png")
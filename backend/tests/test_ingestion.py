@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+import database
+import ingredients
+import main
+import models
+
+def count_statements(fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    return result, statements
+
+def test_names_resolve_in_constant_round_trips(db):
+    ingredients.resolve_ingredients(db, [("onion", "Produce")])
+    db.commit()
+
+    items = [("onion", "Dairy"), ("tomato", "Produce"), ("tomato", "Spice"), ("basil", None)]
+    ids, statements = count_statements(lambda: ingredients.resolve_ingredients(db, items))
+    db.commit()
+    # onion is cached; one IN query for the rest and one insert for the new names
+    assert [statement.split()[0] for statement in statements] == ["SELECT", "INSERT"]
+    assert set(ids) == {"onion", "tomato", "basil"}
+    categories = dict(db.query(models.Ingredient.name, models.Ingredient.category))
+    assert categories == {"onion": "Produce", "tomato": "Produce", "basil": "Pantry"}
+    queued = {job.target_id for job in db.query(models.ImageJob).filter_by(target_type="ingredient")}
+    assert queued == {ids["onion"], ids["tomato"], ids["basil"]}
+
+    # Everything is cached now
+    again, statements = count_statements(lambda: ingredients.resolve_ingredients(db, items))
+    assert again == ids and statements == []
+
+def test_extraction_persists_the_dish_in_one_transaction(db, fake_ai, monkeypatch):
+    client = TestClient(main.app, raise_server_exceptions=False)
+    response = client.post("/extract-recipe", params={"text_input": "Zqxv Special"})
+    assert response.status_code == 200, response.text
+    assert len(response.json()["ingredients"]) == 6
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("resolution failed")
+    monkeypatch.setattr(ingredients, "resolve_ingredients", fail)
+    assert client.post("/extract-recipe", params={"text_input": "Wholly Other Dish"}).status_code == 500
+    assert [name for (name,) in db.query(models.Dish.name)] == ["Zqxv Special"]
@@ -0,0 +1,90 @@
+import threading
+from datetime import date
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import ai_service
+import main
+import models
+from conftest import add_dish
+
+def plan_meals(db, dish_id: int, count: int) -> list:
+    plans = [models.MealPlan(household_id=1, dish_id=dish_id, planned_date=date.today(), meal_slot="Lunch")
+             for _ in range(count)]
+    db.add_all(plans)
+    db.commit()
+    return [plan.id for plan in plans]
+
+def stock(db, name: str, quantity: float, unit: str):
+    ingredient = db.query(models.Ingredient).filter_by(name=name).one()
+    db.add(models.PantryItem(household_id=1, ingredient_id=ingredient.id, current_quantity=quantity, unit=unit))
+    db.commit()
+
+def test_completion_deducts_converted_quantities(client, db):
+    dish_id = add_dish(db, "Pulao", ingredients=[("rice", 1, "cup"), ("salt", 5, "g")])
+    stock(db, "rice", 1000, "g")
+    plan_id, = plan_meals(db, dish_id, 1)
+
+    report = client.post(f"/meal-planner/{plan_id}/complete").json()["deductions"]
+    assert {row["ingredient"]: row["in_pantry"] for row in report} == {"rice": True, "salt": False}
+    rice = next(row for row in report if row["ingredient"] == "rice")
+    # The fake provider answers 200 g per cup
+    assert (rice["deducted"], rice["unit"], rice["remaining"]) == (200, "g", 800)
+    assert db.query(models.MealPlan).count() == 0
+
+def test_units_are_converted_before_pantry_rows_are_locked(client, db, monkeypatch):
+    dish_id = add_dish(db, "Pulao", ingredients=[("rice", 1, "cup")])
+    stock(db, "rice", 1000, "g")
+    plan_id, = plan_meals(db, dish_id, 1)
+    events = []
+    ask_model = ai_service.get_unit_factor
+    monkeypatch.setattr(ai_service, "get_unit_factor", lambda *args: events.append("model") or ask_model(*args))
+
+    def record_locks(state):
+        if getattr(state.statement, "_for_update_arg", None) is not None and "pantry_inventory" in str(state.statement):
+            events.append("lock")
+    event.listen(Session, "do_orm_execute", record_locks)
+    try:
+        assert client.post(f"/meal-planner/{plan_id}/complete").status_code == 200
+    finally:
+        event.remove(Session, "do_orm_execute", record_locks)
+    assert events == ["model", "lock"]
+
+def test_concurrent_completions_lose_no_decrement(db, monkeypatch):
+    dish_id = add_dish(db, "Pulao", ingredients=[("rice", 1, "cup")])
+    stock(db, "rice", 1000, "g")
+    plan_ids = plan_meals(db, dish_id, 2)
+    # Both requests have read the pantry and are waiting on the model before either one writes
+    both_asking = threading.Barrier(2, timeout=10)
+    ask_model = ai_service.get_unit_factor
+
+    def slow_model(*args):
+        both_asking.wait()
+        return ask_model(*args)
+    monkeypatch.setattr(ai_service, "get_unit_factor", slow_model)
+
+    responses = []
+
+    def complete(plan_id):
+        responses.append(TestClient(main.app).post(f"/meal-planner/{plan_id}/complete"))
+    threads = [threading.Thread(target=complete, args=(plan_id,)) for plan_id in plan_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [response.status_code for response in responses] == [200, 200]
+    db.expire_all()
+    assert db.query(models.PantryItem.current_quantity).scalar() == 600
+
+def test_purchase_keeps_a_concurrent_deduction(client, db):
+    dish_id = add_dish(db, "Pulao", ingredients=[("rice", 100, "g")])
+    stock(db, "rice", 1000, "g")
+    plan_id, = plan_meals(db, dish_id, 1)
+    item = db.query(models.PantryItem).one()
+    assert item.current_quantity == 1000
+
+    client.post(f"/meal-planner/{plan_id}/complete")
+    client.post("/pantry/purchase", params={"item_name": "rice", "quantity": 0.5, "unit": "kg"})
+    db.expire_all()
+    assert item.current_quantity == 1400
@@ -0,0 +1,55 @@
+from datetime import date
+import numpy as np
+import meal_generator
+import models
+import shopping_list
+from conftest import add_dish
+
+def catalog(meal_types: list, calories: list) -> dict:
+    return {
+        "ids": np.arange(1, len(calories) + 1),
+        "meal_types": [meal_type.lower() for meal_type in meal_types],
+        "nutrition": np.array([[kcal, 20, 50, 10] for kcal in calories], dtype=float),
+        "coverage": np.zeros(len(calories)),
+    }
+
+def test_solver_respects_slots_and_never_repeats_a_dish_on_one_day():
+    dishes = catalog(["Breakfast"] * 3 + ["Lunch, Dinner"] * 6, [300, 450, 600, 400, 500, 600, 700, 800, 900])
+    picks = meal_generator.solve(dishes, [2000, 100, 250, 70], days=7, slots=["Breakfast", "Lunch", "Dinner"], seed=1)
+    assert (picks >= 0).all()
+    assert all(row < 3 for row in picks[:, 0]) and all(row >= 3 for row in picks[:, 1:].ravel())
+    assert all(picks[day, 1] != picks[day, 2] for day in range(7))
+    # Days land near the goal
+    totals = dishes["nutrition"][picks, 0].sum(axis=1)
+    assert (abs(totals - 2000) <= 300).all()
+
+def test_fixed_slots_are_kept_and_unfillable_slots_stay_empty():
+    dishes = catalog(["Lunch", "Lunch"], [600, 700])
+    picks = meal_generator.solve(dishes, [2000, 100, 250, 70], days=2, slots=["Breakfast", "Lunch"], fixed={(0, 1): 1})
+    assert picks[0, 1] == 1 and picks[1, 1] in (0, 1)
+    assert (picks[:, 0] == -1).all()
+
+def test_generate_fills_only_empty_slots(client, db):
+    for index in range(6):
+        add_dish(db, f"Curry {index}", calories=500 + 50 * index, meal_type="Lunch, Dinner")
+    kept = add_dish(db, "No Nutrition Stew", meal_type="Lunch")
+    db.query(models.Dish).filter_by(id=kept).update({"calories": None})
+    db.add(models.MealPlan(household_id=1, dish_id=kept, planned_date=date(2026, 10, 20), meal_slot="Lunch"))
+    shopping_list.apply_plan_delta(db, 1, kept, +1)
+    db.commit()
+
+    body = {"start_date": "2026-10-20", "end_date": "2026-10-22", "slots": ["Lunch", "Dinner"], "seed": 1}
+    report = client.post("/meal-planner/generate", json=body).json()
+    assert (report["created"], report["kept"], report["unfilled"]) == (5, 1, 0)
+    assert db.query(models.MealPlan).filter_by(dish_id=kept).count() == 1
+    assert shopping_list.rebuild(db) == []
+
+    report = client.post("/meal-planner/generate", json={**body, "replace_existing": True}).json()
+    assert (report["created"], report["replaced"]) == (6, 6)
+    db.expire_all()
+    assert shopping_list.rebuild(db) == []
+
+def test_generate_rejects_bad_ranges(client):
+    assert client.post("/meal-planner/generate", json={"start_date": "2026-10-22", "end_date": "2026-10-20"}).status_code == 400
+    assert client.post("/meal-planner/generate", json={"start_date": "2026-01-01", "end_date": "2026-12-31"}).status_code == 400
+    assert client.post("/meal-planner/generate", json={"start_date": "2026-10-20", "end_date": "2026-10-20", "slots": []}).status_code == 400
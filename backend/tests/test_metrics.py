@@ -0,0 +1,51 @@
+import logging
+import pytest
+from fastapi.testclient import TestClient
+import main
+import metrics
+import pairings
+from conftest import add_dish
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    metrics.registry.reset()
+    yield
+    metrics.registry.reset()
+
+def test_routes_report_queries_and_latency(client, db):
+    dish_id = add_dish(db, "Dal")
+    for _ in range(3):
+        response = client.get("/recipes?limit=10")
+        assert response.status_code == 200
+    assert "db;dur=" in response.headers["Server-Timing"]
+    client.get(f"/recipes/{dish_id}")
+
+    snapshot = client.get("/metrics").json()
+    recipes = snapshot["GET /recipes"]
+    assert recipes["requests"] == 3 and recipes["errors"] == 0
+    assert recipes["queries"]["count"] == 3 and recipes["queries"]["sum"] > 0
+    assert recipes["latency_ms"]["buckets"]["+Inf"] == 3
+    # Ids are folded into the route pattern
+    assert snapshot["GET /recipes/{recipe_id}"]["requests"] == 1
+
+def test_ai_calls_are_attributed_to_the_route(client, fake_ai):
+    response = client.post("/extract-recipe", params={"text_input": "Korma"})
+    assert 'desc="1 calls"' in response.headers["Server-Timing"]
+    assert client.get("/metrics").json()["POST /extract-recipe"]["ai_calls_total"] == 1
+
+def test_unhandled_errors_count_as_500(db, monkeypatch):
+    dish_id = add_dish(db, "Dal")
+
+    def broken(*args):
+        raise RuntimeError("graph unavailable")
+    monkeypatch.setattr(pairings, "top_pairings", broken)
+    client = TestClient(main.app, raise_server_exceptions=False)
+    assert client.get(f"/recipes/{dish_id}/pairings").status_code == 500
+    assert metrics.registry.snapshot()["GET /recipes/{recipe_id}/pairings"]["errors"] == 1
+
+def test_slow_queries_are_logged_with_their_route(client, db, monkeypatch, caplog):
+    add_dish(db, "Dal")
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 1e-9)
+    with caplog.at_level(logging.WARNING, logger="smartkitchen.sql"):
+        client.get("/recipes?limit=10")
+    assert any("route=/recipes" in record.message for record in caplog.records)
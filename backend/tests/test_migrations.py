@@ -0,0 +1,83 @@
+import textwrap
+import pytest
+from sqlalchemy import create_engine, select, text
+import migrate
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+def write_migration(directory, filename: str, body: str):
+    (directory / filename).write_text(textwrap.dedent(body))
+
+def test_fresh_database_is_built_by_the_migrations(engine):
+    versions = [version for version, _, _ in migrate.discover()]
+    assert migrate.upgrade(engine, log=lambda message: None) == versions
+    assert migrate.pending(engine) == []
+    assert migrate.upgrade(engine, log=lambda message: None) == []
+    with engine.connect() as conn:
+        assert migrate.has_column(conn, "dishes", "calories")
+        assert migrate.has_column(conn, "pantry_inventory", "household_id")
+
+def test_failed_finalize_is_retried_by_the_next_upgrade(engine, tmp_path, monkeypatch):
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    flag = tmp_path / "finalize-may-succeed"
+    write_migration(directory, "0001_notes.py", """
+        from sqlalchemy import text
+
+        def upgrade(conn):
+            conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)"))
+    """)
+    write_migration(directory, "0002_notes_backfill.py", f"""
+        import os
+        from sqlalchemy import text
+        import migrate
+
+        def upgrade(conn):
+            migrate.add_column(conn, "notes", "slug", "TEXT")
+
+        def finalize(db):
+            if not os.path.exists({str(flag)!r}):
+                raise RuntimeError("backfill interrupted")
+            db.execute(text("INSERT INTO notes (body, slug) VALUES ('hello', 'hello')"))
+    """)
+    monkeypatch.setattr(migrate, "MIGRATIONS_DIR", str(directory))
+
+    with pytest.raises(migrate.MigrationError, match="Finalizing 0002_notes_backfill failed"):
+        migrate.upgrade(engine, log=lambda message: None)
+    # The DDL committed, but the migration still counts as pending
+    assert migrate.pending(engine) == [(2, "notes_backfill")]
+
+    flag.touch()
+    assert migrate.upgrade(engine, log=lambda message: None) == []
+    assert migrate.pending(engine) == []
+    with engine.connect() as conn:
+        assert conn.execute(select(text("slug")).select_from(text("notes"))).scalars().all() == ["hello"]
+
+def test_failed_upgrade_is_not_recorded(engine, tmp_path, monkeypatch):
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    write_migration(directory, "0001_broken.py", """
+        from sqlalchemy import text
+
+        def upgrade(conn):
+            conn.execute(text("CREATE TABLE half (id INTEGER PRIMARY KEY)"))
+            conn.execute(text("THIS IS NOT SQL"))
+    """)
+    monkeypatch.setattr(migrate, "MIGRATIONS_DIR", str(directory))
+    with pytest.raises(migrate.MigrationError, match="0001_broken"):
+        migrate.upgrade(engine, log=lambda message: None)
+    assert migrate.pending(engine) == [(1, "broken")]
+
+def test_ddl_helpers_are_idempotent(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)"))
+        assert migrate.add_column(conn, "notes", "slug", "TEXT") is True
+        assert migrate.add_column(conn, "notes", "slug", "TEXT") is False
+        assert migrate.create_index(conn, "ix_notes_slug", "notes", ["slug"], unique=True) is True
+        assert migrate.create_index(conn, "ix_notes_slug", "notes", ["slug"]) is False
+        assert migrate.drop_index(conn, "notes", "ix_notes_slug") is True
+        assert migrate.drop_index(conn, "notes", "ix_notes_slug") is False
@@ -0,0 +1,94 @@
+from datetime import date
+from sqlalchemy import select
+import database
+import models
+import pairings
+import recipe_io
+from conftest import add_dish
+
+DAY = date(2026, 10, 17)
+NEXT_DAY = date(2026, 10, 18)
+
+def plan(db, dish_id: int, day: date, slot: str = "Lunch") -> int:
+    """What POST /meal-planner does for the default household."""
+    before = pairings.day_dishes(db, 1, [day])
+    entry = models.MealPlan(household_id=1, dish_id=dish_id, planned_date=day, meal_slot=slot)
+    db.add(entry)
+    db.flush()
+    pairings.apply_plan_changes(db, 1, before)
+    db.commit()
+    return entry.id
+
+def edges(db) -> dict:
+    return {(row.dish_id, row.paired_dish_id): row for row in db.execute(select(pairings.edges))}
+
+def test_same_day_plans_rank_pairings(client, db):
+    curry, naan, rice = (add_dish(db, name) for name in ("Butter Chicken", "Garlic Naan", "Jeera Rice"))
+    assert client.get(f"/recipes/{curry}/pairings").json() == []
+    assert client.get("/recipes/99999/pairings").status_code == 404
+
+    for dish_id in (curry, naan, rice):
+        plan(db, dish_id, DAY)
+    plan(db, curry, NEXT_DAY)
+    plan(db, naan, NEXT_DAY, "Dinner")
+    top = client.get(f"/recipes/{curry}/pairings").json()
+    assert [p["id"] for p in top] == [naan, rice]
+    assert top[0]["co_occurrences"] == 2 and not top[0]["suggested"]
+
+    # A dish planned twice on one day is still one co-occurrence
+    plan(db, naan, NEXT_DAY, "Lunch")
+    assert client.get(f"/recipes/{curry}/pairings").json()[0]["co_occurrences"] == 2
+
+    rice_plan = db.query(models.MealPlan.id).filter_by(dish_id=rice).scalar()
+    assert client.delete(f"/meal-planner/{rice_plan}").status_code == 200
+    assert [p["id"] for p in client.get(f"/recipes/{curry}/pairings").json()] == [naan]
+
+def test_apply_adds_to_concurrent_writes(db):
+    first_id, second_id = add_dish(db, "A Dish"), add_dish(db, "B Dish")
+    first, second = database.SessionLocal(), database.SessionLocal()
+    try:
+        pairings._apply(first, co_deltas={(first_id, second_id): 1})
+        first.commit()
+        pairings._apply(second, suggested={(first_id, second_id)}, co_deltas={(first_id, second_id): 2})
+        second.commit()
+        rows = edges(db)
+        assert rows[(first_id, second_id)].co_occurrences == 3 and rows[(second_id, first_id)].suggested
+        assert rows[(first_id, second_id)].weight == 3 + pairings.PAIRING_SUGGESTION_WEIGHT
+
+        # Counts never go below zero; the suggestion keeps its weight
+        pairings._apply(first, co_deltas={(first_id, second_id): -5})
+        first.commit()
+        row = edges(db)[(first_id, second_id)]
+        assert row.co_occurrences == 0 and row.weight == pairings.PAIRING_SUGGESTION_WEIGHT
+    finally:
+        first.close()
+        second.close()
+
+def test_suggestions_wait_for_their_dish(client, db):
+    curry, lassi = add_dish(db, "Butter Chicken"), add_dish(db, "Mango Lassi")
+    pairings.link_suggestions(db, {lassi: ["butter chicken", "Pistachio Kulfi"]})
+    db.commit()
+    top = client.get(f"/recipes/{lassi}/pairings").json()
+    assert [p["id"] for p in top] == [curry]
+    assert top[0]["suggested"] and top[0]["weight"] == pairings.PAIRING_SUGGESTION_WEIGHT
+    assert pairings.pending_suggestions(db, [lassi]) == {lassi: ["Pistachio Kulfi"]}
+
+    line = (
+        '{"name": "Pistachio Kulfi", "description": "x", "cuisine": "Indian", "suitable_for": ["Dinner"], '
+        '"ingredients": [], "prep_steps": [], "nutrition": {"calories": 1, "protein": "1g", "carbs": "1g", "fats": "1g"}, '
+        '"suggested_pairings": []}'
+    )
+    assert recipe_io.import_ndjson(db, [line])["imported"] == 1
+    kulfi = db.query(models.Dish.id).filter_by(name="Pistachio Kulfi").scalar()
+    assert [p["id"] for p in client.get(f"/recipes/{kulfi}/pairings").json()] == [lassi]
+    assert pairings.pending_suggestions(db, [lassi]) == {}
+
+def test_rebuild_recounts_from_current_plans(db):
+    curry, naan = add_dish(db, "Butter Chicken"), add_dish(db, "Garlic Naan")
+    plan(db, curry, DAY)
+    plan(db, naan, DAY)
+    db.execute(pairings.edges.update().values(co_occurrences=7, weight=7.0))
+    db.commit()
+    assert pairings.rebuild(db) == 1
+    rows = edges(db)
+    assert rows[(curry, naan)].co_occurrences == 1 and rows[(naan, curry)].co_occurrences == 1
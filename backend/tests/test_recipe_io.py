@@ -0,0 +1,52 @@
+import json
+import recipe_io
+from conftest import add_dish
+
+def record(name: str, **fields) -> str:
+    recipe = {
+        "name": name, "description": "A test dish", "cuisine": "Thai", "suitable_for": ["Lunch", "Dinner"],
+        "ingredients": [
+            {"name": "rice", "quantity": 100, "unit": "g", "category": "Grains"},
+            {"name": "basil", "quantity": 5, "unit": "g"},
+        ],
+        "prep_steps": ["Cook"], "nutrition": {"calories": 500, "protein": "10g", "carbs": "50g", "fats": "5g"},
+        "suggested_pairings": [],
+    }
+    recipe.update(fields)
+    return json.dumps(recipe)
+
+def upload(client, body: bytes) -> dict:
+    response = client.post("/cms/import", files={"file": ("recipes.ndjson", body)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def export(client) -> list:
+    return [json.loads(line) for line in client.get("/cms/export").text.splitlines()]
+
+def test_import_skips_duplicates_and_reports_bad_lines(client, db, monkeypatch):
+    # Small batches and partitions, so the test crosses their boundaries
+    monkeypatch.setattr(recipe_io, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(recipe_io, "EXPORT_CHUNK_SIZE", 2)
+    add_dish(db, "Dal")
+    lines = [
+        record("Pad Krapow"), record("  pad   krapow "), "not json", json.dumps({"name": "x"}), "",
+        record("DAL"), record("Green Curry", suggested_pairings=["Pad Krapow", "Mango Sticky Rice"]),
+    ]
+    report = upload(client, "\n".join(lines).encode())
+    assert (report["imported"], report["skipped_duplicates"], report["error_count"]) == (2, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 4]
+
+    exported = export(client)
+    assert [recipe["name"] for recipe in exported] == ["Dal", "Pad Krapow", "Green Curry"]
+    assert exported[1]["suitable_for"] == ["Lunch", "Dinner"] and len(exported[1]["ingredients"]) == 2
+    # Linked and still-pending suggestions both survive the trip
+    assert sorted(exported[2]["suggested_pairings"]) == ["Mango Sticky Rice", "Pad Krapow"]
+    assert client.get("/recipes/search", params={"q": "green curry"}).json()[0]["name"] == "Green Curry"
+
+def test_reimporting_an_export_changes_nothing(client, db):
+    add_dish(db, "Dal")
+    upload(client, record("Green Curry").encode())
+    body = client.get("/cms/export").content
+    report = upload(client, body)
+    assert (report["imported"], report["skipped_duplicates"], report["error_count"]) == (0, 2, 0)
+    assert export(client) == [json.loads(line) for line in body.decode().splitlines()]
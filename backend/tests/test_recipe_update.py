@@ -0,0 +1,42 @@
+from datetime import date
+import models
+import shopping_list
+from conftest import add_dish
+
+def test_edits_touch_only_what_changed(client, db):
+    dish_id = add_dish(db, "Dal")
+    db.add(models.MealPlan(household_id=1, dish_id=dish_id, planned_date=date.today(), meal_slot="Lunch"))
+    shopping_list.apply_plan_delta(db, 1, dish_id, +1)
+    db.commit()
+    link_id = db.query(models.DishIngredient.id).scalar()
+
+    body = client.get(f"/recipes/{dish_id}").json()
+    changes = client.put(f"/cms/recipes/{dish_id}", json=body).json()["changes"]
+    assert changes["fields"] == [] and changes["ingredients"]["unchanged"] == 1
+
+    body["ingredients"][0]["quantity"] = 150
+    body["ingredients"].append({"name": "lentils", "quantity": 80, "unit": "g"})
+    changes = client.put(f"/cms/recipes/{dish_id}", json=body).json()["changes"]
+    assert changes["ingredients"]["updated"] == ["rice"] and changes["ingredients"]["inserted"] == ["lentils"]
+    assert changes["recompute"]["nutrition"] is True and len(changes["recompute"]["shopping_list"]) == 2
+    db.expire_all()
+    # The existing link row was updated in place, not replaced
+    assert db.query(models.DishIngredient.id).order_by(models.DishIngredient.id).first()[0] == link_id
+    assert shopping_list.rebuild(db) == []
+
+    response = client.patch(f"/cms/recipes/{dish_id}", json={
+        "name": "Dal Tadka", "ingredients": [{"name": "rice", "quantity": 150, "unit": "g"}]
+    })
+    changes = response.json()["changes"]
+    assert changes["ingredients"]["deleted"] == ["lentils"] and changes["fields"] == ["name"]
+    assert changes["recompute"]["search_index"]
+    assert client.get(f"/recipes/{dish_id}").json()["name"] == "Dal Tadka"
+    db.expire_all()
+    assert shopping_list.rebuild(db) == []
+
+def test_invalid_edits_are_rejected(client, db):
+    dish_id = add_dish(db, "Dal")
+    duplicate = [{"name": "salt", "quantity": 1, "unit": "g"}, {"name": "salt", "quantity": 1, "unit": "ml"}]
+    assert client.patch(f"/cms/recipes/{dish_id}", json={"ingredients": duplicate}).status_code == 422
+    assert client.put(f"/cms/recipes/{dish_id}", json={"prep_steps": "not a list"}).status_code == 422
+    assert client.patch("/cms/recipes/99", json={}).status_code == 404
@@ -0,0 +1,66 @@
+import threading
+import ai_service
+import models
+import recommender
+from ai_governor import AIUnavailable
+from conftest import add_dish
+
+def recommend(client, slot: str = "Dinner") -> dict:
+    response = client.get("/recommend-me", params={"slot": slot})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def seed_dinners(db) -> list:
+    dish_ids = [add_dish(db, name, meal_type="Dinner") for name in ("Dal", "Paneer Tikka", "Rice Bowl")]
+    add_dish(db, "Oats", meal_type="Breakfast")
+    db.add(models.UserProfile(household_id=1, daily_calorie_goal=1000))
+    db.commit()
+    return dish_ids
+
+def test_model_picks_among_local_candidates_and_answers_are_cached(client, db, fake_ai):
+    dinners = seed_dinners(db)
+    first = recommend(client)
+    assert first["dish_id"] in dinners and not first["cached"] and len(first["candidates"]) == 3
+    assert first["recommendation"].startswith(first["candidates"][0]["name"])
+
+    assert recommend(client)["cached"]
+    assert fake_ai.calls["choose_recommendation"] == 1
+    # No lunch dishes: the model suggests a new one instead
+    lunch = recommend(client, "Lunch")
+    assert lunch["dish_id"] is None and fake_ai.calls["recommend"] == 1
+
+def test_concurrent_misses_share_one_model_call(client, db, fake_ai):
+    seed_dinners(db)
+    fake_ai.latency_ms = 300
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(recommend(client))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake_ai.calls["choose_recommendation"] == 1
+    assert len({result["dish_id"] for result in results}) == 1
+
+def test_unknown_pick_falls_back_to_the_top_candidate(client, db, monkeypatch):
+    seed_dinners(db)
+    monkeypatch.setattr(ai_service, "choose_recommendation", lambda *args: "Pizza Margherita: Always a crowd pleaser.")
+    result = recommend(client)
+    top = result["candidates"][0]
+    assert result["dish_id"] == top["id"]
+    assert result["recommendation"] == recommender._local_explanation(top, "Dinner")
+
+def test_degraded_answers_are_not_cached(db, monkeypatch):
+    add_dish(db, "Dal Tadka", meal_type="Lunch")
+    monkeypatch.setattr(recommender, "RECOMMEND_AI", True)
+
+    def unavailable(*args):
+        raise AIUnavailable("model down", 5)
+    monkeypatch.setattr(ai_service, "choose_recommendation", unavailable)
+    monkeypatch.setattr(ai_service, "get_smart_recommendation", unavailable)
+    for slot in ("Lunch", "Dinner"):
+        recommender.recommend(db, 1, 800, slot)
+        assert recommender.recommend(db, 1, 800, slot)["cached"] is False
+
+    monkeypatch.setattr(ai_service, "choose_recommendation", lambda remaining, slot, candidates: f"{candidates[0]['name']}: Good.")
+    recommender.recommend(db, 1, 800, "Lunch")
+    assert recommender.recommend(db, 1, 800, "Lunch")["cached"] is True
@@ -0,0 +1,27 @@
+import search
+from conftest import add_dish
+
+def names(client, query: str) -> list:
+    return [hit["name"] for hit in client.get("/recipes/search", params={"q": query}).json()]
+
+def test_typos_and_word_order_still_match(client, db):
+    for name in ("Fried Rice Pudding", "Chicken Biryani", "Vegetable Fried Rice"):
+        add_dish(db, name)
+    assert names(client, "chiken biriyani")[0] == "Chicken Biryani"
+    assert set(names(client, "fried rice")) == {"Vegetable Fried Rice", "Fried Rice Pudding"}
+    assert names(client, "zzzz") == []
+
+def test_index_picks_up_new_dishes(client, db, fake_ai):
+    add_dish(db, "Chicken Biryani")
+    assert client.post("/extract-recipe", params={"text_input": "rice"}).json()["name"] == "Rice"
+    assert fake_ai.calls["extract_recipe"] == 1
+    # Close enough to a catalog dish to be served without the model
+    assert client.post("/extract-recipe", params={"text_input": "chicken biryani"}).json()["name"] == "Chicken Biryani"
+    assert fake_ai.calls["extract_recipe"] == 1
+    assert names(client, "rice")[0] == "Rice"
+
+def test_similarity_is_symmetric_and_bounded():
+    a, b = search.trigrams("biryani"), search.trigrams("biriyani")
+    assert search.similarity(a, b) == search.similarity(b, a)
+    assert 0 < search.similarity(a, b) < 1
+    assert search.similarity(a, a) == 1
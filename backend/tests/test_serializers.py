@@ -0,0 +1,61 @@
+import orjson
+import database
+import image_worker
+import models
+import schemas
+import serializers
+from conftest import add_dish
+
+def drain(url: str):
+    image_worker.ImageWorker(database.SessionLocal, image_worker.one_at_a_time(lambda prompt: url)).drain()
+
+def test_fast_path_matches_the_response_schema(client, db):
+    ids = [add_dish(db, name, ingredients=[("rice", 100, "g"), ("ghee", 5, "g")]) for name in ("Biryani", "Dal")]
+    listing = client.get("/recipes").json()
+    for recipe in listing:
+        assert schemas.RecipeResponse(**recipe).model_dump() == recipe
+    assert [ingredient["name"] for ingredient in listing[0]["ingredients"]] == ["rice", "ghee"]
+
+    detail = client.get(f"/recipes/{ids[0]}")
+    assert detail.headers["content-type"] == "application/json"
+    assert detail.json() == listing[0] == client.get(f"/cms/recipes/{ids[0]}").json()
+    assert client.get("/recipes/9999").status_code == 404
+
+def test_details_are_cached_per_dish_version(client, db):
+    dish_id = add_dish(db, "Dal")
+    client.get(f"/recipes/{dish_id}")
+    version = db.query(models.Dish.version).filter_by(id=dish_id).scalar()
+    assert orjson.loads(serializers.detail_cache.get((dish_id, version)))["name"] == "Dal"
+
+    response = client.patch(f"/cms/recipes/{dish_id}", json={"description": "Slow-cooked"})
+    assert response.json()["changes"]["fields"] == ["description"]
+    assert client.get(f"/recipes/{dish_id}").json()["description"] == "Slow-cooked"
+
+def test_new_images_refresh_every_dish_that_shows_them(client, db):
+    ids = [add_dish(db, name) for name in ("Biryani", "Dal")]
+    etag = client.get("/recipes").headers["etag"]
+    for dish_id in ids:
+        client.get(f"/recipes/{dish_id}")
+
+    rice = db.query(models.Ingredient.id).filter_by(name="rice").scalar()
+    image_worker.enqueue_image(db, "ingredient", rice, "fresh raw rice")
+    db.commit()
+    drain("http://img/rice")
+    for dish_id in ids:
+        assert client.get(f"/recipes/{dish_id}").json()["ingredients"][0]["thumbnail_url"] == "http://img/rice"
+    assert client.get("/recipes", headers={"If-None-Match": etag}).status_code == 200
+
+def test_an_edit_racing_a_cache_fill_is_never_served_stale(client, db, monkeypatch):
+    dish_id = add_dish(db, "Dal")
+    read_detail = serializers.recipe_detail
+
+    def edit_mid_read(session, wanted):
+        # The old body is read, then an edit commits before the reader stores it
+        body = read_detail(session, wanted)
+        monkeypatch.setattr(serializers, "recipe_detail", read_detail)
+        assert client.patch(f"/cms/recipes/{dish_id}", json={"description": "Edited"}).status_code == 200
+        return body
+    monkeypatch.setattr(serializers, "recipe_detail", edit_mid_read)
+
+    assert client.get(f"/recipes/{dish_id}").json()["description"] == "A test dish"
+    assert client.get(f"/recipes/{dish_id}").json()["description"] == "Edited"
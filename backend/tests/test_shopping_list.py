@@ -0,0 +1,77 @@
+from datetime import date
+import database
+import ingredients
+import models
+import shopping_list
+from conftest import add_dish
+
+def plan(db, dish_id: int, slot: str = "Lunch") -> int:
+    """What POST /meal-planner does to the default household's list."""
+    entry = models.MealPlan(household_id=1, dish_id=dish_id, planned_date=date(2026, 10, 17), meal_slot=slot)
+    db.add(entry)
+    shopping_list.apply_plan_delta(db, 1, dish_id, +1)
+    db.commit()
+    return entry.id
+
+def by_unit(client) -> dict:
+    return {item["unit"]: item for item in client.get("/shopping-list").json()}
+
+def test_list_follows_plans_and_pantry(client, db):
+    biryani, dal = add_dish(db, "Biryani"), add_dish(db, "Dal")
+    rice = db.query(models.Ingredient).filter_by(name="rice").one()
+    db.add(models.PantryItem(household_id=1, ingredient_id=rice.id, current_quantity=0.15, unit="kg", min_threshold=0.5))
+    db.commit()
+    # The item was written behind the list's back; the repair pass derives its buffer
+    shopping_list.rebuild(db, fix=True)
+    assert [item["reason"] for item in client.get("/shopping-list").json()] == ["Low Stock"]
+
+    first = plan(db, biryani)
+    plan(db, dal, "Dinner")
+    items = by_unit(client)
+    assert set(items) == {"g", "kg"}
+    # 200 g planned, 150 g on hand
+    assert items["g"]["quantity"] == 50.0 and items["g"]["reason"] == "Planned Meals"
+
+    assert client.post("/pantry/purchase", params={"item_name": "rice", "quantity": 500, "unit": "g"}).status_code == 200
+    assert client.get("/shopping-list").json() == []
+
+    assert client.post(f"/meal-planner/{first}/complete").status_code == 200
+    remaining = db.query(models.MealPlan.id).scalar()
+    assert client.delete(f"/meal-planner/{remaining}").status_code == 200
+    db.expire_all()
+    assert shopping_list.rebuild(db) == []
+    assert db.query(models.ShoppingListItem).count() == 0
+
+def test_need_deltas_add_up_across_sessions(db):
+    flour = ingredients.resolve_ingredients(db, [("flour", "Pantry")], enqueue_images=False)["flour"]
+    db.commit()
+    first, second = database.SessionLocal(), database.SessionLocal()
+    try:
+        # second loads the row first, so writing back a stale copy would lose first's delta
+        shopping_list.apply_need_deltas(second, 1, {(flour, "g"): 50})
+        second.commit()
+        shopping_list.apply_need_deltas(first, 1, {(flour, "g"): 100})
+        first.commit()
+        shopping_list.apply_need_deltas(second, 1, {(flour, "g"): 25})
+        second.commit()
+        row = db.query(models.ShoppingListItem).filter_by(ingredient_id=flour).one()
+        assert (row.planned_quantity, row.total_quantity) == (175, 175)
+
+        shopping_list.apply_need_deltas(first, 1, {(flour, "g"): -500})
+        first.commit()
+        db.expire_all()
+        assert db.query(models.ShoppingListItem).filter_by(ingredient_id=flour).count() == 0
+    finally:
+        first.close()
+        second.close()
+
+def test_rebuild_reports_and_repairs_drift(db):
+    dish_id = add_dish(db, "Biryani")
+    plan(db, dish_id)
+    db.query(models.ShoppingListItem).update({"planned_quantity": 40.0})
+    db.commit()
+    rice = db.query(models.Ingredient.id).filter_by(name="rice").scalar()
+    assert shopping_list.rebuild(db) == [(1, rice, "g", 40.0, 100.0)]
+    shopping_list.rebuild(db, fix=True)
+    assert shopping_list.rebuild(db) == []
+    assert db.query(models.ShoppingListItem.total_quantity).scalar() == 100.0
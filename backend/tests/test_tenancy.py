@@ -0,0 +1,59 @@
+from datetime import date
+import models
+import shopping_list
+import tenancy
+from conftest import add_dish
+
+def create_household(client, name: str = "Second") -> tuple:
+    created = client.post("/households", json={"name": name}).json()
+    return created["id"], {"X-Household-Token": created["token"]}
+
+def test_households_see_only_their_own_data(client, db):
+    dish_id = add_dish(db, "Dal")
+    household_id, second = create_household(client)
+    assert household_id != tenancy.DEFAULT_HOUSEHOLD_ID
+
+    client.post("/pantry/purchase", params={"item_name": "rice", "quantity": 500, "unit": "g"}, headers=second)
+    assert client.get("/pantry").json() == []
+    assert client.get("/pantry", headers=second).json()[0]["quantity"] == 500
+
+    db.add(models.MealPlan(household_id=tenancy.DEFAULT_HOUSEHOLD_ID, dish_id=dish_id, planned_date=date.today(), meal_slot="Lunch"))
+    shopping_list.apply_plan_delta(db, tenancy.DEFAULT_HOUSEHOLD_ID, dish_id, 1)
+    db.commit()
+    assert client.get("/shopping-list").json()[0]["quantity"] == 100
+    assert client.get("/shopping-list", headers=second).json() == []
+    plan = db.query(models.MealPlan).one()
+    assert plan.household_id == tenancy.DEFAULT_HOUSEHOLD_ID
+    assert client.post(f"/meal-planner/{plan.id}/complete", headers=second).status_code == 404
+    assert client.delete(f"/meal-planner/{plan.id}", headers=second).status_code == 404
+
+    client.put("/profile", json={"daily_calorie_goal": 1500, "household_id": household_id, "id": 77}, headers=second)
+    assert client.get("/profile").json()["household_id"] == tenancy.DEFAULT_HOUSEHOLD_ID
+    assert client.get("/profile", headers=second).json()["household_id"] == household_id
+    db.expire_all()
+    assert shopping_list.rebuild(db) == []
+
+def test_households_are_selected_by_token_only(client, db):
+    household_id, second = create_household(client)
+    client.post("/pantry/purchase", params={"item_name": "rice", "quantity": 500, "unit": "g"}, headers=second)
+
+    assert client.get("/pantry", headers={"X-Household-Token": "guessed"}).status_code == 404
+    # An id is not a credential
+    assert client.get("/pantry", headers={"X-Household-Id": str(household_id)}).json() == []
+
+    replacement = tenancy.issue_token(db, household_id)
+    assert client.get("/pantry", headers=second).status_code == 404
+    assert client.get("/pantry", headers={"X-Household-Token": replacement}).json()[0]["quantity"] == 500
+
+def test_alert_evaluation_is_scoped_to_the_caller(client, db):
+    household_id, second = create_household(client)
+    rice = models.Ingredient(name="rice", category="Grains")
+    db.add(rice)
+    db.flush()
+    for owner in (tenancy.DEFAULT_HOUSEHOLD_ID, household_id):
+        db.add(models.PantryItem(household_id=owner, ingredient_id=rice.id, current_quantity=10, unit="g", min_threshold=100))
+    db.commit()
+
+    assert client.post("/alerts/evaluate", headers=second).json()["raised"] == 1
+    assert [alert["kind"] for alert in client.get("/alerts", headers=second).json()] == ["low_stock"]
+    assert client.get("/alerts").json() == []
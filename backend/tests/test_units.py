@@ -0,0 +1,65 @@
+import pytest
+import ai_service
+import models
+import units
+from ai_governor import AIUnavailable
+
+@pytest.fixture
+def tomato(db) -> int:
+    ingredient = models.Ingredient(name="tomato", category="Produce")
+    db.add(ingredient)
+    db.commit()
+    return ingredient.id
+
+@pytest.fixture
+def model_calls(monkeypatch) -> list:
+    """Records every question reaching the model; it knows only the weight of a piece."""
+    calls = []
+
+    def answer(name, from_unit, to_unit):
+        calls.append((from_unit, to_unit))
+        return 120.0 if from_unit in ("piece", "pc") and to_unit == "g" else None
+    monkeypatch.setattr(ai_service, "get_unit_factor", answer)
+    return calls
+
+def test_local_conversions_never_ask_the_model(db, tomato, model_calls):
+    assert units.convert_quantity(db, tomato, "tomato", 2, "kg", "grams") == 2000
+    assert units.convert_quantity(db, tomato, "tomato", 1, "cup", "tbsp") == pytest.approx(16, rel=1e-3)
+    assert model_calls == []
+
+def test_learned_factors_are_stored_and_reused(db, tomato, model_calls):
+    assert units.convert_quantity(db, tomato, "tomato", 3, "piece", "g") == pytest.approx(360)
+    # Answered from the stored edge, in either direction and at any scale
+    assert units.convert_quantity(db, tomato, "tomato", 240, "g", "pcs") == pytest.approx(2)
+    assert units.convert_quantity(db, tomato, "tomato", 1, "dozen", "kg") == pytest.approx(1.44)
+    units.conversion_table.clear()
+    assert units.convert_quantity(db, tomato, "tomato", 1, "pc", "oz") == pytest.approx(120 / 28.3495)
+    assert model_calls == [("piece", "g")]
+    assert db.query(models.UnitConversion).filter_by(ingredient_id=tomato).count() == 1
+
+def test_pairs_the_model_cannot_answer_are_asked_once(db, tomato, model_calls):
+    for _ in range(3):
+        assert units.convert_quantity(db, tomato, "tomato", 5, "bunch", "g") == 5
+    assert model_calls == [("bunch", "g")]
+
+def test_an_outage_is_not_remembered_as_unknown(db, tomato, monkeypatch):
+    calls = []
+
+    def unavailable(*args):
+        calls.append(args)
+        raise AIUnavailable("breaker open", 30)
+    monkeypatch.setattr(ai_service, "get_unit_factor", unavailable)
+    assert units.convert_quantity(db, tomato, "tomato", 5, "bunch", "g") == 5
+    assert units.convert_quantity(db, tomato, "tomato", 5, "bunch", "g") == 5
+    assert len(calls) == 2
+
+def test_pinned_factors_replace_cached_ones(client, db, tomato, model_calls):
+    assert units.convert_quantity(db, tomato, "tomato", 1, "pc", "g") == pytest.approx(120)
+    assert client.put(f"/ingredients/{tomato}/units", json={"piece_weight_g": 90, "density_g_per_ml": 1.0}).status_code == 200
+    assert units.convert_quantity(db, tomato, "tomato", 1, "pc", "g") == pytest.approx(90)
+    assert units.convert_quantity(db, tomato, "tomato", 1, "l", "kg") == pytest.approx(1)
+    assert model_calls == [("pc", "g")]
+
+def test_non_positive_factors_are_rejected(client, tomato):
+    assert client.put(f"/ingredients/{tomato}/units", json={"piece_weight_g": 0}).status_code == 422
+    assert client.put(f"/ingredients/{tomato}/units", json={"density_g_per_ml": -1}).status_code == 422
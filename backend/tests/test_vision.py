@@ -0,0 +1,48 @@
+import io
+from PIL import Image, ImageDraw
+import ai_service
+import vision
+from conftest import add_dish
+
+def photo(shift: int = 0, size=(3000, 2000), fill: str = "red") -> bytes:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([200 + shift, 200, 1500 + shift, 1500], fill=fill)
+    draw.ellipse([1800, 300, 2800, 1800], fill="blue")
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+def scan(client, data: bytes, mode: str = "pantry"):
+    return client.post("/vision/scan", params={"mode": mode}, files={"file": ("scan.png", data, "image/png")})
+
+def test_scans_are_downscaled_and_cached_by_perceptual_hash(client, db, monkeypatch):
+    add_dish(db, "Chicken Biryani")
+    sent = []
+
+    async def analyze(data, mode):
+        sent.append(data)
+        if mode == "dish":
+            return {"name": "chicken biryani"}
+        return {"items": [{"name": "tomato", "quantity": 2, "unit": "pcs"}]}
+    monkeypatch.setattr(ai_service, "analyze_image_vision_async", analyze)
+
+    original = photo()
+    assert scan(client, original).json()["items"][0]["name"] == "tomato"
+    assert max(Image.open(io.BytesIO(sent[0])).size) == vision.VISION_MAX_SIDE
+    # A slightly shifted shot of the same scene is served from the cache
+    assert scan(client, photo(shift=5)).status_code == 200
+    assert len(sent) == 1
+
+    found = scan(client, original, mode="dish").json()
+    assert found["status"] == "match_found" and found["dish"]["name"] == "Chicken Biryani"
+    assert len(sent) == 2
+
+def test_unreadable_uploads_are_rejected(client):
+    assert scan(client, b"not an image").status_code == 400
+
+def test_hash_distance_separates_different_pictures():
+    same = vision.prepare_image(photo()).phash
+    shifted = vision.prepare_image(photo(shift=5)).phash
+    other = vision.prepare_image(photo(shift=1200, fill="black")).phash
+    assert vision.hamming(same, shifted) <= vision.VISION_HASH_DISTANCE < vision.hamming(same, other)
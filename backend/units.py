@@ -0,0 +1,183 @@
+import os
+from collections import deque
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import database
+import models
+import ai_service
+from ai_governor import AIUnavailable
+from caching import ReadThroughCache, invalidate_on
+
+# Scale of each unit relative to its dimension's base unit (g, ml, pc)
+MASS_UNITS = {"mg": 0.001, "g": 1.0, "kg": 1000.0, "oz": 28.3495, "lb": 453.592}
+VOLUME_UNITS = {
+    "ml": 1.0, "l": 1000.0, "tsp": 4.92892, "tbsp": 14.7868, "cup": 236.588,
+    "fl oz": 29.5735, "pint": 473.176, "quart": 946.353, "gallon": 3785.41
+}
+COUNT_UNITS = {"pc": 1.0, "dozen": 12.0}
+DIMENSIONS = [("g", MASS_UNITS), ("ml", VOLUME_UNITS), ("pc", COUNT_UNITS)]
+
+UNIT_ALIASES = {
+    "gram": "g", "grams": "g", "gm": "g", "gms": "g", "gr": "g",
+    "kilogram": "kg", "kilograms": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg",
+    "milligram": "mg", "milligrams": "mg",
+    "ounce": "oz", "ounces": "oz", "pound": "lb", "pounds": "lb", "lbs": "lb",
+    "milliliter": "ml", "milliliters": "ml", "millilitre": "ml", "millilitres": "ml", "mls": "ml",
+    "liter": "l", "liters": "l", "litre": "l", "litres": "l", "ltr": "l",
+    "teaspoon": "tsp", "teaspoons": "tsp", "tsps": "tsp",
+    "tablespoon": "tbsp", "tablespoons": "tbsp", "tbsps": "tbsp", "tbs": "tbsp",
+    "cups": "cup", "fluid ounce": "fl oz", "fluid ounces": "fl oz", "floz": "fl oz",
+    "pints": "pint", "quarts": "quart", "gallons": "gallon",
+    "piece": "pc", "pieces": "pc", "pcs": "pc", "whole": "pc", "unit": "pc", "units": "pc",
+    "each": "pc", "nos": "pc", "no": "pc", "count": "pc", "dozens": "dozen"
+}
+
+def normalize_unit(unit: str) -> str:
+    u = " ".join((unit or "").strip().lower().rstrip(".").split())
+    return UNIT_ALIASES.get(u, u)
+
+def to_base(unit: str):
+    """Returns (base_unit, scale) for a normalized unit; unknown units are their own base."""
+    for base, table in DIMENSIONS:
+        if unit in table:
+            return base, table[unit]
+    return unit, 1.0
+
+# How long a learned conversion graph, and a pair the model could not answer, is kept
+UNIT_CACHE_TTL = float(os.getenv("UNIT_CACHE_TTL", "3600"))
+UNKNOWN_UNIT_TTL = float(os.getenv("UNKNOWN_UNIT_TTL", "86400"))
+
+class ConversionTable:
+    """
+    Read-through cache of the unit_conversions rows, loaded once per ingredient.
+    Rows are edges of a small graph between base units, so a single stored
+    density ("ml" -> "g") also answers tbsp -> oz, cup -> kg and so on.
+    Entries live in the CACHE_BACKEND (see caching.py) and are evicted when
+    a transaction writing the ingredient's rows commits, in every worker.
+    Pairs the model could not answer are remembered for UNKNOWN_UNIT_TTL.
+    """
+
+    def __init__(self):
+        self.edges = ReadThroughCache("unit_conversions", UNIT_CACHE_TTL)
+        self.unknown = ReadThroughCache("unknown_unit_pairs", UNKNOWN_UNIT_TTL)
+        invalidate_on(models.UnitConversion, self.edges, lambda row: [row.ingredient_id])
+
+    def graph(self, db: Session, ingredient_id: int) -> dict:
+        edges = self.edges.get_or_load(ingredient_id, lambda: [
+            [from_unit, to_unit, factor] for from_unit, to_unit, factor in db.query(
+                models.UnitConversion.from_unit, models.UnitConversion.to_unit, models.UnitConversion.factor
+            ).filter(models.UnitConversion.ingredient_id == ingredient_id)
+        ])
+        graph = {}
+        for from_unit, to_unit, factor in edges:
+            _add_edge(graph, from_unit, to_unit, factor)
+        return graph
+
+    def is_unknown(self, ingredient_id: int, from_unit: str, to_unit: str) -> bool:
+        return bool(self.unknown.get(f"{ingredient_id}:{from_unit}:{to_unit}"))
+
+    def mark_unknown(self, ingredient_id: int, from_unit: str, to_unit: str):
+        self.unknown.set(f"{ingredient_id}:{from_unit}:{to_unit}", True)
+
+    def clear(self):
+        self.edges.clear()
+        self.unknown.clear()
+
+def _add_edge(graph: dict, from_unit: str, to_unit: str, factor: float):
+    # A zero or negative factor has no inverse; such rows are ignored rather than trusted
+    if not factor or factor <= 0:
+        return
+    graph.setdefault(from_unit, {})[to_unit] = factor
+    graph.setdefault(to_unit, {})[from_unit] = 1.0 / factor
+
+def _find_factor(graph: dict, start: str, goal: str) -> Optional[float]:
+    """Breadth-first walk multiplying factors along the path."""
+    if start == goal:
+        return 1.0
+    seen = {start}
+    queue = deque([(start, 1.0)])
+    while queue:
+        unit, factor = queue.popleft()
+        for nxt, edge in graph.get(unit, {}).items():
+            if nxt == goal:
+                return factor * edge
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append((nxt, factor * edge))
+    return None
+
+conversion_table = ConversionTable()
+
+def convert_quantity(
+    db: Session, ingredient_id: int, ingredient_name: str,
+    quantity: float, from_unit: str, to_unit: str
+) -> float:
+    """
+    Converts quantity between units for one ingredient. Same-dimension
+    conversions are pure arithmetic; cross-dimension ones use the stored
+    density/piece-weight rows. Only a pair with no path at all reaches the
+    LLM, and its answer is written back so it is asked at most once. A pair
+    the model has no factor for is not asked again for UNKNOWN_UNIT_TTL.
+    Falls back to the unconverted quantity if there is no answer.
+    """
+    src, dst = normalize_unit(from_unit), normalize_unit(to_unit)
+    if src == dst:
+        return quantity
+    src_base, src_scale = to_base(src)
+    dst_base, dst_scale = to_base(dst)
+
+    bridge = _find_factor(conversion_table.graph(db, ingredient_id), src_base, dst_base)
+    if bridge is None:
+        if conversion_table.is_unknown(ingredient_id, src_base, dst_base):
+            return quantity
+        try:
+            answer = ai_service.get_unit_factor(ingredient_name, from_unit, to_unit)
+        except AIUnavailable:
+            # An outage says nothing about the pair; ask again next time
+            return quantity
+        if answer is None:
+            conversion_table.mark_unknown(ingredient_id, src_base, dst_base)
+            return quantity
+        bridge = answer * dst_scale / src_scale
+        _store_factor(ingredient_id, src_base, dst_base, bridge)
+
+    return quantity * src_scale * bridge / dst_scale
+
+def _store_factor(ingredient_id: int, from_unit: str, to_unit: str, factor: float):
+    # Own session: the caller's transaction may hold unrelated pending changes.
+    # Its commit evicts the ingredient's cached graph, so the new edge is read back.
+    db = database.SessionLocal()
+    try:
+        db.add(models.UnitConversion(
+            ingredient_id=ingredient_id, from_unit=from_unit, to_unit=to_unit, factor=factor
+        ))
+        db.commit()
+    except IntegrityError:
+        # Another worker resolved the same pair first
+        db.rollback()
+    finally:
+        db.close()
+
+def set_ingredient_factors(
+    db: Session, ingredient_id: int,
+    density_g_per_ml: Optional[float] = None, piece_weight_g: Optional[float] = None
+):
+    """Manually pins an ingredient's density and/or piece weight (overrides learned values)."""
+    for (from_unit, to_unit), factor in {("ml", "g"): density_g_per_ml, ("pc", "g"): piece_weight_g}.items():
+        if factor is None:
+            continue
+        row = db.query(models.UnitConversion).filter(
+            models.UnitConversion.ingredient_id == ingredient_id,
+            models.UnitConversion.from_unit == from_unit,
+            models.UnitConversion.to_unit == to_unit
+        ).first()
+        if row:
+            row.factor, row.source = factor, "manual"
+        else:
+            db.add(models.UnitConversion(
+                ingredient_id=ingredient_id, from_unit=from_unit, to_unit=to_unit,
+                factor=factor, source="manual"
+            ))
+    # The commit evicts the ingredient's cached graph in every worker (see ConversionTable)
+    db.commit()
@@ -0,0 +1,80 @@
+"""
+Image preparation and result caching for /vision/scan.
+
+Uploads are downscaled and re-encoded as JPEG before they reach the model,
+and every analysis is stored under a 64-bit difference hash (dHash) of the
+image, so rescanning the same shelf or plate is answered from the database.
+"""
+import io
+import os
+from dataclasses import dataclass
+from PIL import Image, ImageOps
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1024"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "80"))
+# Hashes within this many differing bits count as the same picture
+VISION_HASH_DISTANCE = int(os.getenv("VISION_HASH_DISTANCE", "4"))
+# How many recent entries are compared bit-by-bit when there is no exact hit
+NEAR_MATCH_WINDOW = 500
+
+@dataclass
+class PreparedImage:
+    jpeg_bytes: bytes
+    phash: str
+    original_size: int
+
+def dhash(image: Image.Image, hash_size: int = 8) -> str:
+    """Difference hash: compares neighbouring pixels of a (hash_size+1) x hash_size greyscale thumbnail."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def prepare_image(image_bytes: bytes) -> PreparedImage:
+    """Applies EXIF rotation, caps the longest side at VISION_MAX_SIDE and re-encodes as JPEG."""
+    image = Image.open(io.BytesIO(image_bytes))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    return PreparedImage(jpeg_bytes=buffer.getvalue(), phash=dhash(image), original_size=len(image_bytes))
+
+def lookup(db: Session, phash: str, mode: str):
+    """Cached analysis for this picture (exact hash first, then near-duplicates), or None."""
+    entry = db.query(models.VisionCacheEntry).filter(
+        models.VisionCacheEntry.phash == phash, models.VisionCacheEntry.mode == mode
+    ).first()
+    if entry:
+        return entry.result
+
+    recent = (
+        db.query(models.VisionCacheEntry.phash, models.VisionCacheEntry.result)
+        .filter(models.VisionCacheEntry.mode == mode)
+        .order_by(models.VisionCacheEntry.id.desc())
+        .limit(NEAR_MATCH_WINDOW)
+        .all()
+    )
+    best = min(recent, key=lambda row: hamming(phash, row.phash), default=None)
+    if best is not None and hamming(phash, best.phash) <= VISION_HASH_DISTANCE:
+        return best.result
+    return None
+
+def store(db: Session, phash: str, mode: str, result: dict) -> None:
+    try:
+        db.add(models.VisionCacheEntry(phash=phash, mode=mode, result=result))
+        db.commit()
+    except IntegrityError:
+        # A concurrent scan of the same picture stored it first
+        db.rollback()
@@ -5,7 +5,7 @@ import api, {
   getMealPlan, 
   getAllRecipes, 
   addToPlan, 
-  getHealthStats, 
+  getHealthStatsRange, 
   extractRecipe 
 } from '@/lib/api';
 import { 
@@ -41,7 +41,8 @@ export const deleteMealPlanEntry = async (planId: number) => {
 export default function MealPlanner() {
   const [plans, setPlans] = useState<any[]>([]);
   const [recipes, setRecipes] = useState<any[]>([]);
-  const [healthStats, setHealthStats] = useState<any>(null);
+  // Health stats for every day of the visible week, keyed by YYYY-MM-DD
+  const [weekStats, setWeekStats] = useState<Record<string, any>>({});
   const [loading, setLoading] = useState(true);
   
   const [isModalOpen, setIsModalOpen] = useState(false);
@@ -55,6 +56,8 @@ export default function MealPlanner() {
     d.setDate(d.getDate() + i);
     return d;
   });
+  const toDateKey = (d: Date) => d.toISOString().split('T')[0];
+  const healthStats = weekStats[focusDate] ?? null;
 
   const slots = [
     { name: 'Breakfast', icon: <Sunrise className="w-4 h-4 text-orange-400" /> },
@@ -111,14 +114,14 @@ export default function MealPlanner() {
 
   async function loadData() {
     try {
-      const [planData, recipeData, healthData] = await Promise.all([
+      const [planData, recipeData, statsRange] = await Promise.all([
         getMealPlan(), 
         getAllRecipes(),
-        getHealthStats(focusDate)
+        getHealthStatsRange(toDateKey(weekDays[0]), toDateKey(weekDays[weekDays.length - 1]))
       ]);
       setPlans(planData);
       setRecipes(recipeData);
-      setHealthStats(healthData);
+      setWeekStats(Object.fromEntries(statsRange.days.map((day: any) => [day.date, day])));
     } catch (err) {
       console.error(err);
     } finally {
@@ -126,10 +129,10 @@ export default function MealPlanner() {
     }
   }
 
-  // Reload health stats whenever the focused date changes
+  // The whole week's stats arrive in one request; changing focus just picks a day
   useEffect(() => {
     loadData();
-  }, [focusDate]);
+  }, []);
 
   const handleOpenModal = (date: Date, slotName: string) => {
     setActiveSlot({ date, name: slotName });
@@ -5,6 +5,7 @@ import axios from 'axios';
 import { Search, Trash2, Eye, Database } from 'lucide-react';
 // Step 3: Importing DishDetail to handle the expanded entity view
 import DishDetail from './DishDetail'; 
+import { getAllRecipes } from '@/lib/api';
 
 const API_BASE = "http://localhost:8000";
 
@@ -19,8 +20,7 @@ export default function DishManager() {
   const fetchDishes = async () => {
     try {
       // Fetching all dishes from the persistent cache
-      const res = await axios.get(`${API_BASE}/recipes`);
-      setDishes(res.data);
+      setDishes(await getAllRecipes());
     } catch (err) { console.error("CMS Load Error", err); }
   };
 
@@ -10,9 +10,16 @@ export const extractRecipe = async (input: string) => {
   return response.data;
 };
 
+// The catalog is keyset-paginated; follow X-Next-Cursor until the last page
 export const getAllRecipes = async () => {
-  const response = await api.get('/recipes');
-  return response.data;
+  const recipes: any[] = [];
+  let cursor: string | undefined;
+  do {
+    const response = await api.get('/recipes', { params: { limit: 200, cursor } });
+    recipes.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return recipes;
 };
 
 export const getRecipeById = async (id: string) => {
@@ -46,6 +53,12 @@ export const getHealthStats = async (dateStr: string) => {
   return response.data;
 };
 
+// One aggregate request for a whole week/month: { from, to, days: [{ date, actual, goals }] }
+export const getHealthStatsRange = async (from: string, to: string) => {
+  const response = await api.get('/health-stats', { params: { from, to } });
+  return response.data;
+};
+
 export const getSmartRecommendation = async (slot: string) => {
    const response = await api.get(`/recommend-me?slot=${slot}`);
    return response.data;
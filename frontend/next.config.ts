@@ -1,7 +1,10 @@
 import type { NextConfig } from "next";
 
 const nextConfig: NextConfig = {
-  /* config options here */
+  // Stored thumbnails are "/assets/..." paths on the API; serve them through this origin
+  async rewrites() {
+    return [{ source: "/assets/:path*", destination: "http://127.0.0.1:8000/assets/:path*" }];
+  },
 };
 
 export default nextConfig;